@@ -5,6 +5,7 @@ from decimal import Decimal
 from typing import List, Dict, Optional
 
 from http_client import HttpClient
+from models.catalogue import Catalogue, movies_to_table
 from models.video import Movie, Title
 
 
@@ -13,6 +14,7 @@ class ImdbGraphQLScraper:
     Scrape IMDb using GraphQL API with async HttpClient and update existing records
     """
     host = "caching.graphql.imdb.com"
+    scheme = "https"
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'application/json',
@@ -21,7 +23,8 @@ class ImdbGraphQLScraper:
     }
 
     def __init__(self, start_page: int = 1, max_pages: Optional[int] = None, batch_size: int = 5,
-                 results_per_page: int = 50, update_existing: bool = True):
+                 results_per_page: int = 50, update_existing: bool = True,
+                 catalogue: Optional[Catalogue] = None, throttle: bool = True):
         """
         Initialize the IMDb GraphQL scraper
 
@@ -31,12 +34,16 @@ class ImdbGraphQLScraper:
         - batch_size: Number of pages to process in each batch
         - results_per_page: Number of results per page (default: 50)
         - update_existing: Whether to update existing movie records (default: True)
+        - catalogue: Optional local columnar snapshot kept in sync with saved movies (default: None)
+        - throttle: Sleep 1-3 seconds before each request to avoid being blocked (default: True)
         """
         self.start_page = start_page
         self.max_pages = max_pages
         self.batch_size = batch_size
         self.results_per_page = results_per_page
         self.update_existing = update_existing
+        self.catalogue = catalogue
+        self.throttle = throttle
 
     def _generate_query_url(self, after_token: Optional[str] = None, first: int = 50,
                             language: str = "en-US", sort_by: str = "POPULARITY",
@@ -209,9 +216,10 @@ class ImdbGraphQLScraper:
         url = self._generate_query_url(after_token, first=self.results_per_page)
         client = HttpClient.from_dict({
             "server": self.host,
+            "scheme": self.scheme,
             "urls": [url],
             'headers': self.headers,
-            'sleep': True,
+            'sleep': self.throttle,
             'json': True
         })
 
@@ -347,6 +355,8 @@ class ImdbGraphQLScraper:
                 # Convert to Movie objects and save
                 new_movie_objects = await self._convert_to_movie_objects(new_movie_data)
                 await Movie.save(new_movie_objects)
+                if self.catalogue:
+                    self.catalogue.upsert(new_movie_objects)
                 print(f"Saved {len(new_movie_objects)} new movies from page {current_page}")
                 results["new"] = len(new_movie_objects)
             except Exception as e:
@@ -358,6 +368,8 @@ class ImdbGraphQLScraper:
                 # Convert to Movie objects and save (will overwrite existing)
                 updated_movie_objects = await self._convert_to_movie_objects(updated_movie_data)
                 await Movie.save(updated_movie_objects)
+                if self.catalogue:
+                    self.catalogue.upsert(updated_movie_objects)
                 print(f"Updated {len(updated_movie_objects)} existing movies from page {current_page}")
                 results["updated"] = len(updated_movie_objects)
             except Exception as e:
@@ -385,8 +397,15 @@ class ImdbGraphQLScraper:
         # Get existing movie IDs
         existing_ids = set()
         try:
-            all_movies = await Movie.scan_all()
-            existing_ids = {movie.id for movie in all_movies}
+            if self.catalogue and not self.catalogue.path.is_file():
+                # Seed the local snapshot; the column-oriented batch keeps the full scan compact
+                all_movies = await Movie.scan_all(batch=True)
+                existing_ids = set(all_movies.column("id"))
+                self.catalogue.write(movies_to_table(all_movies))
+                del all_movies
+            else:
+                # Only the ids are needed here, don't hydrate every record
+                existing_ids = await Movie.get_existing_ids()
             print(f"Found {len(existing_ids)} existing movies in the database")
         except Exception as e:
             print(f"Error getting existing movies: {e}")
@@ -459,6 +478,9 @@ class ImdbGraphQLScraper:
                 else:
                     break
 
+        if self.catalogue:
+            self.catalogue.flush()
+
         print(f"Total pages processed: {results['pages_processed']}")
         print(f"Total new movies added: {results['total_new']}")
         print(f"Total movies updated: {results['total_updated']}")
@@ -474,7 +496,8 @@ if __name__ == "__main__":
             start_page=1,  # Which page to start on
             max_pages=None,  # How many pages to process (None = all)
             batch_size=1,  # How many pages to process in one batch
-            update_existing=True  # Whether to update existing movie records
+            update_existing=True,  # Whether to update existing movie records
+            catalogue=Catalogue()  # Keep the local Parquet snapshot up to date
         )
         total_movies = await scraper.fetch_all_movies()
         print(f"Total new movies added: {total_movies}")
@@ -0,0 +1,214 @@
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from models.catalogue import Catalogue
+from models.initial_data import InitialData
+from settings import BASE_DIR_SETS
+
+
+def build_inverted_index(column: pa.ChunkedArray) -> Dict[str, np.ndarray]:
+    """
+    Map every value of a list<dictionary<string>> column to the sorted row numbers containing it.
+    Keys are lower-cased so lookups are case-insensitive.
+
+    >>> column = pa.chunked_array([pa.array([["Drama", "Crime"], [], ["drama"]]).cast(
+    ...     pa.list_(pa.dictionary(pa.int32(), pa.string())))])
+    >>> index = build_inverted_index(column)
+    >>> {key: rows.tolist() for key, rows in sorted(index.items())}
+    {'crime': [0], 'drama': [0, 2]}
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.unify_dictionaries() if column.num_chunks else column
+        column = pa.concat_arrays(column.chunks) if column.num_chunks else pa.array([], column.type)
+
+    rows = pc.list_parent_indices(column).to_numpy()
+    values = pc.list_flatten(column)
+    if not isinstance(values.type, pa.DictionaryType):
+        values = values.dictionary_encode()
+    # Group by integer dictionary codes rather than by the strings themselves
+    codes = values.indices.to_numpy(zero_copy_only=False)
+    names = pc.utf8_lower(values.dictionary).to_pylist()
+
+    index: Dict[str, np.ndarray] = {}
+    order = np.argsort(codes, kind="stable")
+    unique_codes, starts = np.unique(codes[order], return_index=True)
+    for code, group in zip(unique_codes, np.split(rows[order], starts[1:])):
+        name = names[code]
+        index[name] = np.union1d(index[name], group) if name in index else np.unique(group)
+    return index
+
+
+class CandidateSearch:
+    """
+    Vectorised query engine over the Movie catalogue used to build sets.
+
+    >>> from decimal import Decimal
+    >>> from models.catalogue import movies_to_table
+    >>> from models.video import Movie, Title
+    >>> search = CandidateSearch(movies_to_table([
+    ...     Movie(id="tt1", title=Title(en="Cliff"), genres=["Thriller"], popularity=30, rating=Decimal("6.9"),
+    ...           runtime=Decimal("5400"), votes=90000, year="2019", imdb_type="Movie", overview="A survival story"),
+    ...     Movie(id="tt2", title=Title(en="Jungle"), genres=["Adventure", "Thriller"], popularity=10,
+    ...           rating=Decimal("6.7"), runtime=Decimal("6900"), votes=150000, year="2017", imdb_type="Movie"),
+    ...     Movie(id="tt3", title=Title(en="Low"), genres=["Thriller"], popularity=5, rating=Decimal("5.1"),
+    ...           runtime=Decimal("5000"), votes=70000, year="2020", imdb_type="Movie"),
+    ...     Movie(id="tt4", title=Title(en="Show"), genres=["Thriller"], popularity=1, rating=Decimal("8.0"),
+    ...           runtime=Decimal("3000"), votes=99000, year="2020", imdb_type="TV Series"),
+    ... ]))
+    >>> search.search(genres=["thriller"], min_rating=6.5, min_votes=50000).column("id").to_pylist()
+    ['tt2', 'tt1']
+    >>> search.search(genres=["thriller"], min_rating=6.5, order_by="rating").column("id").to_pylist()
+    ['tt1', 'tt2']
+    >>> search.search(text="survival").column("id").to_pylist()
+    ['tt1']
+    >>> search.search(genres=["Thriller"], imdb_types=["TV Series"]).column("id").to_pylist()
+    ['tt4']
+    >>> search.search(genres=["Western"]).num_rows
+    0
+    """
+    # Column used for ranking -> True when a higher value is better
+    orderings = {
+        "popularity": False,
+        "rating": True,
+        "votes": True,
+        "year": True,
+    }
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self.rating = self._numpy(table, "rating", np.nan)
+        self.votes = self._numpy(table, "votes", 0)
+        self.year = self._numpy(table, "year", 0)
+        self.runtime = self._numpy(table, "runtime", 0)
+        # IMDb popularity is a rank where 0 means "not ranked": push those to the end
+        popularity = self._numpy(table, "popularity", 0).astype(np.float64)
+        popularity[popularity <= 0] = np.inf
+        self.popularity = popularity
+        self.imdb_type = self._strings(table, "imdb_type")
+        self.genres = build_inverted_index(table.column("genres"))
+        self.actors = build_inverted_index(table.column("actors"))
+
+    @classmethod
+    def from_catalogue(cls, catalogue: Optional[Catalogue] = None) -> "CandidateSearch":
+        """Load the search engine from the local Parquet snapshot"""
+        return cls((catalogue or Catalogue()).read())
+
+    @staticmethod
+    def _numpy(table: pa.Table, name: str, null) -> np.ndarray:
+        return table.column(name).fill_null(null).to_numpy()
+
+    @staticmethod
+    def _strings(table: pa.Table, name: str) -> np.ndarray:
+        column = table.column(name).cast(pa.string()).fill_null("")
+        return pc.utf8_lower(column).to_numpy(zero_copy_only=False)
+
+    def _text_mask(self, name: str, text: str) -> np.ndarray:
+        found = pc.match_substring(self.table.column(name), text, ignore_case=True)
+        return found.fill_null(False).to_numpy()
+
+    def _rows_mask(self, index: Dict[str, np.ndarray], values: Iterable[str]) -> np.ndarray:
+        """Rows containing every one of ``values``"""
+        mask = np.ones(self.table.num_rows, dtype=bool)
+        for value in values:
+            rows = np.zeros(self.table.num_rows, dtype=bool)
+            rows[index.get(value.lower(), [])] = True
+            mask &= rows
+        return mask
+
+    def mask(self, genres: Iterable[str] = (), actors: Iterable[str] = (), min_rating: Optional[float] = None,
+             min_votes: Optional[int] = None, year_from: Optional[int] = None, year_to: Optional[int] = None,
+             runtime_from: Optional[int] = None, runtime_to: Optional[int] = None,
+             imdb_types: Iterable[str] = ("movie",), text: Optional[str] = None,
+             exclude_ids: Iterable[str] = ()) -> np.ndarray:
+        """
+        Boolean row mask for the given filters. Runtimes are in minutes.
+        """
+        mask = self._rows_mask(self.genres, genres) & self._rows_mask(self.actors, actors)
+
+        if min_rating is not None:
+            mask &= self.rating >= min_rating
+        if min_votes is not None:
+            mask &= self.votes >= min_votes
+        if year_from is not None:
+            mask &= self.year >= year_from
+        if year_to is not None:
+            mask &= (self.year <= year_to) & (self.year > 0)
+        if runtime_from is not None:
+            mask &= self.runtime >= runtime_from * 60
+        if runtime_to is not None:
+            mask &= self.runtime <= runtime_to * 60
+        if imdb_types:
+            mask &= np.isin(self.imdb_type, [imdb_type.lower() for imdb_type in imdb_types])
+        if text:
+            mask &= self._text_mask("title", text) | self._text_mask("overview", text)
+        if exclude_ids:
+            mask &= ~pc.is_in(self.table.column("id"), value_set=pa.array(list(exclude_ids))).to_numpy()
+        return mask
+
+    def search(self, limit: int = 10, order_by: str = "popularity", **filters) -> pa.Table:
+        """
+        Top ``limit`` rows matching ``filters`` (see ``mask``) ranked by ``order_by``
+
+        Returns:
+        --------
+        pa.Table
+            Matching catalogue rows, best first
+        """
+        descending = self.orderings[order_by]
+        rows = np.flatnonzero(self.mask(**filters))
+        keys = getattr(self, order_by)[rows]
+        if descending:
+            keys = -keys
+
+        if len(rows) > limit:
+            top = np.argpartition(keys, limit - 1)[:limit]
+            rows, keys = rows[top], keys[top]
+        rows = rows[np.argsort(keys, kind="stable")]
+        return self.table.take(rows)
+
+    @staticmethod
+    def to_initial_data(title: str, rows: pa.Table) -> InitialData:
+        """
+        Build the set JSON accepted by ``main.handler`` from search results.
+        The IMDb overview is used as a starting point for the narrated description.
+
+        >>> from models.catalogue import SCHEMA
+        >>> rows = pa.Table.from_pylist([{"id": "tt1", "title": "Cliff", "overview": "On the edge"}], schema=SCHEMA)
+        >>> CandidateSearch.to_initial_data("Survival", rows).items[0].description
+        Description(ru='', en='On the edge')
+        """
+        return InitialData.from_dict({
+            "title": title,
+            "items": [
+                {"id": row["id"], "title": {"en": row["title"]}, "description": {"en": row["overview"]}}
+                for row in rows.select(["id", "title", "overview"]).to_pylist()
+            ],
+        })
+
+    def build_set(self, title: str, limit: int = 10, order_by: str = "popularity", **filters) -> Path:
+        """
+        Search the catalogue and write ``<BASE_DIR_SETS>/<set>/<set>.json`` ready for ``main.handler``
+
+        Returns:
+        --------
+        Path
+            Location of the written JSON
+        """
+        initial_data = self.to_initial_data(title, self.search(limit=limit, order_by=order_by, **filters))
+        set_dir = BASE_DIR_SETS / initial_data.title_to_dir()
+        set_dir.mkdir(parents=True, exist_ok=True)
+        json_path = set_dir / f"{initial_data.title_to_dir()}.json"
+        with json_path.open("w") as file:
+            json.dump(initial_data.to_dict(), file, indent=4, ensure_ascii=False)
+        return json_path
+
+
+if __name__ == "__main__":
+    engine = CandidateSearch.from_catalogue()
+    path = engine.build_set("Survival", text="survival", min_rating=6.5, min_votes=50000)
+    print(f"Written set to {path}")
@@ -1,18 +1,15 @@
 import logging
-import os
-import subprocess
-from multiprocessing import Pool
 from pathlib import Path
 
 from box import Box
 from ordered_set import OrderedSet
 
 from api.get_videos import GetVideos
-from api.video_editor import make_trailer
+from api.video_editor import make_trailers
 from http_client import HttpClient
 from models.initial_data import InitialData
 from models.video import Item
-from settings import BASE_DIR_MOVIES, HOST_API_TOKEN, WORKERS
+from settings import BASE_DIR_MOVIES, HOST_API_TOKEN
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -33,7 +30,7 @@ class GetMetaData:
     async def wrapper_run(self):
         response = Box(await Item.batch_get_item(ids=self.serializer_object.ids_items()))
         existing_ids = OrderedSet([item.id for item in response.Responses.item])
-        self.items = [Item.from_dict(item) for item in response.Responses.item]
+        self.items = Item.from_dicts(response.Responses.item)
 
         # Find items with videos from original items and add them if not already included
         items_with_videos = [item for item in self.serializer_object.items if item.video]
@@ -67,20 +64,18 @@ class GetMetaData:
 
             await GetVideos(items=self.items, ids=ids_to_process).run()
         await Item.save(self.items)
-        self.run_executions()
+        await self.run_executions()
         await self.do_set()
 
-    def run_executions(self):
-        workers = min(WORKERS, len(self.items))
-        with Pool(workers) as p:
-            p.map(make_trailer, [item for item in self.items])
+    async def run_executions(self):
+        # One task graph for every movie: stages of different movies overlap within per-stage limits
+        await make_trailers(self.items)
 
     async def do_set(self):
         set_folder = self.serializer_object.title_to_dir()
         logger.info(f"do_set : {set_folder}")
         path_to_set = BASE_DIR_MOVIES / "sets" / set_folder
         path_to_set.mkdir(parents=True, exist_ok=True)
-        os.chdir(path_to_set)
 
         files = [item.title_to_dir() for item in self.items]
 
@@ -90,4 +85,6 @@ class GetMetaData:
         for movie_title in files:
             full_path_movie = Path(BASE_DIR_MOVIES, movie_title)
             final_movie = full_path_movie / "final.mp4"
-            subprocess.check_output(f"ln -sf {final_movie} {path_to_set}/{movie_title}.mp4", shell=True)
+            link = path_to_set / f"{movie_title}.mp4"
+            link.unlink(missing_ok=True)
+            link.symlink_to(final_movie)
@@ -5,7 +5,7 @@ from box import Box
 
 from http_client import HttpClient
 from models.video import Video
-from settings import BASE_DIR_MOVIES, YOUTUBE_API_KEY, HOST_API_TOKEN
+from settings import BASE_DIR_MOVIES, YOUTUBE_API_KEY, HOST_API_TOKEN, VIDEO_HEIGHT
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -13,7 +13,7 @@ logger.setLevel(logging.INFO)
 
 class GetVideos:
     url = "/3/movie/{}/videos?language=en-US"
-    size = 1080
+    size = VIDEO_HEIGHT
 
     def __init__(self, items, ids):
         self.items = items
@@ -1,99 +1,181 @@
-import asyncio
 import logging
-import os
-import subprocess
+from typing import Dict, Hashable, Iterable, Optional, Sequence
 
 import aioboto3
-from openai import OpenAI
 
-from clients.aws import AWSS3Client
+from clients.audio import AacCache
+from clients.aws import AWSS3Client, UploadManager
+from clients.download import DownloadManager
+from clients.manifest import StageManifest, atomic_output, input_hash
+from clients.process import progress_logger, run_process
+from clients.tts import SpeechSynthesizer
 from models.video import Item
-from settings import BUCKET_VIDEO, BASE_DIR_MOVIES
+from settings import BUCKET_VIDEO, BASE_DIR, BASE_DIR_MOVIES, TTS_CONCURRENCY, ENCODE_CONCURRENCY, \
+    UPLOAD_CONCURRENCY, ENCODE_TIMEOUT, TTS_MODEL, TTS_VOICE
+from task_graph import SkippedError, TaskGraph
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# The "download" limit is the one of the DownloadManager, see stage_limits
+STAGE_LIMITS = {
+    "tts": TTS_CONCURRENCY,
+    "encode": ENCODE_CONCURRENCY,
+    "upload": UPLOAD_CONCURRENCY,
+}
+# Stages whose output each stage is made from
+UPSTREAM = {
+    "download": (),
+    "tts": (),
+    "encode": ("download", "tts"),
+    "upload": ("download", "tts", "encode"),
+}
+
+# Stream copy of the trailer video and the AAC narration into a regular MP4, its moov moved to
+# the front so that players and Movavi can start it before reading the whole file
+MUX_ARGS = ["-map", "0:v:0", "-map", "1:a:0", "-c", "copy", "-movflags", "+faststart"]
+
+
+def stage_limits(downloads: DownloadManager) -> Dict[str, int]:
+    """Limits of the task graph stages; the download manager splits its rate between its ``limit`` downloads"""
+    return {**STAGE_LIMITS, "download": downloads.limit}
+
 
 class VideoEditor:
-    def __init__(self, item: Item):
-        self.font_path = "static/Mulish-Black.ttf"
+    def __init__(self, item: Item, tts: Optional[SpeechSynthesizer] = None,
+                 downloads: Optional[DownloadManager] = None, aac: Optional[AacCache] = None,
+                 uploads: Optional[UploadManager] = None, re_download: bool = False, re_do_audio: bool = False,
+                 re_add_audio: bool = False, re_upload_files: bool = False):
+        self.font_path = BASE_DIR / "static" / "Mulish-Black.ttf"
         self.item = item
-        self.original = "original.mp4"
-        self.audio = "audio.mp3"
-        self.final = "final.mp4"
-        self.re_download = False
-        self.re_do_audio = False
-        self.re_add_audio = False
-        self.re_upload_files = False
+        # Redo a stage even if the manifest says it's current
+        self.re_download = re_download
+        self.re_do_audio = re_do_audio
+        self.re_add_audio = re_add_audio
+        self.re_upload_files = re_upload_files
         self.dir = str(self.item.title_to_dir())
+        # Absolute paths only: movies are processed concurrently in one process
         self.abs_path = BASE_DIR_MOVIES / self.dir
+        self.original = self.abs_path / "original.mp4"
+        self.audio = self.abs_path / "audio.mp3"
+        self.final = self.abs_path / "final.mp4"
+        self.manifest = StageManifest(self.abs_path)
+        self.made = set()  # stages that ran in this run
         self.session = aioboto3.Session()
+        self.tts = tts or SpeechSynthesizer()
+        self.downloads = downloads or DownloadManager()
+        self.aac = aac or AacCache()
+        self.uploads = uploads or UploadManager()
+
+    async def run(self) -> Dict[Hashable, object]:
+        """Run the pipeline of this movie alone, with its own flags and managers"""
+        graph = TaskGraph(stage_limits(self.downloads))
+        self.add_to_graph(graph)
+        return log_failures(await graph.run())
+
+    def add_to_graph(self, graph: TaskGraph) -> Hashable:
+        """Download and narration run independently, the mux waits for both and the upload for the mux"""
+        print(f"run : {self.dir}")
+        self.abs_path.mkdir(exist_ok=True)
 
-    async def run(self):
-        try:
-            print(f"run : {self.dir}")
+        download = graph.add((self.dir, "download"), "download", self.download)
+        audio = graph.add((self.dir, "tts"), "tts", self.do_audio)
+        mux = graph.add((self.dir, "encode"), "encode", self.add_audio, deps=[download, audio])
+        return graph.add((self.dir, "upload"), "upload", self.upload_files, deps=[mux])
 
-            self.abs_path.mkdir(exist_ok=True)
-            os.chdir(self.abs_path)
-            await self.download()
-            await self.do_audio()
-            await self.add_audio()
-            await self.upload_files()
-        except Exception as e:
-            logger.exception(e)
+    def stage_inputs(self, stage: str) -> str:
+        """Input hash of a stage: its own parameters and the outputs of the stages upstream"""
+        parameters = {
+            "download": (self.item.video.url if self.item.video else None, self.downloads.format_args()),
+            "tts": (self.item.description.en if self.item.description else None, TTS_MODEL, TTS_VOICE,
+                    self.tts.backend.name),
+            "encode": (MUX_ARGS, self.aac.codec_args()),
+            "upload": (BUCKET_VIDEO, self.dir),
+        }[stage]
+        return input_hash(*parameters, *[self.manifest.fingerprint(upstream) for upstream in UPSTREAM[stage]])
+
+    def is_current(self, stage: str, outputs: Sequence = (), force: bool = False) -> bool:
+        if force:
+            return False
+        # Outputs from before the manifest are only trusted while nothing they depend on was redone
+        adopt = not self.made.intersection(UPSTREAM[stage])
+        return self.manifest.is_current(stage, self.stage_inputs(stage), outputs, adopt=adopt)
+
+    def done(self, stage: str, outputs: Sequence = ()):
+        self.manifest.record(stage, self.stage_inputs(stage), outputs)
+        self.made.add(stage)
+
+    def progress(self, stage: str):
+        """Log the progress lines of an external tool with the movie they belong to"""
+        return progress_logger(f"{stage} {self.dir}", logger)
 
     async def download(self):
-        if not os.path.isfile(self.original) or self.re_download:
-            # command = f"yt-dlp --geo-bypass --merge-output-format mp4 --cookies-from-browser 'vivaldi' -o '{self.original}' '{self.item.video.url}'"
-            command = f"yt-dlp --geo-bypass --merge-output-format mp4 -o '{self.original}' '{self.item.video.url}'"
-            try:
-                subprocess.check_output(command, shell=True)
-                print(f"download : {self.original} from {self.item.video.url}")
-                self.re_add_audio = True
-            except Exception as e:
-                print(f"Error downloading, dir: {self.dir}", command)
-                raise e
+        if not self.is_current("download", [self.original], force=self.re_download):
+            with atomic_output(self.original) as part:
+                try:
+                    await self.downloads.download(self.item.video.url, part, on_progress=self.progress("download"))
+                    print(f"download : {self.original} from {self.item.video.url}")
+                except Exception as e:
+                    print(f"Error downloading, dir: {self.dir}", self.item.video.url)
+                    raise e
+            self.done("download", [self.original])
 
     async def do_audio(self):
-        if not os.path.isfile(self.audio) or self.re_do_audio:
+        if not self.is_current("tts", [self.audio], force=self.re_do_audio):
             if self.item.description.en is None:
                 raise RuntimeError(f"Description for {self.item.title.en} is empty. id: {self.item.id}")
             print(f"do_audio: {self.dir}")
-            client = OpenAI()
-            response = client.audio.speech.create(
-                model="tts-1-hd",
-                voice="sage",  # sage, coral
-                input=self.item.description.en,
-            )
-            response.write_to_file(self.audio)
-            print(f'downloaded to {self.audio}')
-            self.re_add_audio = True
+            synthesised = await self.tts.synthesize(self.item.description.en, self.audio, TTS_MODEL, TTS_VOICE)
+            print(f'{"downloaded" if synthesised else "cached"} to {self.audio}')
+            self.done("tts", [self.audio])
 
     async def add_audio(self):
-        if not os.path.isfile(self.final) or self.re_add_audio:
+        if not self.is_current("encode", [self.final], force=self.re_add_audio):
             print(f"add_audio: {self.dir}")
-            command = (
-                f"ffmpeg -y -i {self.original} -i {self.audio} "
-                f"-c:v copy -c:a aac -map 0:v:0 -map 1:a:0 {self.final}"
-            )
-            subprocess.check_output(command, shell=True, stderr=subprocess.STDOUT)
-            self.re_upload_files = True
+            narration = await self.aac.encode(self.audio, on_progress=self.progress("add_audio"))
+            with atomic_output(self.final) as part:
+                command = ["ffmpeg", "-y", "-i", self.original, "-i", narration, *MUX_ARGS, part]
+                await run_process(command, cwd=self.abs_path, timeout=ENCODE_TIMEOUT,
+                                  on_progress=self.progress("add_audio"))
+            self.done("encode", [self.final])
 
     async def upload_files(self):
-        if self.re_upload_files:
+        if not self.is_current("upload", force=self.re_upload_files):
             files = [self.final, self.audio, self.original]
 
             # Create file mappings using a loop
             file_mappings = []
-            for file_name in files:
-                local_path = self.abs_path / file_name
-                s3_key = f"movies/{self.dir}/{file_name}"
+            for local_path in files:
+                s3_key = f"movies/{self.dir}/{local_path.name}"
                 file_mappings.append((local_path, s3_key))
 
-            client = AWSS3Client(file_mappings, BUCKET_VIDEO)
-            await client.upload_files()
+            client = AWSS3Client(file_mappings, BUCKET_VIDEO, uploads=self.uploads,
+                                 on_progress=self.progress("upload"), sync=True)
+            results = await client.upload_files()
+            if results["failure_count"]:
+                raise RuntimeError(f"{results['failure_count']} uploads failed for {self.dir}")
+            self.done("upload")
+
+
+async def make_trailers(items: Iterable[Item], downloads: Optional[DownloadManager] = None) -> Dict[Hashable, object]:
+    """
+    Run the trailer pipeline of many movies as one task graph, returning the result of every
+    ``(movie dir, stage)``; failures are logged and returned as exceptions. All the movies
+    share one download budget, one upload budget and one narration cache.
+    """
+    downloads = downloads or DownloadManager()
+    graph = TaskGraph(stage_limits(downloads))
+    tts = SpeechSynthesizer()
+    aac = AacCache()
+    uploads = UploadManager()
+    for item in items:
+        VideoEditor(item=item, tts=tts, downloads=downloads, aac=aac, uploads=uploads).add_to_graph(graph)
+
+    return log_failures(await graph.run())
 
 
-def make_trailer(item: Item):
-    # Run the async function in a new event loop
-    return asyncio.run(VideoEditor(item=item).run())
+def log_failures(results: Dict[Hashable, object]) -> Dict[Hashable, object]:
+    for (movie_dir, stage), result in results.items():
+        if isinstance(result, Exception) and not isinstance(result, SkippedError):
+            logger.error(f"{stage} failed for {movie_dir}", exc_info=result)
+    return results
@@ -0,0 +1,88 @@
+"""
+Memory of a full-table scan held as a list of Movie models vs. a DataClassBatch.
+
+Builds ``--count`` synthetic movies shaped like the crawled ones (titles, descriptions, genres,
+directors and actors drawn from small vocabularies) and reports the memory each container
+keeps alive, measured with tracemalloc.
+
+    python -m benchmarks.batch_memory --count 50000
+"""
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+from typing import Callable, List
+
+from models.video import DataClassBatch, Movie
+
+GENRES = ["Action", "Adventure", "Comedy", "Crime", "Drama", "Fantasy", "Horror", "Romance", "Sci-Fi", "Thriller"]
+
+
+def movie_dicts(count: int, seed: int = 0) -> List[dict]:
+    """
+    >>> movie_dicts(1)[0]["title"]
+    {'en': 'Movie 0', 'ru': 'Фильм 0'}
+    """
+    rng = random.Random(seed)
+    people = [f"Person {index}" for index in range(count // 4 + 10)]
+    return [{
+        "id": f"tt{index:07d}",
+        "title": {"en": f"Movie {index}", "ru": f"Фильм {index}"},
+        "genres": rng.sample(GENRES, 3),
+        "popularity": rng.randrange(1, 100_000),
+        "rating": str(round(rng.uniform(1, 10), 1)),
+        "runtime": str(rng.randrange(3600, 10800)),
+        "votes": rng.randrange(0, 1_000_000),
+        "year": str(rng.randrange(1950, 2026)),
+        "overview": f"An overview of movie {index}, " + "a story " * 10,
+        "directors": rng.sample(people, 1),
+        "actors": rng.sample(people, 5),
+        "imdb_type": "movie",
+        "description": {"en": f"A description of movie {index}, " + "with a plot " * 15, "ru": ""},
+    } for index in range(count)]
+
+
+def retained(build: Callable[[], object]) -> float:
+    """MiB still allocated once ``build`` returns, while its result is alive"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size / 2 ** 20
+
+
+def run_benchmark(count: int) -> dict:
+    """
+    >>> result = run_benchmark(200)
+    >>> result["batch_mb"] < result["list_mb"]
+    True
+    """
+    # The records are decoded inside the measurement, as a scan does, so strings they share
+    # with the models are counted
+    list_mb = retained(lambda: Movie.from_dicts(movie_dicts(count)))
+    batch_mb = retained(lambda: DataClassBatch.from_dicts(Movie, movie_dicts(count)))
+    return {
+        "count": count,
+        "list_mb": round(list_mb, 2),
+        "batch_mb": round(batch_mb, 2),
+        "ratio": round(list_mb / batch_mb, 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=50_000, help="number of movies")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.count)
+    print(f"{result['count']} movies: list {result['list_mb']} MiB, batch {result['batch_mb']} MiB "
+          f"({result['ratio']}x less)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
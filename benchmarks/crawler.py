@@ -0,0 +1,203 @@
+"""
+Crawler throughput benchmark.
+
+Replays recorded ``AdvancedTitleSearch`` pages through a local stub server into an in-process
+fake DynamoDB and reports pages/sec, titles/sec, p50/p99 page latency and peak memory for
+``ImdbGraphQLScraper``. Every run is appended to a results file keyed by git commit and compared
+with the previous commit's run.
+
+    python -m benchmarks.crawler --repeat 50
+    python -m benchmarks.crawler --record 5   # refresh fixtures from the live API
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+from unittest.mock import patch
+
+from api.fetch_all_movies import ImdbGraphQLScraper
+from benchmarks.fake_dynamo import FakeDynamoDB
+from benchmarks.stub_server import GraphQLStubServer
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "advanced_title_search"
+RESULTS_PATH = Path(__file__).parent / "results.jsonl"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile
+
+    >>> percentile([5, 1, 3, 2, 4], 50)
+    3
+    >>> percentile(list(range(1, 101)), 99)
+    99
+    >>> percentile([], 50)
+    0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def load_pages(directory: Path = FIXTURES_DIR) -> List[dict]:
+    return [json.loads(path.read_text()) for path in sorted(directory.glob("page_*.json"))]
+
+
+class TimedScraper(ImdbGraphQLScraper):
+    """ImdbGraphQLScraper recording the latency of every page (fetch + process + save)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+        self.titles = 0
+        self._page_started = 0.0
+
+    async def _fetch_page(self, after_token: Optional[str] = None):
+        self._page_started = time.perf_counter()
+        return await super()._fetch_page(after_token)
+
+    async def _process_and_save_page(self, page_data, existing_ids, current_page):
+        results = await super()._process_and_save_page(page_data, existing_ids, current_page)
+        self.latencies.append(time.perf_counter() - self._page_started)
+        self.titles += len(page_data.get("data", {}).get("advancedTitleSearch", {}).get("edges", []))
+        return results
+
+
+async def run_benchmark(pages: List[dict], repeat: int = 1, latency: float = 0.0,
+                        trace_memory: bool = False, verbose: bool = False) -> dict:
+    """
+    Crawl ``len(pages) * repeat`` replayed pages and return the measured metrics
+
+    >>> result = asyncio.run(run_benchmark(load_pages(), repeat=2))
+    >>> result["pages"], result["titles"], result["new"]
+    (4, 20, 20)
+    """
+    dynamo = FakeDynamoDB()
+    if trace_memory:
+        tracemalloc.start()
+
+    with patch("aioboto3.Session", dynamo.session):
+        async with GraphQLStubServer(pages, repeat=repeat, latency=latency) as server:
+            scraper = TimedScraper(throttle=False)
+            scraper.host = server.host
+            scraper.scheme = "http"
+
+            output = sys.stdout if verbose else open(os.devnull, "w")
+            with contextlib.redirect_stdout(output):
+                started = time.perf_counter()
+                results = await scraper.fetch_all_movies()
+                elapsed = time.perf_counter() - started
+            if not verbose:
+                output.close()
+
+    peak_traced = None
+    if trace_memory:
+        peak_traced = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    return {
+        "pages": results["pages_processed"],
+        "titles": scraper.titles,
+        "new": results["total_new"],
+        "updated": results["total_updated"],
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(results["pages_processed"] / elapsed, 2),
+        "titles_per_sec": round(scraper.titles / elapsed, 2),
+        "p50_ms": round(percentile(scraper.latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(scraper.latencies, 99) * 1000, 3),
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_traced_mb": round(peak_traced, 2) if peak_traced is not None else None,
+    }
+
+
+def current_commit() -> str:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"]).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def compare(result: dict, previous: Optional[dict], threshold: float) -> bool:
+    """
+    Print the change against the previous commit; False when titles/sec regressed beyond ``threshold``
+
+    >>> compare({"titles_per_sec": 80, "p99_ms": 10}, {"commit": "abc", "titles_per_sec": 100, "p99_ms": 9}, 0.1)
+    titles_per_sec: 100 -> 80 (-20.0%) vs abc
+    p99_ms: 9 -> 10 (+11.1%) vs abc
+    False
+    """
+    if not previous:
+        return True
+    for metric in ("titles_per_sec", "p99_ms"):
+        before, after = previous[metric], result[metric]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{metric}: {before} -> {after} ({change:+.1f}%) vs {previous['commit']}")
+    return result["titles_per_sec"] >= previous["titles_per_sec"] * (1 - threshold)
+
+
+def record_run(result: dict, path: Path = RESULTS_PATH) -> Optional[dict]:
+    """Append ``result`` to the results file and return the latest run of a different commit"""
+    history = [json.loads(line) for line in path.read_text().splitlines()] if path.is_file() else []
+    previous = next((run for run in reversed(history) if run["commit"] != result["commit"]), None)
+    with path.open("a") as file:
+        file.write(json.dumps(result) + "\n")
+    return previous
+
+
+async def record_pages(count: int, directory: Path = FIXTURES_DIR) -> None:
+    """Fetch ``count`` live pages and store them as fixtures"""
+    scraper = ImdbGraphQLScraper()
+    directory.mkdir(parents=True, exist_ok=True)
+    after_token = None
+    for index in range(1, count + 1):
+        data = await scraper._fetch_page(after_token)
+        (directory / f"page_{index:03d}.json").write_text(json.dumps(data, indent=2, ensure_ascii=False))
+        page_info = data.get("data", {}).get("advancedTitleSearch", {}).get("pageInfo", {})
+        print(f"Recorded page {index}")
+        after_token = page_info.get("endCursor")
+        if not page_info.get("hasNextPage"):
+            break
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="replay the recorded pages this many times")
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial server latency per page (s)")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the tracemalloc peak (slower)")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed titles/sec regression")
+    parser.add_argument("--results", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--record", type=int, metavar="PAGES", help="record live pages into the fixtures")
+    parser.add_argument("--verbose", action="store_true", help="show the crawler output")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record_pages(args.record))
+        return 0
+
+    result = asyncio.run(run_benchmark(load_pages(), args.repeat, args.latency, args.trace_memory, args.verbose))
+    result.update({"commit": current_commit(), "date": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+    print(json.dumps(result, indent=2))
+
+    previous = record_run(result, args.results)
+    if not compare(result, previous, args.threshold):
+        print(f"Regression: titles/sec dropped more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import copy
+from collections import defaultdict
+from typing import Dict, Optional
+
+
+class FakeTable:
+    """In-memory stand-in for an aioboto3 DynamoDB Table"""
+
+    def __init__(self, items: Dict[str, dict], page_size: int):
+        self.items = items
+        self.page_size = page_size
+
+    async def scan(self, ExclusiveStartKey: Optional[dict] = None, ProjectionExpression: Optional[str] = None,
+                   Select: Optional[str] = None, **kwargs) -> dict:
+        keys = list(self.items)
+        start = keys.index(ExclusiveStartKey["id"]) + 1 if ExclusiveStartKey else 0
+        page = keys[start:start + self.page_size]
+
+        response = {"Count": len(page), "ScannedCount": len(page)}
+        if Select != "COUNT":
+            if ProjectionExpression:
+                names = [name.strip() for name in ProjectionExpression.split(",")]
+                response["Items"] = [{name: self.items[key][name] for name in names} for key in page]
+            else:
+                response["Items"] = [copy.deepcopy(self.items[key]) for key in page]
+        if start + self.page_size < len(keys):
+            response["LastEvaluatedKey"] = {"id": page[-1]}
+        return response
+
+    async def get_item(self, Key: dict, **kwargs) -> dict:
+        item = self.items.get(Key["id"])
+        return {"Item": copy.deepcopy(item)} if item is not None else {}
+
+    async def put_item(self, Item: dict, **kwargs) -> dict:
+        self.items[Item["id"]] = copy.deepcopy(Item)
+        return {}
+
+    async def delete_item(self, Key: dict, **kwargs) -> dict:
+        self.items.pop(Key["id"], None)
+        return {}
+
+    def batch_writer(self) -> "FakeTable":
+        return self
+
+    async def __aenter__(self) -> "FakeTable":
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+
+class FakeResource:
+    def __init__(self, dynamo: "FakeDynamoDB"):
+        self.dynamo = dynamo
+
+    async def Table(self, name: str) -> FakeTable:
+        return FakeTable(self.dynamo.tables[name], self.dynamo.page_size)
+
+    async def batch_get_item(self, RequestItems: dict) -> dict:
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.dynamo.tables[name]
+            responses[name] = [copy.deepcopy(table[key["id"]]) for key in request["Keys"] if key["id"] in table]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    async def __aenter__(self) -> "FakeResource":
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+
+class FakeSession:
+    def __init__(self, dynamo: "FakeDynamoDB"):
+        self.dynamo = dynamo
+
+    def resource(self, service_name: str, **kwargs) -> FakeResource:
+        if service_name != "dynamodb":
+            raise NotImplementedError(f"FakeSession only provides dynamodb, not {service_name}")
+        return FakeResource(self.dynamo)
+
+
+class FakeDynamoDB:
+    """
+    In-process DynamoDB used by benchmarks and tests in place of ``aioboto3.Session``.
+
+    >>> import asyncio
+    >>> from unittest.mock import patch
+    >>> from models.video import Movie, Title
+    >>> dynamo = FakeDynamoDB(page_size=1)
+    >>> movies = [Movie(id=f"tt{i}", title=Title(en=str(i)), genres=[], popularity=i, rating=7, runtime=60, votes=1)
+    ...           for i in range(3)]
+    >>> with patch("aioboto3.Session", dynamo.session):
+    ...     asyncio.run(Movie.save(movies))
+    ...     sorted(asyncio.run(Movie.get_existing_ids()))
+    ...     len(asyncio.run(Movie.scan_all()))
+    ['tt0', 'tt1', 'tt2']
+    3
+    """
+
+    def __init__(self, page_size: int = 1000):
+        self.page_size = page_size
+        self.tables: Dict[str, Dict[str, dict]] = defaultdict(dict)
+
+    def session(self, *args, **kwargs) -> FakeSession:
+        return FakeSession(self)
@@ -0,0 +1,76 @@
+import asyncio
+import copy
+import json
+from typing import List, Optional
+
+from aiohttp import web
+
+
+class GraphQLStubServer:
+    """
+    Local HTTP server replaying recorded ``AdvancedTitleSearch`` pages.
+
+    The recorded pages are served in order; the pagination cursor is rewritten to the index of the
+    next page. With ``repeat`` > 1 the pages are replayed again with suffixed title ids so every
+    round produces new titles.
+    """
+
+    def __init__(self, pages: List[dict], repeat: int = 1, latency: float = 0.0):
+        self.pages = pages
+        self.repeat = repeat
+        self.latency = latency
+        self.requests = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.host = ""
+
+    @property
+    def total_pages(self) -> int:
+        return len(self.pages) * self.repeat
+
+    def page(self, index: int) -> dict:
+        """
+        >>> pages = [{"data": {"advancedTitleSearch": {"pageInfo": {}, "edges": [{"node": {"title": {"id": "tt1"}}}]}}}]
+        >>> server = GraphQLStubServer(pages, repeat=2)
+        >>> server.page(0)["data"]["advancedTitleSearch"]["pageInfo"]
+        {'hasNextPage': True, 'endCursor': '1'}
+        >>> server.page(1)["data"]["advancedTitleSearch"]["edges"][0]["node"]["title"]["id"]
+        'tt1r1'
+        >>> server.page(1)["data"]["advancedTitleSearch"]["pageInfo"]["hasNextPage"]
+        False
+        """
+        data = copy.deepcopy(self.pages[index % len(self.pages)])
+        search = data["data"]["advancedTitleSearch"]
+
+        replay = index // len(self.pages)
+        if replay:
+            for edge in search["edges"]:
+                title = edge["node"]["title"]
+                title["id"] = f"{title['id']}r{replay}"
+
+        search["pageInfo"] = {"hasNextPage": index + 1 < self.total_pages, "endCursor": str(index + 1)}
+        return data
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        variables = json.loads(request.query.get("variables", "{}"))
+        index = int(variables.get("after") or 0)
+        if index >= self.total_pages:
+            return web.json_response({"errors": [{"message": "page out of range"}]}, status=404)
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response(self.page(index))
+
+    async def __aenter__(self) -> "GraphQLStubServer":
+        app = web.Application()
+        app.router.add_get("/", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.host = f"127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *args):
+        await self.runner.cleanup()
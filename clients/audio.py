@@ -0,0 +1,61 @@
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from clients.manifest import atomic_output
+from clients.process import run_process
+from settings import AAC_CACHE_DIR, ENCODE_TIMEOUT, NARRATION_BITRATE
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AacCache:
+    """
+    Narrations encoded to AAC once, so that assembling a trailer is a stream copy.
+
+    Encodings are cached by the content of the source audio and the encoder settings, and
+    concurrent requests for the same narration share one ffmpeg run.
+
+    >>> AacCache(Path("/tmp/aac"), bitrate="128k").codec_args()
+    ['-vn', '-c:a', 'aac', '-b:a', '128k']
+    """
+
+    def __init__(self, cache_dir: Path = AAC_CACHE_DIR, bitrate: str = NARRATION_BITRATE,
+                 timeout: Optional[float] = ENCODE_TIMEOUT):
+        self.cache_dir = Path(cache_dir)
+        self.bitrate = bitrate
+        self.timeout = timeout
+        self._pending: Dict[Path, asyncio.Future] = {}
+
+    def codec_args(self) -> List[str]:
+        return ["-vn", "-c:a", "aac", "-b:a", self.bitrate]
+
+    async def cache_path(self, audio: Path) -> Path:
+        # Hashing a narration reads all of it, which mustn't block the other movies
+        source = await asyncio.to_thread(file_hash, audio)
+        key = hashlib.sha256(f"{source}\0{self.codec_args()}".encode()).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.m4a"
+
+    async def encode(self, audio: Path, on_progress: Optional[Callable[[str], None]] = None) -> Path:
+        """Path of the AAC encoding of ``audio``, encoding it if it isn't cached yet"""
+        cached = await self.cache_path(audio)
+        if not cached.is_file():
+            pending = self._pending.get(cached)
+            if pending is None:
+                pending = self._pending[cached] = asyncio.ensure_future(self._encode(audio, cached, on_progress))
+                pending.add_done_callback(lambda _: self._pending.pop(cached, None))
+            await asyncio.shield(pending)
+        return cached
+
+    async def _encode(self, audio: Path, cached: Path, on_progress: Optional[Callable[[str], None]]) -> None:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(cached) as part:
+            await run_process(["ffmpeg", "-y", "-i", audio, *self.codec_args(), part], timeout=self.timeout,
+                              on_progress=on_progress)
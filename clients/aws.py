@@ -1,38 +1,211 @@
 import asyncio
+import hashlib
+import json
+import math
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 
 import aioboto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from clients.manifest import StageManifest, write_atomic
+from settings import S3_MAX_IN_FLIGHT, S3_MULTIPART_CHUNKSIZE, S3_PART_CONCURRENCY
+
+ETAG_CACHE_NAME = ".etags.json"
+MiB = 1024 * 1024
+BOTO3_CHUNKSIZE = 8 * MiB
+
+
+def s3_etag(path: Path, part_size: Optional[int] = None) -> str:
+    """
+    ETag S3 gives ``path``: the MD5 of the file, or when it was uploaded in parts of
+    ``part_size`` bytes, the MD5 of the MD5s of the parts followed by their number
+
+    >>> import tempfile
+    >>> path = Path(tempfile.mkdtemp()) / "final.mp4"
+    >>> _ = path.write_bytes(b"0123456789")
+    >>> s3_etag(path)
+    '781e5e245d69b566979b86e28d23f2c7'
+    >>> s3_etag(path, part_size=4)
+    '61e3716e3a7767581863b67c4e785584-3'
+    """
+    whole, digests = hashlib.md5(), []
+    with open(path, "rb") as file:
+        while chunk := file.read(part_size or MiB):
+            if part_size is None:
+                whole.update(chunk)
+            else:
+                digests.append(hashlib.md5(chunk).digest())
+    if part_size is None:
+        return whole.hexdigest()
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+def part_sizes(size: int, etag: str, chunk_size: int) -> List[Optional[int]]:
+    """
+    Part sizes that could have produced a remote ``etag``: None for a plain MD5, else ours,
+    boto3's default and the smallest whole MiB giving as many parts, when they fit
+
+    >>> part_sizes(100, "781e5e245d69b566979b86e28d23f2c7", 64 * MiB)
+    [None]
+    >>> part_sizes(20 * MiB, "61e3716e3a7767581863b67c4e785584-3", 64 * MiB)
+    [8388608, 7340032]
+    """
+    if "-" not in etag:
+        return [None]
+    parts = int(etag.rsplit("-", 1)[1])
+    candidates = [chunk_size, BOTO3_CHUNKSIZE, math.ceil(size / parts / MiB) * MiB]
+    return [part_size for index, part_size in enumerate(candidates)
+            if part_size and math.ceil(size / part_size) == parts and part_size not in candidates[:index]]
+
+
+class EtagCache:
+    """
+    S3 ETags of the files of a directory, kept in ``.etags.json`` and computed again only when
+    the size or mtime of a file changed
+    """
+
+    def __init__(self, directory: Path):
+        self.path = Path(directory) / ETAG_CACHE_NAME
+        self.entries: Dict[str, dict] = {}
+        self.changed = False
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except ValueError:
+                print(f"Ignoring unreadable ETag cache {self.path}")
+
+    def etag(self, path: Path, part_size: Optional[int]) -> str:
+        identity = StageManifest.file_identity(path)
+        entry = self.entries.get(path.name)
+        if entry is None or entry["identity"] != identity:
+            entry = self.entries[path.name] = {"identity": identity, "etags": {}}
+        etags = entry["etags"]
+        if str(part_size) not in etags:
+            etags[str(part_size)] = s3_etag(path, part_size)
+            self.changed = True
+        return etags[str(part_size)]
+
+    def save(self) -> None:
+        if self.changed:
+            write_atomic(self.path, json.dumps(self.entries, indent=2, sort_keys=True).encode())
+            self.changed = False
+
+
+def progress_callback(file_path: Path, size: int, on_progress: Callable[[str], None]) -> Callable[[int], None]:
+    """
+    S3 transfer ``Callback``: adds up the bytes sent and reports them as a progress line
+
+    >>> callback = progress_callback(Path("final.mp4"), 200, print)
+    >>> callback(50); callback(150)
+    final.mp4: 50 of 200 bytes (25%)
+    final.mp4: 200 of 200 bytes (100%)
+    """
+    sent = 0
+
+    def callback(bytes_sent: int):
+        nonlocal sent
+        sent += bytes_sent
+        on_progress(f"{file_path.name}: {sent} of {size} bytes ({sent * 100 // max(size, 1)}%)")
+    return callback
+
+
+class UploadManager:
+    """
+    S3 uploads sharing one budget across all the batches of a run.
+
+    At most ``limit`` files are in flight at a time. Files of ``chunk_size`` bytes or more are
+    sent as multipart uploads, ``part_concurrency`` parts at a time, with no more parts read
+    ahead than are being sent; the connection pool has room for every part in flight.
+
+    >>> manager = UploadManager(limit=4, chunk_size=8 * 1024 * 1024, part_concurrency=6)
+    >>> manager.transfer_config.multipart_chunksize, manager.transfer_config.max_request_concurrency
+    (8388608, 6)
+    >>> manager.client_config().max_pool_connections
+    24
+
+    Listings of the prefixes synced to are cached for the run (see ``AWSS3Client.sync``).
+    """
+
+    def __init__(self, limit: int = S3_MAX_IN_FLIGHT, chunk_size: int = S3_MULTIPART_CHUNKSIZE,
+                 part_concurrency: int = S3_PART_CONCURRENCY):
+        self.limit = limit
+        self.part_concurrency = part_concurrency
+        self.transfer_config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size,
+                                              max_concurrency=part_concurrency, max_io_queue=part_concurrency,
+                                              io_chunksize=1024 * 1024)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.listings: Dict[Tuple[str, str], Dict[str, Tuple[int, str]]] = {}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def client_config(self) -> Config:
+        return Config(max_pool_connections=self.limit * self.part_concurrency)
+
+    async def listing(self, s3, bucket_name: str, prefix: str) -> Dict[str, Tuple[int, str]]:
+        """Size and ETag of every object under ``prefix``, listed once per run"""
+        if (bucket_name, prefix) not in self.listings:
+            objects = {}
+            async for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=prefix):
+                for item in page.get("Contents", []):
+                    objects[item["Key"]] = (item["Size"], item["ETag"].strip('"'))
+            self.listings[(bucket_name, prefix)] = objects
+        return self.listings[(bucket_name, prefix)]
+
+    def forget(self, bucket_name: str, prefix: str) -> None:
+        """Drop the listing of a prefix that was just uploaded to"""
+        self.listings.pop((bucket_name, prefix), None)
 
 
 class AWSS3Client:
-    def __init__(self, file_mappings, bucket_name):
+    def __init__(self, file_mappings, bucket_name, uploads: Optional[UploadManager] = None,
+                 on_progress: Optional[Callable[[str], None]] = None, sync: bool = False):
         """
         Initialize the S3 client
 
         Args:
             file_mappings: List of tuples (file_path, s3_key)
             bucket_name: Name of the S3 bucket
+            uploads: Budget shared with the other batches of the run
+            on_progress: Called with a progress line as the parts of every file are sent
+            sync: Skip the files already on S3 with the same size and ETag
         """
         self.session = aioboto3.Session()
         self.file_mappings = file_mappings  # List of tuples (file_path, s3_key)
         self.bucket_name = bucket_name
+        self.uploads = uploads or UploadManager()
+        self.on_progress = on_progress
+        self.sync = sync
 
     async def upload_files(self):
-        """Upload multiple files concurrently to S3"""
-        tasks = [self.upload(file_path, s3_key) for file_path, s3_key in self.file_mappings]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        """Upload multiple files concurrently to S3, through one client for the whole batch"""
+        async with self.session.client("s3", config=self.uploads.client_config()) as s3:
+            mappings, skipped = self.file_mappings, []
+            if self.sync:
+                mappings, skipped = await self.changed(s3)
+            tasks = [self.upload(s3, file_path, s3_key) for file_path, s3_key in mappings]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            if self.sync and mappings:
+                for prefix in {self.prefix(s3_key) for _, s3_key in mappings}:
+                    self.uploads.forget(self.bucket_name, prefix)
 
         # Process results to identify failures
         successes = []
         failures = []
         for i, result in enumerate(results):
-            file_path, s3_key = self.file_mappings[i]
+            file_path, s3_key = mappings[i]
             if isinstance(result, Exception):
                 failures.append((file_path, s3_key, result))
             else:
                 successes.append((file_path, s3_key))
 
-        print(f"Uploaded {len(successes)} of {len(results)} files successfully")
+        print(f"Uploaded {len(successes)} of {len(results)} files successfully"
+              + (f", {len(skipped)} unchanged" if self.sync else ""))
 
         if failures:
             print("Failed uploads:")
@@ -42,15 +215,50 @@ class AWSS3Client:
         return {
             "successes": successes,  # Tuple of (file_path, s3_key)
             "failures": failures,  # Tuple of (file_path, s3_key, exception)
+            "skipped": skipped,  # Tuple of (file_path, s3_key), unchanged on S3
             "total_files": len(self.file_mappings),
             "success_count": len(successes),
-            "failure_count": len(failures)
+            "failure_count": len(failures),
+            "skipped_count": len(skipped),
         }
 
-    async def upload(self, file_path: Path, s3_key: str) -> str:
-        """Upload a single file to S3
+    @staticmethod
+    def prefix(s3_key: str) -> str:
+        """
+        >>> AWSS3Client.prefix("movies/uncharted/final.mp4")
+        'movies/uncharted/'
+        """
+        return s3_key.rsplit("/", 1)[0] + "/" if "/" in s3_key else ""
+
+    async def changed(self, s3) -> Tuple[list, list]:
+        """Split the file mappings into the files to upload and the ones unchanged on S3"""
+        changed, unchanged = [], []
+        caches: Dict[Path, EtagCache] = {}
+        for file_path, s3_key in self.file_mappings:
+            remote = (await self.uploads.listing(s3, self.bucket_name, self.prefix(s3_key))).get(s3_key)
+            if remote is None or not file_path.is_file():
+                changed.append((file_path, s3_key))
+                continue
+            cache = caches.setdefault(file_path.parent, EtagCache(file_path.parent))
+            same = await asyncio.to_thread(self.is_same, cache, file_path, *remote)
+            (unchanged if same else changed).append((file_path, s3_key))
+
+        for cache in caches.values():
+            cache.save()
+        return changed, unchanged
+
+    def is_same(self, cache: EtagCache, file_path: Path, size: int, etag: str) -> bool:
+        """Whether the local file has the size and ETag of the object on S3"""
+        if file_path.stat().st_size != size:
+            return False
+        chunk_size = self.uploads.transfer_config.multipart_chunksize
+        return any(cache.etag(file_path, part_size) == etag for part_size in part_sizes(size, etag, chunk_size))
+
+    async def upload(self, s3, file_path: Path, s3_key: str) -> str:
+        """Upload a single file to S3 once a slot of the budget is free
 
         Args:
+            s3: S3 client of the batch
             file_path: Complete path to the file to upload
             s3_key: S3 key for the file
 
@@ -65,11 +273,13 @@ class AWSS3Client:
         if not file_path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
 
-        print(f"Uploading {file_path.name} to {s3_key}")
+        callback = None
+        if self.on_progress:
+            callback = progress_callback(file_path, file_path.stat().st_size, self.on_progress)
 
-        # Upload the file
-        async with self.session.client("s3") as s3:
-            with open(file_path, "rb") as file_data:
-                await s3.upload_fileobj(file_data, self.bucket_name, s3_key)
+        async with self.uploads.semaphore:
+            print(f"Uploading {file_path.name} to {s3_key}")
+            await s3.upload_file(str(file_path), self.bucket_name, s3_key, Callback=callback,
+                                 Config=self.uploads.transfer_config)
 
         return s3_key
@@ -0,0 +1,59 @@
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from clients.process import run_process
+from settings import DOWNLOAD_CONCURRENCY, DOWNLOAD_FRAGMENTS, DOWNLOAD_RATE_LIMIT, DOWNLOAD_TIMEOUT, VIDEO_HEIGHT
+
+
+def format_selector(height: int) -> str:
+    """
+    yt-dlp format: the best video up to ``height`` with the best audio, or the best single file
+    up to ``height``; sources without any such format fall back to the best available
+
+    >>> format_selector(1080)
+    'bv*[height<=1080]+ba/b[height<=1080]/bv*+ba/b'
+    """
+    return f"bv*[height<={height}]+ba/b[height<={height}]/bv*+ba/b"
+
+
+class DownloadManager:
+    """
+    yt-dlp downloads sharing one budget across all the movies of a run.
+
+    ``limit`` is how many downloads run at a time; the task graph enforces it as the limit of
+    its "download" stage, and each download fetches ``fragments`` fragments of DASH/HLS streams
+    in parallel, capped at an equal share of ``rate_limit`` (bytes/s, unlimited if None).
+    Formats above ``height`` are never fetched. Partial downloads are resumed: yt-dlp's
+    ``.part`` files survive a failed or killed run because the output name is stable.
+
+    >>> manager = DownloadManager(limit=2, fragments=4, height=720, rate_limit=10_000_000)
+    >>> " ".join(manager.command("https://youtu.be/x", Path(".original.tmp.mp4")))
+    'yt-dlp -f bv*[height<=720]+ba/b[height<=720]/bv*+ba/b --merge-output-format mp4 --geo-bypass -N 4 \
+--continue --limit-rate 5000000 -q --progress --newline -o .original.tmp.mp4 https://youtu.be/x'
+    """
+
+    def __init__(self, limit: int = DOWNLOAD_CONCURRENCY, fragments: int = DOWNLOAD_FRAGMENTS,
+                 height: int = VIDEO_HEIGHT, rate_limit: Optional[int] = DOWNLOAD_RATE_LIMIT,
+                 timeout: Optional[float] = DOWNLOAD_TIMEOUT):
+        self.limit = limit
+        self.fragments = fragments
+        self.height = height
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+
+    def format_args(self) -> List[str]:
+        """Arguments deciding what is downloaded, as opposed to how"""
+        # "--cookies-from-browser", "vivaldi",
+        return ["-f", format_selector(self.height), "--merge-output-format", "mp4", "--geo-bypass"]
+
+    def command(self, url: str, output: Path) -> List[str]:
+        command = ["yt-dlp", *self.format_args(), "-N", str(self.fragments), "--continue"]
+        if self.rate_limit:
+            command += ["--limit-rate", str(self.rate_limit // self.limit)]
+        # -q --progress --newline: only the progress lines, on stderr
+        return command + ["-q", "--progress", "--newline", "-o", str(output), url]
+
+    async def download(self, url: str, output: Path, on_progress: Optional[Callable[[str], None]] = None) -> None:
+        """Download ``url`` to ``output``; the caller bounds how many run at a time"""
+        await run_process(self.command(url, output), cwd=Path(output).parent, timeout=self.timeout,
+                          on_progress=on_progress)
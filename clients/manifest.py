@@ -0,0 +1,113 @@
+import contextlib
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+MANIFEST_NAME = "manifest.json"
+
+
+def input_hash(*inputs) -> str:
+    """
+    Hash of everything a stage output depends on; an upstream output is represented by its
+    ``StageManifest.fingerprint``
+
+    >>> input_hash("https://youtu.be/x", ["--geo-bypass"]) == input_hash("https://youtu.be/x", ["--geo-bypass"])
+    True
+    >>> input_hash("https://youtu.be/x") == input_hash("https://youtu.be/y")
+    False
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    with atomic_output(path) as part:
+        part.write_bytes(data)
+
+
+@contextlib.contextmanager
+def atomic_output(path: Path) -> Iterator[Path]:
+    """
+    Temporary path next to ``path``, moved over it only when the block succeeds, so an
+    interrupted write never leaves a partial file under the final name. The extension is
+    kept since ffmpeg and yt-dlp pick the container from it.
+
+    >>> import tempfile
+    >>> path = Path(tempfile.mkdtemp()) / "final.mp4"
+    >>> with atomic_output(path) as part:
+    ...     _ = part.write_bytes(b"media")
+    ...     part.name, path.exists()
+    ('.final.tmp.mp4', False)
+    >>> path.read_bytes()
+    b'media'
+    """
+    part = path.with_name(f".{path.stem}.tmp{path.suffix}")
+    part.unlink(missing_ok=True)
+    try:
+        yield part
+        os.replace(part, path)
+    finally:
+        part.unlink(missing_ok=True)
+
+
+class StageManifest:
+    """
+    Record of the inputs each stage output of a movie was made from, kept in ``manifest.json``.
+
+    A stage is current when its input hash is unchanged and its outputs still exist with the
+    size and mtime they were written with. Movies processed before the manifest existed have none: their
+    existing outputs are adopted as current once instead of being made again, unless ``adopt``
+    is false (e.g. an upstream stage was just redone).
+
+    >>> import tempfile
+    >>> directory = Path(tempfile.mkdtemp())
+    >>> audio = directory / "audio.mp3"
+    >>> manifest = StageManifest(directory)
+    >>> manifest.is_current("tts", input_hash("text"), [audio])
+    False
+    >>> _ = audio.write_bytes(b"speech")
+    >>> manifest.record("tts", input_hash("text"), [audio])
+    >>> StageManifest(directory).is_current("tts", input_hash("text"), [audio])
+    True
+    >>> StageManifest(directory).is_current("tts", input_hash("new text"), [audio])
+    False
+    """
+
+    def __init__(self, directory: Path):
+        self.path = Path(directory) / MANIFEST_NAME
+        self.legacy = not self.path.exists()
+        self.stages: Dict[str, dict] = {}
+        if not self.legacy:
+            try:
+                self.stages = json.loads(self.path.read_text())
+            except ValueError:
+                print(f"Ignoring unreadable manifest {self.path}")
+
+    def is_current(self, stage: str, inputs: str, outputs: Sequence[Path] = (), adopt: bool = True) -> bool:
+        if self.legacy and adopt and stage not in self.stages and all(output.is_file() for output in outputs):
+            self.record(stage, inputs, outputs)
+
+        entry = self.stages.get(stage)
+        if entry is None or entry["inputs"] != inputs:
+            return False
+        return all(output.is_file() and self.file_identity(output) == entry["outputs"].get(output.name)
+                   for output in outputs)
+
+    @staticmethod
+    def file_identity(path: Path) -> list:
+        stat = path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def fingerprint(self, stage: str) -> Optional[dict]:
+        """What the current outputs of ``stage`` are, for the input hash of the stages using them"""
+        return self.stages.get(stage)
+
+    def record(self, stage: str, inputs: str, outputs: Sequence[Path] = ()) -> None:
+        """Mark the outputs of ``stage`` as made from ``inputs``"""
+        self.stages[stage] = {
+            "inputs": inputs,
+            "outputs": {output.name: self.file_identity(output) for output in outputs},
+        }
+        write_atomic(self.path, json.dumps(self.stages, indent=2, sort_keys=True).encode())
+
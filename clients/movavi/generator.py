@@ -1,10 +1,12 @@
+import io
 import os
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
 
 from clients.movavi.schema import MovaviObject, Predeclarator, ProjectContent, TimelineObject, VideoTrack, File, \
-    AudioTrack, TimelineTrack, TimelineClip, EditorCollectionUserObject, ImportObject
-from utils import extract_filename, get_video_metadata
+    AudioTrack, TimelineTrack, TimelineClip, EditorCollectionUserObject, ImportObject, FilePath
+from clients.movavi.writer import XmlWriter
+from utils import extract_filename, get_video_metadata, get_detailed_audio_properties
 
 
 class MovaviProjectGenerator:
@@ -12,157 +14,256 @@ class MovaviProjectGenerator:
 
     def __init__(self, start_id=6589000):
         self.objects = {}
+        self.types: Dict[str, Dict[int, MovaviObject]] = defaultdict(dict)  # objects by object_type
         self.root_ref = None
         self.next_id = start_id  # Use higher starting ID to match original XML
+        self.predeclarator: Optional[Predeclarator] = None
+        self.timeline: Optional["TimelineBuilder"] = None
 
     def get_next_id(self) -> int:
-        """Get the next available object ID with spacing similar to original XML"""
+        """Get the next available object ID; every ID of the project comes from here"""
         self.next_id += 1
         return self.next_id
 
     def add_object(self, obj: MovaviObject):
         """Add an object to the project"""
         self.objects[obj.object_id] = obj
+        self.types[obj.object_type][obj.object_id] = obj
         return obj
 
+    def objects_of_type(self, object_type: str) -> List[MovaviObject]:
+        """Objects of a Movavi type (e.g. ``"File"``) in the order they were added"""
+        return list(self.types.get(object_type, {}).values())
+
+    def declare(self, type_name: str, oid: int, poid: int = 0, refs: List[int] = None):
+        """Predeclare an object, creating the Predeclarator (always the first object) on first use"""
+        if self.predeclarator is None:
+            self.predeclarator = self.add_object(Predeclarator(self.get_next_id()))
+        self.predeclarator.add_predeclaration(type_name, oid, poid, refs, declaration_id=self.get_next_id())
+
+    def create_timeline(self, width: int, height: int, frame_rate_n: int, frame_rate_d: int,
+                        sample_rate: int, channel_layout=None) -> "TimelineBuilder":
+        """Create the project timeline; clips are then laid out with the returned builder"""
+        self.timeline = TimelineBuilder(self, width, height, frame_rate_n, frame_rate_d, sample_rate, channel_layout)
+        return self.timeline
+
     def add_video_to_project(self, video_path: str, real_path: str):
         """Add a video to an existing Movavi project with structure matching the original XML"""
         # Extract video metadata if available
         metadata = get_video_metadata(real_path) if os.path.exists(real_path) else {}
 
-        # Extract values from metadata using direct dictionary access
+        if self.timeline is None:
+            TimelineBuilder.from_metadata(self, metadata)
+        self.timeline.add_video(FilePath(real_path, video_path), metadata=metadata)
+
+        return self
+
+    def write_xml(self, stream: TextIO):
+        """Stream the project XML into a text file object in a single pass"""
+        writer = XmlWriter(stream)
+        writer.declaration()
+        writer.start("Archive")
+
+        # Add all objects
+        for obj in self.objects.values():
+            obj.write(writer)
+
+        # Add root reference
+        if self.root_ref:
+            writer.empty("RootRef", type="ObjectRef", value=self.root_ref)
+
+        writer.end("Archive")
+
+    def to_xml(self) -> str:
+        """Convert the project to XML"""
+        stream = io.StringIO()
+        self.write_xml(stream)
+        return stream.getvalue()
+
+
+class TimelineBuilder:
+    """
+    Lays out clips on the timeline of a Movavi project.
+
+    Video clips follow each other on the main track (optionally separated by gaps) with their
+    own audio on the linked audio track; narration goes to the voice-over track. Every ID comes
+    from the generator's allocator and a source file used by several clips (e.g. the cuts of
+    ``RandomScenes``) is declared once.
+
+    Clip timings, the clips of each track, the links and the end of each track are indexed as
+    clips are added, so appending to a long timeline doesn't scan it.
+    """
+
+    # (name, Movavi track type, TimelineTrack flags) in the order the timeline lists the tracks
+    TRACKS = (
+        ("main", 16, {"gapless": True, "used": True}),
+        ("titles", 32, {"linked": True}),
+        ("linked_audio", 48, {"linked": True, "used": True}),
+        ("voice_over", 64, {"linked": True, "used": True}),
+        ("overlay", 64, {}),
+        ("effects", 80, {"linked": True, "used": True}),
+        ("background", 96, {"linked": True}),
+    )
+
+    def __init__(self, generator: MovaviProjectGenerator, width: int, height: int, frame_rate_n: int,
+                 frame_rate_d: int, sample_rate: int, channel_layout=None):
+        self.generator = generator
+        self.files: Dict[str, Tuple[int, Optional[int], Optional[int]]] = {}
+        self.track_ends: Dict[int, int] = {}
+        self.timings: Dict[int, dict] = {}
+        self.track_clips: Dict[int, List[int]] = {}
+        self.links: Dict[int, List[Tuple[int, int]]] = {}  # master clip -> (linked clip, offset)
+
+        project_content_id = generator.get_next_id()
+        timeline_id = generator.get_next_id()
+        editor_collection_id = generator.get_next_id()
+        self.timing_refs: List[int] = []
+
+        generator.declare("Project::Content", project_content_id)
+        generator.declare("Timeline::Object", timeline_id, 0, self.timing_refs)
+        generator.add_object(ProjectContent(project_content_id, timeline_id, editor_collection_id))
+        generator.root_ref = project_content_id
+
+        self.timeline = generator.add_object(
+            TimelineObject(timeline_id, width, height, frame_rate_n, frame_rate_d,
+                           sample_rate=sample_rate, channel_layout=channel_layout))
+
+        self.tracks: Dict[str, int] = {}
+        for name, track_type, flags in self.TRACKS:
+            track_id = self.tracks[name] = generator.get_next_id()
+            generator.declare("Timeline::Track", track_id)
+            generator.add_object(TimelineTrack(track_id, timeline_id, track_type, **flags))
+            self.timeline.add_track(track_id)
+            self.track_ends[track_id] = 0
+            self.track_clips[track_id] = []
+
+        generator.declare("EditorCollection::UserObject", editor_collection_id)
+        self.editor_collection = generator.add_object(EditorCollectionUserObject(editor_collection_id))
+
+    @classmethod
+    def from_metadata(cls, generator: MovaviProjectGenerator, metadata: dict) -> "TimelineBuilder":
+        """Timeline with the format of a video as returned by ``get_video_metadata``"""
         try:
-            width = metadata['width']
-            height = metadata['height']
-            frame_rate_n = metadata['frame_rate_n']
-            frame_rate_d = metadata['frame_rate_d']
-            duration_frames = metadata['duration_frames']
-            video_bitrate = metadata['video_bitrate']
-            audio_bitrate = metadata['audio_bitrate']
+            return generator.create_timeline(
+                metadata['width'], metadata['height'], metadata['frame_rate_n'], metadata['frame_rate_d'],
+                sample_rate=metadata['audio_props']['sample_rate'],
+                channel_layout=metadata['audio_props'].get('channel_layout'))
         except KeyError as e:
-            # Log which metadata is missing
             print(f"Error: Missing required video metadata: {e}")
             print("Cannot create project without complete metadata")
             raise ValueError(f"Required video metadata missing: {e}. Please ensure the video file is valid.")
 
-        # Get file information
-        filename = extract_filename(video_path)
-        filesize = os.path.getsize(real_path) if os.path.exists(real_path) else 10000000
-        file_ext = os.path.splitext(video_path)[1].lower().lstrip('.')
-
-        # Get detailed audio properties
-        audio_props = metadata['audio_props']
-
-        # Create an ID generator
-        class IdGenerator:
-            def __init__(self, start=1000):
-                self.current_id = start
-
-            def next_id(self):
-                self.current_id += 1
-                return self.current_id
-
-        # Create ID generators for different ID ranges
-        predeclarator_gen = IdGenerator(7000000)
-        project_content_gen = IdGenerator(4000)
-        timeline_object_gen = IdGenerator(3900)
-        video_audio_gen = IdGenerator(6580000)
-        timeline_track_gen = IdGenerator(6582000)
-        editor_gen = IdGenerator(3000)
-        timing_gen = IdGenerator(6990000)
-
-        # Generate IDs for all objects
-        predeclarator_id = predeclarator_gen.next_id()
-        project_content_id = project_content_gen.next_id()
-        timeline_object_id = timeline_object_gen.next_id()
-
-        # Other IDs using different ranges
-        video_clip_id = video_audio_gen.next_id()
-        audio_clip_id = video_audio_gen.next_id()
-        file_id = video_audio_gen.next_id()
-        video_track_id = video_audio_gen.next_id()
-        audio_track_id = video_audio_gen.next_id()
-
-        timeline_video_track_id = timeline_track_gen.next_id()
-        timeline_audio_track_id = timeline_track_gen.next_id()
-        timeline_titles_track_id = timeline_track_gen.next_id()
-        timeline_overlay_track_id = timeline_track_gen.next_id()
-        timeline_overlay2_track_id = timeline_track_gen.next_id()
-        timeline_effects_track_id = timeline_track_gen.next_id()
-        timeline_background_track_id = timeline_track_gen.next_id()
-
-        editor_collection_id = editor_gen.next_id()
-        import_object_id = video_audio_gen.next_id()
-
-        video_timing_id = timing_gen.next_id()
-        audio_timing_id = timing_gen.next_id()
-        link_id = timing_gen.next_id()
-
-        # Create Predeclarator
-        predeclarator = self.add_object(Predeclarator(predeclarator_id))
-        predeclarator.add_predeclaration("Project::Content", project_content_id)
-        predeclarator.add_predeclaration("Timeline::Object", timeline_object_id, 0,
-                                         [video_timing_id, audio_timing_id, link_id])
-        predeclarator.add_predeclaration("Timeline::Clip", video_clip_id)
-        predeclarator.add_predeclaration("File", file_id)
-        predeclarator.add_predeclaration("VideoTrack", video_track_id)
-        predeclarator.add_predeclaration("AudioTrack", audio_track_id)
-        predeclarator.add_predeclaration("Timeline::ClipTiming", video_timing_id, timeline_object_id)
-        predeclarator.add_predeclaration("Timeline::Track", timeline_video_track_id)
-        predeclarator.add_predeclaration("Timeline::Clip", audio_clip_id)
-        predeclarator.add_predeclaration("Timeline::ClipTiming", audio_timing_id, timeline_object_id)
-        predeclarator.add_predeclaration("Timeline::Track", timeline_audio_track_id)
-        predeclarator.add_predeclaration("Timeline::Link", link_id, timeline_object_id)
-        predeclarator.add_predeclaration("Timeline::Track", timeline_titles_track_id)
-        predeclarator.add_predeclaration("Timeline::Track", timeline_overlay_track_id)
-        predeclarator.add_predeclaration("Timeline::Track", timeline_overlay2_track_id)
-        predeclarator.add_predeclaration("Timeline::Track", timeline_effects_track_id)
-        predeclarator.add_predeclaration("Timeline::Track", timeline_background_track_id)
-        predeclarator.add_predeclaration("EditorCollection::UserObject", editor_collection_id)
-        predeclarator.add_predeclaration("Import::Object", import_object_id)
-
-        # Create ProjectContent
-        project_content = self.add_object(ProjectContent(project_content_id, timeline_object_id, editor_collection_id))
-        self.root_ref = project_content_id  # Set the root reference
-
-        # Create Timeline Object - match the original XML structure
-        # Convert channel_layout string to numeric value if needed
-        channel_layout = audio_props.get('channel_layout')
-        if isinstance(channel_layout, str):
-            # Simplified mapping: only use 1 or 2
-            channel_layout = 1 if channel_layout.lower() == "mono" else 2
+    @classmethod
+    def attach(cls, generator: MovaviProjectGenerator) -> "TimelineBuilder":
+        """Builder for the timeline of a loaded project (see ``clients.movavi.parser``)"""
+        builder = cls.__new__(cls)
+        builder.generator = generator
+        objects = generator.objects
+
+        content = objects[generator.root_ref]
+        builder.timeline = objects[content.timeline_id]
+        builder.editor_collection = objects[content.user_collection_id]
+        predeclarations = generator.predeclarator.predeclarations if generator.predeclarator else []
+        builder.timing_refs = next((predeclaration["refs"] for predeclaration in predeclarations
+                                    if predeclaration["oid"] == builder.timeline_id), None)
+        if builder.timing_refs is None:
+            raise ValueError("project has no timeline predeclaration")
+        builder.files = {obj.path: (obj.object_id, obj.video_track_id, obj.audio_track_id)
+                         for obj in generator.objects_of_type("File") if isinstance(obj, File)}
+
+        # Tracks of the same type keep their order
+        unmatched = [(name, track_type) for name, track_type, _ in cls.TRACKS]
+        builder.tracks = {}
+        for track_id in builder.timeline.tracks:
+            for index, (name, track_type) in enumerate(unmatched):
+                if getattr(objects.get(track_id), "track_type", None) == track_type:
+                    builder.tracks[name] = track_id
+                    del unmatched[index]
+                    break
+        if unmatched:
+            raise ValueError(f"project has no {', '.join(name for name, _ in unmatched)} track")
+
+        builder.track_ends = {}
+        builder.index_timeline()
+        generator.timeline = builder
+        return builder
+
+    @property
+    def timeline_id(self) -> int:
+        return self.timeline.object_id
+
+    def track_end(self, track: str = "main") -> int:
+        """Timestamp right after the last clip of a track"""
+        return self.track_ends[self.tracks[track]]
+
+    def add_gap(self, duration: int, track: str = "main"):
+        """Leave ``duration`` (Movavi timeline units) empty on a track"""
+        self.track_ends[self.tracks[track]] += duration
+
+    def index_timeline(self):
+        """Rebuild the clip, track and link indexes from the timeline object"""
+        self.timings = {clip["key"]: clip["value"] for clip in self.timeline.clips}
+        self.track_clips = {track_id: [] for track_id in self.timeline.tracks}
+        for clip_id, timing in self.timings.items():
+            self.track_clips.setdefault(timing["track"], []).append(clip_id)
+        self.links = {}
+        for link in self.timeline.links:
+            self.links.setdefault(link["value"]["master"], []).append((link["key"], link["value"]["offset"]))
+        self.update_track_ends(self.track_clips)
+
+    def update_track_ends(self, track_ids: Iterable[int]):
+        """Recompute the end of tracks whose clips moved; gaps added after their last clip are dropped"""
+        for track_id in track_ids:
+            self.track_ends[track_id] = max((self.timings[clip_id]["timestamp"] + self.timings[clip_id]["duration"]
+                                             for clip_id in self.track_clips[track_id]), default=0)
+
+    def clip_timing(self, clip_id: int) -> dict:
+        """Timing of a clip on the timeline"""
+        try:
+            return self.timings[clip_id]
+        except KeyError:
+            raise KeyError(f"Clip {clip_id} is not on the timeline")
+
+    def clips_on_track(self, track: str = "main") -> List[int]:
+        """IDs of the clips of a track in the order they were added"""
+        return list(self.track_clips[self.tracks[track]])
+
+    def linked_clips(self, clip_id: int) -> List[Tuple[int, int]]:
+        """``(clip ID, offset)`` of the clips following ``clip_id``, e.g. the audio of a video clip"""
+        return list(self.links.get(clip_id, ()))
+
+    def _add_file(self, path: FilePath, length: int, metadata: Optional[dict] = None,
+                  audio_props: Optional[dict] = None) -> Tuple[int, Optional[int], Optional[int]]:
+        """Declare a source file with its tracks and import entry once, returning the IDs"""
+        if path.config_path in self.files:
+            return self.files[path.config_path]
+
+        generator = self.generator
+        file_id = generator.get_next_id()
+        video_track_id = generator.get_next_id() if metadata else None
+        audio_track_id = generator.get_next_id()
+        import_object_id = generator.get_next_id()
+        filename = extract_filename(path.config_path)
+
+        generator.declare("File", file_id)
+        generator.add_object(File(file_id, path.config_path, path.size, path.extension, length,
+                                  video_track_id, audio_track_id))
+
+        if metadata:
+            audio_props = metadata['audio_props']
+            audio_bitrate = metadata['audio_bitrate']
+            generator.declare("VideoTrack", video_track_id)
+            generator.add_object(
+                VideoTrack(video_track_id, file_id, metadata['width'], metadata['height'],
+                           frame_rate_n=metadata['frame_rate_n'],
+                           frame_rate_d=metadata['frame_rate_d'],
+                           bitrate=metadata['video_bitrate'],
+                           codec_id=metadata['video_codec_id']))
         else:
-            # If it's already a number or None
-            channel_layout = 1 if channel_layout == 1 else 2
-
-        timeline = self.add_object(
-            TimelineObject(timeline_object_id, width, height, frame_rate_n, frame_rate_d,
-                           sample_rate=audio_props['sample_rate'],
-                           channel_layout=channel_layout))
-
-        # Add tracks to timeline in the same order as original XML
-        timeline.add_track(timeline_audio_track_id)
-        timeline.add_track(timeline_titles_track_id)
-        timeline.add_track(timeline_video_track_id)
-        timeline.add_track(timeline_overlay_track_id)
-        timeline.add_track(timeline_overlay2_track_id)
-        timeline.add_track(timeline_effects_track_id)
-        timeline.add_track(timeline_background_track_id)
-
-        # Create File object
-        file = self.add_object(
-            File(file_id, video_path, filesize, file_ext, duration_frames, video_track_id, audio_track_id))
-
-        # Create Video track with detected properties
-        video_track = self.add_object(
-            VideoTrack(video_track_id, file_id, width, height,
-                       frame_rate_n=frame_rate_n,
-                       frame_rate_d=frame_rate_d,
-                       bitrate=video_bitrate,
-                       codec_id=metadata['video_codec_id']))
-
-        # Create Audio track with detected properties
-        audio_track = self.add_object(
+            audio_bitrate = audio_props['bitrate']
+
+        generator.declare("AudioTrack", audio_track_id)
+        generator.add_object(
             AudioTrack(audio_track_id, file_id,
                        audio_props['channel_layout'],
                        audio_props['sample_rate'],
@@ -170,135 +271,152 @@ class MovaviProjectGenerator:
                        audio_bitrate,
                        codec_id=audio_props['codec_id']))
 
-        # Create timeline tracks with exact settings from original XML
-        self.add_object(TimelineTrack(
-            timeline_video_track_id,
-            timeline_object_id,
-            48,
-            linked=True,
-            used=True
-        ))
-
-        self.add_object(TimelineTrack(
-            timeline_audio_track_id,
-            timeline_object_id,
-            16,
-            gapless=True,
-            used=True
-        ))
-
-        self.add_object(TimelineTrack(
-            timeline_titles_track_id,
-            timeline_object_id,
-            32,
-            linked=True,
-            used=False  # Match original: Unused track
-        ))
-
-        self.add_object(TimelineTrack(
-            timeline_overlay_track_id,
-            timeline_object_id,
-            64,
-            linked=True,
-            used=True
-        ))
-
-        self.add_object(TimelineTrack(
-            timeline_overlay2_track_id,
-            timeline_object_id,
-            64,
-            used=False
-        ))
-
-        self.add_object(TimelineTrack(
-            timeline_effects_track_id,
-            timeline_object_id,
-            80,
-            linked=True,
-            used=True
-        ))
-
-        self.add_object(TimelineTrack(
-            timeline_background_track_id,
-            timeline_object_id,
-            96,
-            linked=True,
-            used=False
-        ))
-
-        # Create clips with correct IDs and types
-        video_clip = self.add_object(
-            TimelineClip(video_clip_id, timeline_object_id, 1, filename, file_id, duration_frames))  # type 1 for video
-        audio_clip = self.add_object(
-            TimelineClip(audio_clip_id, timeline_object_id, 2, filename, file_id, duration_frames))  # type 2 for audio
-
-        # Add clips to timeline
-        timeline.add_clip(video_clip_id, {
-            "objectId": video_timing_id,
-            "track": timeline_audio_track_id,  # Match original XML track position
-            "trackLevel": 0,
-            "timestamp": 0,
-            "sourceDuration": duration_frames,
-            "sourcePosition": 0,
-            "duration": duration_frames,
-            "transitionIn": 0,
-            "transitionOut": 0,
-            "fadeInDuraion": 0,
-            "fadeOutDuraion": 0,
-            "reversed": False,
-            "timingMode": 0
-        })
+        generator.declare("Import::Object", import_object_id)
+        generator.add_object(ImportObject(import_object_id, filename, path.config_path, kind=2))
+        self.editor_collection.add_item(import_object_id)
+
+        self.files[path.config_path] = file_id, video_track_id, audio_track_id
+        return self.files[path.config_path]
 
-        timeline.add_clip(audio_clip_id, {
-            "objectId": audio_timing_id,
-            "track": timeline_video_track_id,  # Match original XML track position
+    def _add_clip(self, clip_type: int, track_id: int, path: FilePath, file_id: int, start: int,
+                  duration: int, source_duration: int, source_position: int) -> int:
+        generator = self.generator
+        clip_id = generator.get_next_id()
+        timing_id = generator.get_next_id()
+
+        generator.declare("Timeline::Clip", clip_id)
+        generator.declare("Timeline::ClipTiming", timing_id, self.timeline_id)
+        generator.add_object(
+            TimelineClip(clip_id, self.timeline_id, clip_type, path.config_path, file_id, source_duration))
+
+        timing = {
+            "objectId": timing_id,
+            "track": track_id,
             "trackLevel": 0,
-            "timestamp": 0,
-            "sourceDuration": duration_frames,
-            "sourcePosition": 0,
-            "duration": duration_frames,
+            "timestamp": start,
+            "sourceDuration": source_duration,
+            "sourcePosition": source_position,
+            "duration": duration,
             "transitionIn": 0,
             "transitionOut": 0,
             "fadeInDuraion": 0,
             "fadeOutDuraion": 0,
             "reversed": False,
             "timingMode": 0
-        })
-
-        # Link audio and video clips - match original XML
-        timeline.add_link(audio_clip_id, {
-            "objectId": link_id,
-            "master": video_clip_id,  # Match original XML - video clip is master
-            "offset": 0
-        })
-
-        # Create EditorCollection and Import objects
-        editor_collection = self.add_object(EditorCollectionUserObject(editor_collection_id))
-        editor_collection.add_item(import_object_id)
-
-        # Create Import Object with kind=2 for video
-        import_obj = self.add_object(ImportObject(import_object_id, filename, video_path, kind=2))
-
-        return self
-
-    def to_xml(self) -> str:
-        """Convert the project to XML"""
-        root = ET.Element("Archive")
-
-        # Add all objects
-        for obj_id, obj in self.objects.items():
-            root.append(obj.to_element())
-
-        # Add root reference
-        if self.root_ref:
-            root_ref = ET.SubElement(root, "RootRef")
-            root_ref.set("type", "ObjectRef")
-            root_ref.set("value", str(self.root_ref))
+        }
+        self.timeline.add_clip(clip_id, timing)
+        self.timings[clip_id] = timing
+        self.track_clips[track_id].append(clip_id)
+        self.timing_refs.append(timing_id)
+        self.track_ends[track_id] = max(self.track_ends[track_id], start + duration)
+        return clip_id
+
+    def add_video(self, path: FilePath, metadata: Optional[dict] = None, start: Optional[int] = None,
+                  source_position: int = 0, duration: Optional[int] = None, gap: int = 0) -> int:
+        """
+        Add a video clip and its linked audio, by default right after the last clip of the main track.
+
+        Args:
+            path: Real path (probed) and config path (written in the project) of the video
+            metadata: ``get_video_metadata`` of the file, probed when omitted
+            start: Timeline position, defaults to the end of the main track plus ``gap``
+            source_position: Offset of the cut in the source
+            duration: Length of the cut, defaults to the rest of the source
+
+        Returns:
+            int: ID of the video clip
+        """
+        if metadata is None:
+            metadata = get_video_metadata(str(path.real_path))
+        try:
+            source_duration = metadata['duration_frames']
+            file_id, _, _ = self._add_file(path, source_duration, metadata=metadata)
+        except KeyError as e:
+            raise ValueError(f"Required video metadata missing: {e}. Please ensure the video file is valid.")
 
-        # Format the XML
-        xml_string = ET.tostring(root, encoding='utf-8')
-        dom = minidom.parseString(xml_string)
-        pretty_xml = dom.toprettyxml(indent="    ")
+        if start is None:
+            start = self.track_end("main") + gap
+        if duration is None:
+            duration = source_duration - source_position
+
+        clip_args = (file_id, start, duration, source_duration, source_position)
+        video_clip_id = self._add_clip(1, self.tracks["main"], path, *clip_args)
+        audio_clip_id = self._add_clip(2, self.tracks["linked_audio"], path, *clip_args)
+
+        # The audio clip follows the video clip
+        link_id = self.generator.get_next_id()
+        self.generator.declare("Timeline::Link", link_id, self.timeline_id)
+        self.timeline.add_link(audio_clip_id, {"objectId": link_id, "master": video_clip_id, "offset": 0})
+        self.links.setdefault(video_clip_id, []).append((audio_clip_id, 0))
+        self.timing_refs.append(link_id)
+
+        return video_clip_id
+
+    def add_audio(self, path: FilePath, start: Optional[int] = None, track: str = "voice_over",
+                  duration: Optional[int] = None, audio_props: Optional[dict] = None) -> int:
+        """
+        Add an audio-only clip (narration, music), by default after the last clip of ``track``
+
+        Returns:
+            int: ID of the audio clip
+        """
+        from clients.movavi.main import get_video_duration_frames
+
+        if duration is None:
+            duration = get_video_duration_frames(path.real_path)
+        if audio_props is None:
+            audio_props = get_detailed_audio_properties(path.real_path)
+        if start is None:
+            start = self.track_end(track)
+
+        file_id, _, _ = self._add_file(path, duration, audio_props=audio_props)
+        return self._add_clip(2, self.tracks[track], path, file_id, start, duration, duration, 0)
+
+    def retime_clip(self, clip_id: int, start: Optional[int] = None, duration: Optional[int] = None,
+                    source_position: Optional[int] = None):
+        """Move, trim or re-cut a clip; the clips linked to it follow"""
+        changes = {"timestamp": start, "duration": duration, "sourcePosition": source_position}
+        changes = {name: value for name, value in changes.items() if value is not None}
+
+        timing = self.clip_timing(clip_id)
+        timing.update(changes)
+        moved_tracks = {timing["track"]}
+        for linked_id, offset in self.linked_clips(clip_id):
+            linked_changes = dict(changes)
+            if start is not None:
+                linked_changes["timestamp"] = start + offset
+            linked_timing = self.clip_timing(linked_id)
+            linked_timing.update(linked_changes)
+            moved_tracks.add(linked_timing["track"])
+
+        self.timeline.touch()
+        self.update_track_ends(moved_tracks)
+
+    def replace_clip(self, clip_id: int, path: FilePath, metadata: Optional[dict] = None):
+        """
+        Point a video clip (and its linked audio) at another source, keeping its place on the
+        timeline. The duration is shortened if the new source is too short for it.
+        """
+        if metadata is None:
+            metadata = get_video_metadata(str(path.real_path))
+        try:
+            source_duration = metadata['duration_frames']
+            file_id, _, _ = self._add_file(path, source_duration, metadata=metadata)
+        except KeyError as e:
+            raise ValueError(f"Required video metadata missing: {e}. Please ensure the video file is valid.")
 
-        # Add XML declaration and return
-        return '<?xml version="1.0" encoding="UTF-8"?>\n' + pretty_xml.split('\n', 1)[1]
+        moved_tracks = set()
+        for replaced_id in [clip_id] + [linked_id for linked_id, _ in self.linked_clips(clip_id)]:
+            clip = self.generator.objects[replaced_id]
+            clip.name = extract_filename(path.config_path)
+            clip.file_id = file_id
+            clip.source_duration = source_duration
+
+            timing = self.clip_timing(replaced_id)
+            timing["sourceDuration"] = source_duration
+            timing["sourcePosition"] = min(timing["sourcePosition"], source_duration)
+            timing["duration"] = min(timing["duration"], source_duration - timing["sourcePosition"])
+            moved_tracks.add(timing["track"])
+
+        self.timeline.touch()
+        self.update_track_ends(moved_tracks)
@@ -1,10 +1,21 @@
 import os
 
-from clients.movavi.generator import MovaviProjectGenerator
-from clients.movavi.schema import FilePath, TimelineObject, TimelineTrack, AudioTrack, File, TimelineClip, ImportObject, \
-    EditorCollectionUserObject
-from settings import BASE_DIR_SETS, BASE_DIR_MOVIES, BASE_DIR
-from utils import extract_filename, get_detailed_audio_properties
+from clients.movavi.generator import MovaviProjectGenerator, TimelineBuilder
+from clients.movavi.schema import FilePath
+from clients.probe import probe
+from settings import BASE_DIR_SETS, BASE_DIR_MOVIES, BASE_DIR, MOVAVI_MEDIA_DIR
+from utils import get_video_metadata
+
+# zlib's default; 0 selects the store-only fast mode
+DEFAULT_COMPRESSLEVEL = 6
+
+
+def version_xml(project_file="config.xml", version=51):
+    """Content of the version.xml of a Movavi project"""
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<versions>
+    <project file="{project_file}" version="{version}"/>
+</versions>"""
 
 
 # Function to create version.xml
@@ -20,13 +31,8 @@ def create_version_xml(output_file, project_file="config.xml", version=51):
     Returns:
         str: Path to the created file
     """
-    xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
-<versions>
-    <project file="{project_file}" version="{version}"/>
-</versions>"""
-
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(xml_content)
+        f.write(version_xml(project_file, version))
 
     return output_file
 
@@ -52,25 +58,57 @@ def get_video_duration_frames(file_path, frame_rate_n=30000, frame_rate_d=1001):
     else:
         real_path = str(file_path)
 
-    # Get duration in seconds
-    cmd = f'ffprobe -i "{real_path}" -show_entries format=duration -v quiet -of csv="p=0"'
-
     try:
-        duration_str = subprocess.check_output(cmd, shell=True, stderr=subprocess.STDOUT, text=True).strip()
-
-        # Convert to float seconds
-        duration_seconds = float(duration_str)
+        # Duration comes from the same cached probe used for the rest of the metadata
+        duration_seconds = float(probe(real_path)["format"]["duration"])
 
         # Convert to Movavi timeline units (milliseconds * 1000), always rounding up
         frames = math.ceil(duration_seconds * 1000)
 
         return frames
-    except (subprocess.SubprocessError, ValueError) as e:
-        raise RuntimeError(f"Failed to get video duration for '{real_path}'.\nCommand: {cmd}\nError: {str(e)}")
+    except (OSError, subprocess.SubprocessError, KeyError, ValueError) as e:
+        raise RuntimeError(f"Failed to get video duration for '{real_path}'.\nError: {str(e)}")
+
+
+def save_movavi_project(generator, output_mepx, copy_config=False, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """
+    Write a generated project as a Movavi project (.mepx) file, streaming the XML into the archive
+
+    Args:
+        generator (MovaviProjectGenerator): The generated project
+        output_mepx (str or binary file object): Path of the .mepx file, or e.g. a BytesIO to keep it in memory
+        copy_config (bool): Also save config.xml to BASE_DIR/ for inspection
+        compresslevel (int): Deflate level from 1 (fastest) to 9 (smallest); 0 stores the entries uncompressed
+
+    Returns:
+        The .mepx path or file object
+    """
+    import io
+    import zipfile
+
+    if copy_config:
+        api_config_path = os.path.join(BASE_DIR, "config.xml")
+        os.makedirs(os.path.dirname(api_config_path), exist_ok=True)  # Ensure directory exists
+        with open(api_config_path, 'w', encoding='utf-8') as f:
+            generator.write_xml(f)
+
+    if compresslevel:
+        options = {"compression": zipfile.ZIP_DEFLATED, "compresslevel": compresslevel}
+    else:
+        options = {"compression": zipfile.ZIP_STORED}
+
+    # Create .mepx file (which is just a ZIP file with a different extension)
+    with zipfile.ZipFile(output_mepx, 'w', **options) as zipf:
+        with io.TextIOWrapper(zipf.open("config.xml", mode='w'), encoding='utf-8', newline='') as config:
+            generator.write_xml(config)
+        zipf.writestr("version.xml", version_xml())
+
+    return output_mepx
 
 
 # Modify the existing create_movavi_project function to accept additional audio as FilePath
-def create_movavi_project(video_path, output_mepx, additional_audio_path=None):
+def create_movavi_project(video_path, output_mepx, additional_audio_path=None, copy_config=False,
+                          compresslevel=DEFAULT_COMPRESSLEVEL):
     """
     Create a complete Movavi project (.mepx) file with optional additional audio
 
@@ -78,84 +116,160 @@ def create_movavi_project(video_path, output_mepx, additional_audio_path=None):
         video_path (FilePath): Object containing real and config paths for the video
         output_mepx (str): Path to save the .mepx file
         additional_audio_path (FilePath, optional): FilePath containing real and config paths for additional audio
+        copy_config (bool): Also save config.xml to BASE_DIR/ for inspection
+        compresslevel (int): ZIP deflate level, 0 to store the entries uncompressed
 
     Returns:
         str: Path to the created .mepx file
     """
-    import tempfile
-    import zipfile
-    import os
-    import shutil
+    # Generate config.xml
+    generator = MovaviProjectGenerator()
+    generator.add_video_to_project(
+        video_path=video_path.config_path,  # Use the config path for the project
+        real_path=video_path.real_path
+    )
 
-    # Create temporary directory
-    temp_dir = tempfile.mkdtemp()
-    try:
-        # Get video duration in frames
-        duration_frames = get_video_duration_frames(video_path.real_path)
-
-        # Generate config.xml
-        generator = MovaviProjectGenerator()
-        generator.add_video_to_project(
-            video_path=video_path.config_path,  # Use the config path for the project
-            real_path=video_path.real_path
-        )
-
-        # If additional audio file is provided, add it to the project
-        if additional_audio_path:
-            # Find timeline object ID and audio track ID for positioning the new audio
-            timeline_object_id = None
-            audio_track_id = None
-
-            for obj_id, obj in generator.objects.items():
-                if isinstance(obj, TimelineObject):
-                    timeline_object_id = obj_id
-                elif isinstance(obj, TimelineTrack) and obj.track_type == 64:  # Audio track type
-                    audio_track_id = obj_id
-
-            if timeline_object_id and audio_track_id:
-                # Get the existing audio file duration to position the new one after it
-                existing_audio_duration = 0
-                for clip in generator.objects[timeline_object_id].clips:
-                    if clip["value"]["track"] == audio_track_id:
-                        existing_audio_duration = max(
-                            existing_audio_duration,
-                            clip["value"]["timestamp"] + clip["value"]["duration"]
-                        )
-
-                # Add the additional audio file
-                add_audio_to_project(
-                    generator=generator,
-                    audio_path=additional_audio_path,
-                    timeline_object_id=timeline_object_id,
-                    timeline_audio_track_id=audio_track_id,
-                    start_timestamp=existing_audio_duration
-                )
-
-        config_path = os.path.join(temp_dir, "config.xml")
-        xml_content = generator.to_xml()
-        with open(config_path, 'w', encoding='utf-8') as f:
-            f.write(xml_content)
-
-        # Also save config.xml to the specified BASE_DIR/ location
-        api_config_path = os.path.join(BASE_DIR, "config.xml")
-        os.makedirs(os.path.dirname(api_config_path), exist_ok=True)  # Ensure directory exists
-        with open(api_config_path, 'w', encoding='utf-8') as f:
-            f.write(xml_content)
+    # If additional audio file is provided, add it to the last audio track, after its clips
+    if additional_audio_path:
+        generator.timeline.add_audio(additional_audio_path, track="overlay")
+
+    return save_movavi_project(generator, output_mepx, copy_config, compresslevel)
+
+
+def create_set_project(video_paths, output_mepx, gap=0, voice_overs=None, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """
+    Assemble several videos (e.g. the ten trailers of a set) one after another into a single project
+
+    Args:
+        video_paths (list[FilePath]): Videos in timeline order
+        output_mepx (str): Path to save the .mepx file
+        gap (int): Empty space between two videos, in Movavi timeline units
+        voice_overs (dict, optional): Narration (FilePath) keyed by the index of the video it starts with
+        compresslevel (int): ZIP deflate level, 0 to store the entries uncompressed
+
+    Returns:
+        str: Path to the created .mepx file
+    """
+    if not video_paths:
+        raise ValueError("At least one video is required")
+
+    generator = MovaviProjectGenerator()
+    timeline = None
+    for index, video_path in enumerate(video_paths):
+        metadata = get_video_metadata(str(video_path.real_path))
+        if timeline is None:
+            timeline = TimelineBuilder.from_metadata(generator, metadata)
+
+        start = timeline.track_end() + (gap if index else 0)
+        timeline.add_video(video_path, metadata=metadata, start=start)
+        if voice_overs and index in voice_overs:
+            timeline.add_audio(voice_overs[index], start=start)
+
+    return save_movavi_project(generator, output_mepx, compresslevel=compresslevel)
+
+
+def set_videos(set_name):
+    """Links to the final videos of a set, without the re-encoded -NNfps copies"""
+    import re
+
+    return [
+        link for link in sorted((BASE_DIR_SETS / set_name).glob("*.mp4"))
+        if not re.search(r"-\d+fps\.mp4$", link.name)
+    ]
+
+
+def movie_project_jobs(set_name, config_dir=MOVAVI_MEDIA_DIR):
+    """
+    One ``create_movavi_project`` job per movie of a set: the original video with its narration
+
+    Args:
+        set_name (str): Directory of the set in BASE_DIR_SETS
+        config_dir (str): Directory of the media on the machine running Movavi
+
+    Returns:
+        list[tuple]: (video_path, output_mepx, additional_audio_path) for every movie
+    """
+    jobs = []
+    full_path_set = BASE_DIR_SETS / set_name
+    for link in set_videos(set_name):
+        full_path_movie = BASE_DIR_MOVIES / link.stem
+        if not full_path_movie.is_dir():
+            continue
 
-        # Generate version.xml
-        version_path = os.path.join(temp_dir, "version.xml")
-        create_version_xml(version_path)
+        video_path = FilePath(full_path_movie / "original.mp4", f"{config_dir}\\{link.stem}.mp4")
+        audio = full_path_movie / "audio.mp3"
+        audio_path = FilePath(audio, f"{config_dir}\\{link.stem}.mp3") if audio.is_file() else None
+        jobs.append((video_path, str(full_path_set / f"{link.stem}.mepx"), audio_path))
+    return jobs
 
-        # Create .mepx file (which is just a ZIP file with a different extension)
-        with zipfile.ZipFile(output_mepx, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(config_path, arcname="config.xml")
-            zipf.write(version_path, arcname="version.xml")
 
-        return output_mepx
+def set_project_job(set_name, config_dir=MOVAVI_MEDIA_DIR):
+    """``create_set_project`` arguments assembling the final videos of a set into BASE_DIR_SETS/<set>/<set>.mepx"""
+    video_paths = [FilePath(link.resolve(), f"{config_dir}\\{link.name}") for link in set_videos(set_name)]
+    return video_paths, str(BASE_DIR_SETS / set_name / f"{set_name}.mepx")
 
-    finally:
-        # Clean up temporary directory
-        shutil.rmtree(temp_dir)
+
+def _run_project_job(job):
+    function, args, kwargs = job if len(job) == 3 else (*job, {})
+    return function(*args, **kwargs)
+
+
+def create_movavi_projects(jobs, workers=None):
+    """
+    Generate many .mepx files in parallel worker processes
+
+    Args:
+        jobs (list[tuple]): (function, args[, kwargs]) where args[1] is the output .mepx,
+            e.g. ``(create_movavi_project, movie_project_jobs(...)[0])``
+        workers (int, optional): Number of processes, defaults to the number of CPUs
+
+    Returns:
+        dict: Output path (or the error) for every job, in the order of ``jobs``
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_project_job, job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            output_mepx = job[1][1]
+            try:
+                results[output_mepx] = future.result()
+            except Exception as e:
+                print(f"Failed to create {output_mepx}: {e}")
+                results[output_mepx] = e
+    return results
+
+
+def create_set_projects(set_names, per_movie=True, workers=None, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """
+    Batch mode: the project of every set (and of every movie in them) generated across processes.
+    ``compresslevel=0`` stores the archives uncompressed, which is the fastest.
+
+    Returns:
+        dict: Output path (or the error) for every project
+    """
+    import asyncio
+
+    from clients.probe import warm_cache
+
+    jobs, media = [], []
+    for set_name in set_names:
+        video_paths, output_mepx = set_project_job(set_name)
+        options = {"compresslevel": compresslevel}
+        jobs.append((create_set_project, (video_paths, output_mepx), options))
+        media.extend(video_path.real_path for video_path in video_paths)
+
+        if per_movie:
+            for video_path, output_mepx, audio_path in movie_project_jobs(set_name):
+                jobs.append((create_movavi_project, (video_path, output_mepx, audio_path), options))
+                media.append(video_path.real_path)
+                if audio_path:
+                    media.append(audio_path.real_path)
+
+    # Probe everything concurrently once; the forked workers then only read the probe cache
+    asyncio.run(warm_cache(media))
+    return create_movavi_projects(jobs, workers)
 
 
 # Define the helper function to add the audio, properly using FilePath
@@ -170,68 +284,16 @@ def add_audio_to_project(generator, audio_path, timeline_object_id, timeline_aud
         timeline_object_id (int): ID of the timeline object
         timeline_audio_track_id (int): ID of the audio track in timeline
         start_timestamp (int): Start position in timeline (in frames)
+
+    Returns:
+        int: ID of the audio clip
     """
-    # Get file information - use only the base filename, not the full path
-    filename = extract_filename(audio_path.config_path)
-    filesize = os.path.getsize(audio_path.real_path) if os.path.exists(audio_path.real_path) else 677280
-    file_ext = os.path.splitext(audio_path.config_path)[1].lower().lstrip('.')
-
-    # Get duration frames
-    duration_frames = get_video_duration_frames(audio_path.real_path)
-
-    # Get detailed audio properties
-    audio_props = get_detailed_audio_properties(audio_path.real_path)
-
-    # Create IDs for all objects
-    audio_clip_id = generator.get_next_id()
-    file_id = generator.get_next_id()
-    audio_track_id = generator.get_next_id()
-    audio_timing_id = generator.get_next_id()
-    import_object_id = generator.get_next_id()
-
-    # Create File object - use config_path for the path in the project file
-    generator.add_object(
-        File(file_id, audio_path.config_path, filesize, file_ext, duration_frames, None, audio_track_id))
-
-    # Create Audio track with all the detected properties
-    generator.add_object(
-        AudioTrack(audio_track_id, file_id,
-                   audio_props['channel_layout'],
-                   audio_props['sample_rate'],
-                   audio_props['sample_format'],
-                   audio_props['bitrate'],
-                   codec_id=audio_props['codec_id']))
-
-    # Create clip - using just the filename, not the full path
-    generator.add_object(
-        TimelineClip(audio_clip_id, timeline_object_id, 2, filename, file_id, duration_frames))
-
-    # Get the timeline object and add the clip to it
-    timeline = generator.objects[timeline_object_id]
-    timeline.add_clip(audio_clip_id, {
-        "objectId": audio_timing_id,
-        "track": timeline_audio_track_id,
-        "trackLevel": 0,
-        "timestamp": start_timestamp,
-        "sourceDuration": duration_frames,
-        "sourcePosition": 0,
-        "duration": duration_frames,
-        "transitionIn": 0,
-        "transitionOut": 0,
-        "fadeInDuraion": 0,
-        "fadeOutDuraion": 0,
-        "reversed": False,
-        "timingMode": 0
-    })
-
-    # Add import object - use config_path for location in the project
-    generator.add_object(ImportObject(import_object_id, filename, audio_path.config_path))
-
-    # Add the import to editor collection
-    for obj_id, obj in generator.objects.items():
-        if isinstance(obj, EditorCollectionUserObject):
-            obj.add_item(import_object_id)
-            break
+    timeline = generator.timeline
+    if timeline is None or timeline.timeline_id != timeline_object_id:
+        raise ValueError(f"Timeline {timeline_object_id} is not part of the project")
+
+    track = next(name for name, track_id in timeline.tracks.items() if track_id == timeline_audio_track_id)
+    return timeline.add_audio(audio_path, start=start_timestamp, track=track)
 
 
 if __name__ == "__main__":
@@ -242,13 +304,13 @@ if __name__ == "__main__":
     # Video file path
     video_path = FilePath(
         real_path=BASE_DIR_MOVIES / movie / "original.mp4",
-        config_path=r"C:\users\Public\Videos\uncharted.mp4"
+        config_path=f"{MOVAVI_MEDIA_DIR}\\uncharted.mp4"
     )
 
     # Additional audio file path
     additional_audio = FilePath(
         real_path=BASE_DIR_MOVIES / movie / "audio.mp3",
-        config_path=r"C:\users\Public\Videos\audio.mp3"
+        config_path=f"{MOVAVI_MEDIA_DIR}\\audio.mp3"
     )
 
     mepx_path = os.path.join(BASE_DIR_SETS, set_name, f"{set_name}.mepx")
@@ -256,7 +318,8 @@ if __name__ == "__main__":
     create_movavi_project(
         video_path=video_path,
         output_mepx=mepx_path,
-        additional_audio_path=None
+        additional_audio_path=None,
+        copy_config=True
     )
 
     print(f"Created Movavi project with additional audio: {mepx_path}")
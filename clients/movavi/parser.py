@@ -0,0 +1,95 @@
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Type, Union
+
+from clients.movavi.generator import MovaviProjectGenerator, TimelineBuilder
+from clients.movavi.schema import MovaviObject, Predeclarator, ProjectContent, TimelineObject, TimelineClip, File, \
+    VideoTrack, AudioTrack, TimelineTrack, EditorCollectionUserObject, ImportObject, RawObject
+
+# Model classes by the ``type`` attribute of their RootObject
+OBJECT_TYPES: Dict[str, Type[MovaviObject]] = {
+    "Predeclarator": Predeclarator,
+    "Project::Content": ProjectContent,
+    "Timeline::Object": TimelineObject,
+    "Timeline::Clip": TimelineClip,
+    "File": File,
+    "VideoTrack": VideoTrack,
+    "AudioTrack": AudioTrack,
+    "Timeline::Track": TimelineTrack,
+    "EditorCollection::UserObject": EditorCollectionUserObject,
+    "Import::Object": ImportObject,
+}
+
+
+def strip_whitespace(element: ET.Element):
+    """Drop the indentation text so that parsed and generated elements compare equal"""
+    for child in element.iter():
+        if child.text is not None and not child.text.strip():
+            child.text = None
+        if child.tail is not None and not child.tail.strip():
+            child.tail = None
+
+
+def parse_object(element: ET.Element) -> MovaviObject:
+    """
+    Build the model object of a RootObject element. Objects the model can't reproduce exactly
+    (unknown types, or fields written by a newer Movavi) are kept as ``RawObject``. Their XML
+    is cached, so saving the project again only writes the objects edited since.
+
+    >>> parse_object(ET.fromstring('<RootObject type="Title::Object" objectId="5"/>')).object_type
+    'Title::Object'
+    """
+    obj = None
+    object_class = OBJECT_TYPES.get(element.get("type"))
+    if object_class is not None:
+        try:
+            obj = object_class.from_element(element)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            pass
+        else:
+            if ET.tostring(obj.to_element()) != ET.tostring(element):
+                obj = None
+    if obj is None:
+        obj = RawObject(element)
+    obj.cache_xml = True
+    return obj
+
+
+def element_ids(element: ET.Element):
+    """Every objectId and ObjectRef value in an element"""
+    for child in element.iter():
+        if child.get("objectId") is not None:
+            yield int(child.get("objectId"))
+        if child.get("type") == "ObjectRef":
+            yield int(child.get("value"))
+
+
+def parse_movavi_xml(xml: Union[str, bytes]) -> MovaviProjectGenerator:
+    """Load the config.xml of a project into a generator that can be edited and saved again"""
+    root = ET.fromstring(xml)
+    strip_whitespace(root)
+
+    generator = MovaviProjectGenerator()
+    max_id = 0
+    for element in root.findall("RootObject"):
+        obj = generator.add_object(parse_object(element))
+        if isinstance(obj, Predeclarator):
+            generator.predeclarator = obj
+        max_id = max(max_id, max(element_ids(element), default=0))
+
+    root_ref = root.find("RootRef")
+    if root_ref is not None:
+        generator.root_ref = int(root_ref.get("value"))
+    # New objects continue after the highest ID in use
+    generator.next_id = max_id
+
+    if isinstance(generator.objects.get(generator.root_ref), ProjectContent):
+        TimelineBuilder.attach(generator)
+    return generator
+
+
+def load_movavi_project(project: Union[Path, str, BinaryIO]) -> MovaviProjectGenerator:
+    """Load a .mepx archive (path or binary file object), see ``parse_movavi_xml``"""
+    with zipfile.ZipFile(project) as archive:
+        return parse_movavi_xml(archive.read("config.xml"))
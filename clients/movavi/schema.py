@@ -1,10 +1,15 @@
 import os
 import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Union, Optional, List
+from functools import partial
+from typing import Dict, Union, Optional, List, Tuple
 
+from clients.movavi.writer import ElementWriter, Slot, XmlWriter, write_element
 from utils import extract_filename
 
+Writer = Union[XmlWriter, ElementWriter]
+
 
 class FilePath:
     """
@@ -53,19 +58,153 @@ class FilePath:
         return f"FilePath(real_path='{self.real_path}', config_path='{self.config_path}')"
 
 
-class MovaviObject:
-    """Base class for all Movavi objects"""
+def flag(value: bool) -> str:
+    """Movavi booleans are serialised as "1" / "0" """
+    return "1" if value else "0"
+
+
+def write_object_ref_item(writer: Writer):
+    writer.start("Item", type="Item", index=Slot("index"))
+    writer.empty("Data", type="ObjectRef", value=Slot("value"))
+    writer.end("Item")
+
+
+def write_object_refs(writer: Writer, tag: str, refs: List[int]):
+    """Array of ObjectRef items"""
+    if not refs:
+        writer.empty(tag, type="Array", size=0)
+        return
+    writer.start(tag, type="Array", size=len(refs))
+    for i, ref in enumerate(refs, 1):
+        writer.fragment("ObjectRefItem", write_object_ref_item, {"index": i, "value": ref})
+    writer.end(tag)
+
+
+class ElementFields(dict):
+    """
+    Child elements of a parsed object by tag, including those of its ``BaseOfObject`` parts
+
+    >>> fields = ElementFields(ET.fromstring(
+    ...     '<RootObject><BaseOfObject type="Video"><width type="int32_t" value="1920"/></BaseOfObject>'
+    ...     '<used type="bool" value="1"/><items type="Array" size="1"><Item type="Item" index="1">'
+    ...     '<Data type="ObjectRef" value="7"/></Item></items></RootObject>'))
+    >>> fields.integer("width"), fields.flag("used"), fields.refs("items")
+    (1920, True, [7])
+    """
+
+    def __init__(self, element: ET.Element):
+        super().__init__()
+        for child in element:
+            if child.tag == "BaseOfObject":
+                self.update(ElementFields(child))
+            else:
+                self[child.tag] = child
+
+    def integer(self, name: str) -> int:
+        return int(self[name].get("value"))
+
+    def string(self, name: str) -> str:
+        return self[name].get("value")
+
+    def flag(self, name: str) -> bool:
+        return self[name].get("value") == "1"
+
+    def refs(self, name: str) -> List[int]:
+        return [int(item.find("Data").get("value")) for item in self[name]]
+
+
+class MovaviObject(ABC):
+    """
+    Base class for all Movavi objects.
+
+    Objects whose XML structure is fixed set ``templated``: their ``write_body`` writes ``Slot``
+    placeholders instead of values, the skeleton is rendered once per type (and indentation) and
+    every instance only fills in ``slots()``.
+
+    Objects loaded by the parser set ``cache_xml``: their XML is kept once written, and setting
+    any attribute (or ``touch()`` after changing a list or dict in place) marks the object as
+    dirty, so saving an edited project only serialises the modified objects again. Generated
+    objects are streamed straight to the output.
+    """
+
+    templated = False
+    cache_xml = False
 
     def __init__(self, object_id: int, object_type: str):
         self.object_id = object_id
         self.object_type = object_type
 
+    def __setattr__(self, name, value):
+        self.__dict__[name] = value
+        self.__dict__["_xml"] = None
+
+    def touch(self):
+        """Invalidate the cached XML after an in-place change"""
+        self.__dict__["_xml"] = None
+
+    @classmethod
+    @abstractmethod
+    def from_element(cls, element: ET.Element) -> "MovaviObject":
+        """Build the object from its parsed ``RootObject`` element"""
+
+    def template_key(self):
+        """Objects sharing a key must write the same skeleton"""
+        return type(self)
+
+    def slots(self) -> dict:
+        """Per-instance values of the ``Slot`` placeholders"""
+        return {"object_id": self.object_id}
+
+    def write(self, writer: Writer):
+        """Write the object as a ``RootObject`` element"""
+        if not self.cache_xml or not isinstance(writer, XmlWriter):
+            self.write_uncached(writer)
+            return
+
+        key = writer.depth, writer.indent
+        cached = self.__dict__.get("_xml")
+        if cached is None or cached[0] != key:
+            cached = self.__dict__["_xml"] = key, writer.render(self.write_uncached)
+        writer.raw(cached[1])
+
+    def write_uncached(self, writer: Writer):
+        if self.templated:
+            writer.fragment(self.template_key(), self.write_skeleton, self.slots())
+        else:
+            self.write_skeleton(writer)
+
+    def write_skeleton(self, writer: Writer):
+        object_id = Slot("object_id") if self.templated else self.object_id
+        writer.start("RootObject", type=self.object_type, objectId=object_id)
+        self.write_body(writer)
+        writer.end("RootObject")
+
+    def write_body(self, writer: Writer):
+        """Write the child elements of the object"""
+
     def to_element(self) -> ET.Element:
         """Convert object to XML element"""
-        element = ET.Element("RootObject")
-        element.set("type", self.object_type)
-        element.set("objectId", str(self.object_id))
-        return element
+        writer = ElementWriter()
+        self.write(writer)
+        return writer.close()
+
+
+class RawObject(MovaviObject):
+    """Object of a type (or shape) the model doesn't know, written back exactly as it was read"""
+
+    def __init__(self, element: ET.Element):
+        super().__init__(int(element.get("objectId")), element.get("type"))
+        self.element = element
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "RawObject":
+        return cls(element)
+
+    def write_skeleton(self, writer: Writer):
+        write_element(writer, self.element)
+
+
+PREDECLARE_SLOTS = {name: Slot(name) for name in ("index", "object_id", "type_name", "oid", "poid")}
 
 
 class Predeclarator(MovaviObject):
@@ -75,92 +214,106 @@ class Predeclarator(MovaviObject):
         super().__init__(object_id, "Predeclarator")
         self.predeclarations = []
 
-    def add_predeclaration(self, type_name: str, oid: int, poid: int = 0, refs: List[int] = None):
-        """Add a predeclaration to the list"""
+    def add_predeclaration(self, type_name: str, oid: int, poid: int = 0, refs: List[int] = None,
+                           declaration_id: Optional[int] = None):
+        """
+        Add a predeclaration to the list. ``declaration_id`` is the objectId of the
+        ``Predeclare`` entry itself and should come from the project's ID allocator.
+        """
         if refs is None:
             refs = []
         self.predeclarations.append({
             "typeName": type_name,
             "oid": oid,
             "poid": poid,
-            "refs": refs
+            "refs": refs,
+            "objectId": declaration_id
         })
-
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-        predeclarations = ET.SubElement(element, "predeclarations")
-        predeclarations.set("type", "Array")
-        predeclarations.set("size", str(len(self.predeclarations)))
+        self.touch()
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "Predeclarator":
+        predeclarator = cls(int(element.get("objectId")))
+        for item in element.find("predeclarations"):
+            data = item.find("Data")
+            fields = ElementFields(data)
+            predeclarator.add_predeclaration(fields.string("typeName"), fields.integer("oid"), fields.integer("poid"),
+                                             fields.refs("refs"), declaration_id=int(data.get("objectId")))
+        return predeclarator
+
+    @staticmethod
+    def write_predeclaration(writer: Writer, values: dict, refs: List[int] = ()):
+        writer.start("Item", type="Item", index=values["index"])
+        writer.start("Data", type="Predeclare", objectId=values["object_id"])
+        writer.empty("typeName", type="String", value=values["type_name"])
+        writer.empty("oid", type="ObjectRef", value=values["oid"])
+        writer.empty("poid", type="ObjectRef", value=values["poid"])
+        write_object_refs(writer, "refs", refs)
+        writer.end("Data")
+        writer.end("Item")
+
+    @classmethod
+    def write_predeclaration_template(cls, writer: Writer):
+        cls.write_predeclaration(writer, PREDECLARE_SLOTS)
+
+    def write_body(self, writer: Writer):
+        writer.start("predeclarations", type="Array", size=len(self.predeclarations))
 
         for i, predef in enumerate(self.predeclarations, 1):
-            item = ET.SubElement(predeclarations, "Item")
-            item.set("type", "Item")
-            item.set("index", str(i))
-
-            data = ET.SubElement(item, "Data")
-            data.set("type", "Predeclare")
-            data.set("objectId", str(self.object_id + i + 1))
-
-            type_name = ET.SubElement(data, "typeName")
-            type_name.set("type", "String")
-            type_name.set("value", predef["typeName"])
-
-            oid = ET.SubElement(data, "oid")
-            oid.set("type", "ObjectRef")
-            oid.set("value", str(predef["oid"]))
+            values = {
+                "index": i,
+                "object_id": predef["objectId"] or self.object_id + i + 1,
+                "type_name": predef["typeName"],
+                "oid": predef["oid"],
+                "poid": predef["poid"],
+            }
+            if predef["refs"]:
+                self.write_predeclaration(writer, values, predef["refs"])
+            else:
+                writer.fragment("Predeclare", self.write_predeclaration_template, values)
 
-            poid = ET.SubElement(data, "poid")
-            poid.set("type", "ObjectRef")
-            poid.set("value", str(predef["poid"]))
-
-            refs_elem = ET.SubElement(data, "refs")
-            refs_elem.set("type", "Array")
-            refs_elem.set("size", str(len(predef["refs"])))
-
-            for j, ref in enumerate(predef["refs"], 1):
-                ref_item = ET.SubElement(refs_elem, "Item")
-                ref_item.set("type", "Item")
-                ref_item.set("index", str(j))
-
-                ref_data = ET.SubElement(ref_item, "Data")
-                ref_data.set("type", "ObjectRef")
-                ref_data.set("value", str(ref))
-
-        return element
+        writer.end("predeclarations")
 
 
 class ProjectContent(MovaviObject):
     """Class for Project::Content object"""
 
+    templated = True
+
     def __init__(self, object_id: int, timeline_id: int, user_collection_id: int):
         super().__init__(object_id, "Project::Content")
         self.timeline_id = timeline_id
         self.user_collection_id = user_collection_id
         self.portable = False
 
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
-        timeline = ET.SubElement(element, "timeline")
-        timeline.set("type", "ObjectRef")
-        timeline.set("value", str(self.timeline_id))
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "ProjectContent":
+        fields = ElementFields(element)
+        content = cls(int(element.get("objectId")), fields.integer("timeline"), fields.integer("userCollection"))
+        content.portable = fields.flag("portable")
+        return content
 
-        user_collection = ET.SubElement(element, "userCollection")
-        user_collection.set("type", "ObjectRef")
-        user_collection.set("value", str(self.user_collection_id))
+    def slots(self) -> dict:
+        return {
+            "object_id": self.object_id,
+            "timeline_id": self.timeline_id,
+            "user_collection_id": self.user_collection_id,
+            "portable": flag(self.portable),
+        }
 
-        portable = ET.SubElement(element, "portable")
-        portable.set("type", "bool")
-        portable.set("value", "0" if not self.portable else "1")
-
-        return element
+    def write_body(self, writer: Writer):
+        writer.empty("timeline", type="ObjectRef", value=Slot("timeline_id"))
+        writer.empty("userCollection", type="ObjectRef", value=Slot("user_collection_id"))
+        writer.empty("portable", type="bool", value=Slot("portable"))
 
 
 class TimelineObject(MovaviObject):
     """Class for Timeline::Object"""
 
+    # Clip timing fields that must be int64_t
+    INT64_FIELDS = frozenset(["timestamp", "sourceDuration", "sourcePosition", "duration",
+                              "transitionIn", "transitionOut", "fadeInDuraion", "fadeOutDuraion"])
+
     def __init__(self, object_id: int, width: int, height: int, frame_rate_n: int, frame_rate_d: int,
                  sample_rate: int, channel_layout=None):
         super().__init__(object_id, "Timeline::Object")
@@ -191,6 +344,7 @@ class TimelineObject(MovaviObject):
             "key": clip_id,
             "value": clip_timing
         })
+        self.touch()
 
     def add_link(self, key_id: int, link: dict):
         """Add a link to the timeline"""
@@ -198,154 +352,141 @@ class TimelineObject(MovaviObject):
             "key": key_id,
             "value": link
         })
+        self.touch()
 
     def add_track(self, track_id: int):
         """Add a track to the timeline"""
         self.tracks.append(track_id)
-
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
+        self.touch()
+
+    @staticmethod
+    def parse_clip_timing(value: ET.Element) -> dict:
+        timing = {"objectId": int(value.get("objectId"))}
+        for prop in value:
+            prop_type, prop_value = prop.get("type"), prop.get("value")
+            if prop_type == "bool":
+                timing[prop.tag] = prop_value == "1"
+            elif prop_type == "String":
+                timing[prop.tag] = prop_value
+            else:
+                timing[prop.tag] = int(prop_value)
+        return timing
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "TimelineObject":
+        fields = ElementFields(element)
+        timeline = cls(int(element.get("objectId")), fields.integer("width"), fields.integer("height"),
+                       fields.integer("frameRateN"), fields.integer("frameRateD"),
+                       sample_rate=fields.integer("sampleRate"), channel_layout=fields.integer("channelLayout"))
+        timeline.aspect_x = fields.integer("aspectX")
+        timeline.aspect_y = fields.integer("aspectY")
+        timeline.sample_format = fields.integer("sampleFormat")
+
+        for item in fields["clips"]:
+            timeline.add_clip(int(item.find("Key").get("value")), cls.parse_clip_timing(item.find("Value")))
+        for item in fields["links"]:
+            link = ElementFields(item.find("Value"))
+            timeline.add_link(int(item.find("Key").get("value")), {
+                "objectId": int(item.find("Value").get("objectId")),
+                "master": link.integer("master"),
+                "offset": link.integer("offset"),
+            })
+        for track_id in fields.refs("tracks"):
+            timeline.add_track(track_id)
+        return timeline
+
+    def clip_timing_fields(self, timing: dict) -> Tuple[Tuple[Tuple[str, str], ...], dict]:
+        """Movavi type of every clip timing property, and their serialised values"""
+        fields, values = [], {"objectId": timing["objectId"]}
+        for prop_name, prop_value in timing.items():
+            if prop_name == "objectId":
+                continue
+
+            if isinstance(prop_value, bool):
+                prop_type, prop_value = "bool", flag(prop_value)
+            elif isinstance(prop_value, int):
+                if prop_name == "track":
+                    prop_type = "ObjectRef"
+                elif prop_name in self.INT64_FIELDS:
+                    prop_type = "int64_t"
+                else:
+                    prop_type = "int32_t"
+            else:
+                prop_type = "String"
+            fields.append((prop_name, prop_type))
+            values[prop_name] = prop_value
+        return tuple(fields), values
+
+    @staticmethod
+    def write_clip_item(writer: Writer, fields: Tuple[Tuple[str, str], ...]):
+        writer.start("Item", type="Item", index=Slot("item_index"))
+        writer.empty("Key", type="ObjectRef", value=Slot("item_key"))
+        writer.start("Value", type="Timeline::ClipTiming", objectId=Slot("objectId"))
+        for prop_name, prop_type in fields:
+            writer.empty(prop_name, type=prop_type, value=Slot(prop_name))
+        writer.end("Value")
+        writer.end("Item")
+
+    @staticmethod
+    def write_link_item(writer: Writer):
+        writer.start("Item", type="Item", index=Slot("index"))
+        writer.empty("Key", type="ObjectRef", value=Slot("key"))
+        writer.start("Value", type="Timeline::Link", objectId=Slot("object_id"))
+        writer.empty("master", type="ObjectRef", value=Slot("master"))
+        writer.empty("offset", type="int64_t", value=Slot("offset"))
+        writer.end("Value")
+        writer.end("Item")
+
+    def write_body(self, writer: Writer):
         # Add video base
-        video_base = ET.SubElement(element, "BaseOfObject")
-        video_base.set("type", "Video")
-        video_base.set("objectId", str(self.object_id))
-
-        width = ET.SubElement(video_base, "width")
-        width.set("type", "int32_t")
-        width.set("value", str(self.width))
-
-        height = ET.SubElement(video_base, "height")
-        height.set("type", "int32_t")
-        height.set("value", str(self.height))
-
-        frame_rate_n = ET.SubElement(video_base, "frameRateN")
-        frame_rate_n.set("type", "int32_t")
-        frame_rate_n.set("value", str(self.frame_rate_n))
-
-        frame_rate_d = ET.SubElement(video_base, "frameRateD")
-        frame_rate_d.set("type", "int32_t")
-        frame_rate_d.set("value", str(self.frame_rate_d))
-
-        aspect_x = ET.SubElement(video_base, "aspectX")
-        aspect_x.set("type", "int32_t")
-        aspect_x.set("value", str(self.aspect_x))
-
-        aspect_y = ET.SubElement(video_base, "aspectY")
-        aspect_y.set("type", "int32_t")
-        aspect_y.set("value", str(self.aspect_y))
+        writer.start("BaseOfObject", type="Video", objectId=self.object_id)
+        writer.empty("width", type="int32_t", value=self.width)
+        writer.empty("height", type="int32_t", value=self.height)
+        writer.empty("frameRateN", type="int32_t", value=self.frame_rate_n)
+        writer.empty("frameRateD", type="int32_t", value=self.frame_rate_d)
+        writer.empty("aspectX", type="int32_t", value=self.aspect_x)
+        writer.empty("aspectY", type="int32_t", value=self.aspect_y)
+        writer.end("BaseOfObject")
 
         # Add audio base
-        audio_base = ET.SubElement(element, "BaseOfObject")
-        audio_base.set("type", "Audio")
-        audio_base.set("objectId", str(self.object_id))
-
-        channel_layout = ET.SubElement(audio_base, "channelLayout")
-        channel_layout.set("type", "int32_t")
-        channel_layout.set("value", str(self.channel_layout))
-
-        sample_rate = ET.SubElement(audio_base, "sampleRate")
-        sample_rate.set("type", "int32_t")
-        sample_rate.set("value", str(self.sample_rate))
-
-        sample_format = ET.SubElement(audio_base, "sampleFormat")
-        sample_format.set("type", "int32_t")
-        sample_format.set("value", str(self.sample_format))
-
-        # Add clips
-        clips_elem = ET.SubElement(element, "clips")
-        clips_elem.set("type", "Array")
-        clips_elem.set("size", str(len(self.clips)))
-
+        writer.start("BaseOfObject", type="Audio", objectId=self.object_id)
+        writer.empty("channelLayout", type="int32_t", value=self.channel_layout)
+        writer.empty("sampleRate", type="int32_t", value=self.sample_rate)
+        writer.empty("sampleFormat", type="int32_t", value=self.sample_format)
+        writer.end("BaseOfObject")
+
+        # Add clips; clips with the same properties share a template
+        writer.start("clips", type="Array", size=len(self.clips))
         for i, clip in enumerate(self.clips, 1):
-            item = ET.SubElement(clips_elem, "Item")
-            item.set("type", "Item")
-            item.set("index", str(i))
-
-            key = ET.SubElement(item, "Key")
-            key.set("type", "ObjectRef")
-            key.set("value", str(clip["key"]))
-
-            value = ET.SubElement(item, "Value")
-            value.set("type", "Timeline::ClipTiming")
-            value.set("objectId", str(clip["value"]["objectId"]))
-
-            # Define fields that must be int64_t
-            int64_fields = ["timestamp", "sourceDuration", "sourcePosition", "duration",
-                            "transitionIn", "transitionOut", "fadeInDuraion", "fadeOutDuraion"]
-
-            for prop_name, prop_value in clip["value"].items():
-                if prop_name == "objectId":
-                    continue
-
-                prop = ET.SubElement(value, prop_name)
-                if isinstance(prop_value, bool):
-                    prop.set("type", "bool")
-                    prop.set("value", "1" if prop_value else "0")
-                elif isinstance(prop_value, int):
-                    if prop_name == "track":
-                        prop.set("type", "ObjectRef")
-                    elif prop_name in int64_fields:
-                        prop.set("type", "int64_t")
-                    else:
-                        prop.set("type", "int32_t")
-                    prop.set("value", str(prop_value))
-                else:
-                    prop.set("type", "String")
-                    prop.set("value", str(prop_value))
+            fields, values = self.clip_timing_fields(clip["value"])
+            values.update(item_index=i, item_key=clip["key"])
+            writer.fragment(("Timeline::ClipTiming", fields), partial(self.write_clip_item, fields=fields), values)
+        writer.end("clips")
 
         # Add links
-        links_elem = ET.SubElement(element, "links")
-        links_elem.set("type", "Array")
-        links_elem.set("size", str(len(self.links)))
-
+        writer.start("links", type="Array", size=len(self.links))
         for i, link in enumerate(self.links, 1):
-            item = ET.SubElement(links_elem, "Item")
-            item.set("type", "Item")
-            item.set("index", str(i))
-
-            key = ET.SubElement(item, "Key")
-            key.set("type", "ObjectRef")
-            key.set("value", str(link["key"]))
-
-            value = ET.SubElement(item, "Value")
-            value.set("type", "Timeline::Link")
-            value.set("objectId", str(link["value"]["objectId"]))
-
-            master = ET.SubElement(value, "master")
-            master.set("type", "ObjectRef")
-            master.set("value", str(link["value"]["master"]))
-
-            offset = ET.SubElement(value, "offset")
-            offset.set("type", "int64_t")
-            offset.set("value", str(link["value"]["offset"]))
+            writer.fragment("Timeline::Link", self.write_link_item, {
+                "index": i,
+                "key": link["key"],
+                "object_id": link["value"]["objectId"],
+                "master": link["value"]["master"],
+                "offset": link["value"]["offset"],
+            })
+        writer.end("links")
 
         # Add tracks
-        tracks_elem = ET.SubElement(element, "tracks")
-        tracks_elem.set("type", "Array")
-        tracks_elem.set("size", str(len(self.tracks)))
-
-        for i, track_id in enumerate(self.tracks, 1):
-            item = ET.SubElement(tracks_elem, "Item")
-            item.set("type", "Item")
-            item.set("index", str(i))
-
-            data = ET.SubElement(item, "Data")
-            data.set("type", "ObjectRef")
-            data.set("value", str(track_id))
+        write_object_refs(writer, "tracks", self.tracks)
 
         # Add transitions (empty in example)
-        transitions = ET.SubElement(element, "transitions")
-        transitions.set("type", "Array")
-        transitions.set("size", "0")
-
-        return element
+        writer.empty("transitions", type="Array", size=0)
 
 
 class TimelineClip(MovaviObject):
     """Class for Timeline::Clip object"""
 
+    templated = True
+
     def __init__(self, object_id: int, timeline_id: int, clip_type: int, name: str, file_id: int, source_duration: int):
         super().__init__(object_id, "Timeline::Clip")
         self.timeline_id = timeline_id
@@ -359,88 +500,66 @@ class TimelineClip(MovaviObject):
         self.enabled = True
         self.volume = 100
 
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
-        timeline = ET.SubElement(element, "timeline")
-        timeline.set("type", "ObjectRef")
-        timeline.set("value", str(self.timeline_id))
-
-        clip_type = ET.SubElement(element, "type")
-        clip_type.set("type", "int32_t")
-        clip_type.set("value", str(self.clip_type))
-
-        name = ET.SubElement(element, "name")
-        name.set("type", "String")
-        name.set("value", self.name)
-
-        enabled = ET.SubElement(element, "enabled")
-        enabled.set("type", "bool")
-        enabled.set("value", "1" if self.enabled else "0")
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "TimelineClip":
+        fields = ElementFields(element)
+        clip = cls(int(element.get("objectId")), fields.integer("timeline"), fields.integer("type"),
+                   fields.string("name"), fields.integer("file"), fields.integer("sourceDuration"))
+        clip.enabled = fields.flag("enabled")
+        clip.volume = fields.integer("volume")
+        return clip
+
+    def slots(self) -> dict:
+        return {
+            "object_id": self.object_id,
+            "timeline_id": self.timeline_id,
+            "clip_type": self.clip_type,
+            "name": self.name,
+            "enabled": flag(self.enabled),
+            "file_id": self.file_id,
+            "volume": self.volume,
+            "source_duration": self.source_duration,
+        }
+
+    def write_body(self, writer: Writer):
+        writer.empty("timeline", type="ObjectRef", value=Slot("timeline_id"))
+        writer.empty("type", type="int32_t", value=Slot("clip_type"))
+        writer.empty("name", type="String", value=Slot("name"))
+        writer.empty("enabled", type="bool", value=Slot("enabled"))
 
         # Add empty or zero refs
         for ref_name in ["overlay", "quiz"]:
-            ref = ET.SubElement(element, ref_name)
-            ref.set("type", "ObjectRef")
-            ref.set("value", "0")
-
-        file_ref = ET.SubElement(element, "file")
-        file_ref.set("type", "ObjectRef")
-        file_ref.set("value", str(self.file_id))
+            writer.empty(ref_name, type="ObjectRef", value=0)
 
-        nested_timeline = ET.SubElement(element, "nestedTimeline")
-        nested_timeline.set("type", "ObjectRef")
-        nested_timeline.set("value", "0")
-
-        volume = ET.SubElement(element, "volume")
-        volume.set("type", "int32_t")
-        volume.set("value", str(self.volume))
+        writer.empty("file", type="ObjectRef", value=Slot("file_id"))
+        writer.empty("nestedTimeline", type="ObjectRef", value=0)
+        writer.empty("volume", type="int32_t", value=Slot("volume"))
 
         # Add more empty refs
         for ref_name in ["volumeEnvelope", "cropEnvelope", "moveEnvelope"]:
-            ref = ET.SubElement(element, ref_name)
-            ref.set("type", "ObjectRef")
-            ref.set("value", "0")
-
-        volume_normalize = ET.SubElement(element, "volumeNormalize")
-        volume_normalize.set("type", "bool")
-        volume_normalize.set("value", "0")
+            writer.empty(ref_name, type="ObjectRef", value=0)
 
-        broken = ET.SubElement(element, "broken")
-        broken.set("type", "bool")
-        broken.set("value", "0")
-
-        unlimited_duration = ET.SubElement(element, "unlimitedDuration")
-        unlimited_duration.set("type", "bool")
-        unlimited_duration.set("value", "0")
-
-        source_duration = ET.SubElement(element, "sourceDuration")
-        source_duration.set("type", "int64_t")
-        source_duration.set("value", str(self.source_duration))
+        writer.empty("volumeNormalize", type="bool", value="0")
+        writer.empty("broken", type="bool", value="0")
+        writer.empty("unlimitedDuration", type="bool", value="0")
+        writer.empty("sourceDuration", type="int64_t", value=Slot("source_duration"))
 
         # Empty arrays
         for array_name in ["effects", "labels", "motionTrackings"]:
-            array = ET.SubElement(element, array_name)
-            array.set("type", "Array")
-            array.set("size", "0")
+            writer.empty(array_name, type="Array", size=0)
 
         # More refs
         for ref_name in ["rhythm", "stabilization"]:
-            ref = ET.SubElement(element, ref_name)
-            ref.set("type", "ObjectRef")
-            ref.set("value", "0")
-
-        media_track = ET.SubElement(element, "mediaTrack")
-        media_track.set("type", "int32_t")
-        media_track.set("value", "0")
+            writer.empty(ref_name, type="ObjectRef", value=0)
 
-        return element
+        writer.empty("mediaTrack", type="int32_t", value=0)
 
 
 class File(MovaviObject):
     """Class for File object"""
 
+    templated = True
+
     def __init__(self, object_id: int, path: str, size: int, format: str, length: int,
                  video_track_id: int = None, audio_track_id: int = None):
         super().__init__(object_id, "File")
@@ -454,78 +573,53 @@ class File(MovaviObject):
         self.video_track_id = video_track_id
         self.audio_track_id = audio_track_id
 
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
-        path = ET.SubElement(element, "path")
-        path.set("type", "String")
-        path.set("value", self.path)
-
-        size = ET.SubElement(element, "size")
-        size.set("type", "int64_t")
-        size.set("value", str(self.size))
-
-        format_elem = ET.SubElement(element, "format")
-        format_elem.set("type", "String")
-        format_elem.set("value", self.format)
-
-        length = ET.SubElement(element, "length")
-        length.set("type", "int64_t")
-        length.set("value", str(self.length))
-
-        is_opening = ET.SubElement(element, "isOpening")
-        is_opening.set("type", "bool")
-        is_opening.set("value", "1" if self.is_opening else "0")
-
-        is_opened = ET.SubElement(element, "isOpened")
-        is_opened.set("type", "bool")
-        is_opened.set("value", "1" if self.is_opened else "0")
-
-        is_failed = ET.SubElement(element, "isFailed")
-        is_failed.set("type", "bool")
-        is_failed.set("value", "1" if self.is_failed else "0")
-
-        # Video tracks
-        video_tracks = ET.SubElement(element, "videoTracks")
-        if self.video_track_id:
-            video_tracks.set("type", "Array")
-            video_tracks.set("size", "1")
-
-            item = ET.SubElement(video_tracks, "Item")
-            item.set("type", "Item")
-            item.set("index", "1")
-
-            data = ET.SubElement(item, "Data")
-            data.set("type", "ObjectRef")
-            data.set("value", str(self.video_track_id))
-        else:
-            video_tracks.set("type", "Array")
-            video_tracks.set("size", "0")
-
-        # Audio tracks
-        audio_tracks = ET.SubElement(element, "audioTracks")
-        if self.audio_track_id:
-            audio_tracks.set("type", "Array")
-            audio_tracks.set("size", "1")
-
-            item = ET.SubElement(audio_tracks, "Item")
-            item.set("type", "Item")
-            item.set("index", "1")
-
-            data = ET.SubElement(item, "Data")
-            data.set("type", "ObjectRef")
-            data.set("value", str(self.audio_track_id))
-        else:
-            audio_tracks.set("type", "Array")
-            audio_tracks.set("size", "0")
-
-        return element
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "File":
+        fields = ElementFields(element)
+        video_tracks, audio_tracks = fields.refs("videoTracks"), fields.refs("audioTracks")
+        file = cls(int(element.get("objectId")), fields.string("path"), fields.integer("size"),
+                   fields.string("format"), fields.integer("length"),
+                   video_tracks[0] if video_tracks else None, audio_tracks[0] if audio_tracks else None)
+        file.is_opening = fields.flag("isOpening")
+        file.is_opened = fields.flag("isOpened")
+        file.is_failed = fields.flag("isFailed")
+        return file
+
+    def template_key(self):
+        # A file has zero or one video/audio track
+        return type(self), bool(self.video_track_id), bool(self.audio_track_id)
+
+    def slots(self) -> dict:
+        return {
+            "object_id": self.object_id,
+            "path": self.path,
+            "size": self.size,
+            "format": self.format,
+            "length": self.length,
+            "is_opening": flag(self.is_opening),
+            "is_opened": flag(self.is_opened),
+            "is_failed": flag(self.is_failed),
+            "video_track_id": self.video_track_id,
+            "audio_track_id": self.audio_track_id,
+        }
+
+    def write_body(self, writer: Writer):
+        writer.empty("path", type="String", value=Slot("path"))
+        writer.empty("size", type="int64_t", value=Slot("size"))
+        writer.empty("format", type="String", value=Slot("format"))
+        writer.empty("length", type="int64_t", value=Slot("length"))
+        writer.empty("isOpening", type="bool", value=Slot("is_opening"))
+        writer.empty("isOpened", type="bool", value=Slot("is_opened"))
+        writer.empty("isFailed", type="bool", value=Slot("is_failed"))
+        write_object_refs(writer, "videoTracks", [Slot("video_track_id")] if self.video_track_id else [])
+        write_object_refs(writer, "audioTracks", [Slot("audio_track_id")] if self.audio_track_id else [])
 
 
 class VideoTrack(MovaviObject):
     """Class for VideoTrack object"""
 
+    templated = True
+
     def __init__(self, object_id: int, file_id: int, width: int, height: int,
                  frame_rate_n: int, frame_rate_d: int, bitrate: int, codec_id: str):
         super().__init__(object_id, "VideoTrack")
@@ -540,71 +634,59 @@ class VideoTrack(MovaviObject):
         self.bitrate = bitrate
         self.is_image = False
 
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "VideoTrack":
+        fields = ElementFields(element)
+        track = cls(int(element.get("objectId")), fields.integer("file"), fields.integer("width"),
+                    fields.integer("height"), fields.integer("frameRateN"), fields.integer("frameRateD"),
+                    fields.integer("bitrate"), fields.string("codecId"))
+        track.aspect_x = fields.integer("aspectX")
+        track.aspect_y = fields.integer("aspectY")
+        track.is_image = fields.flag("isImage")
+        return track
+
+    def slots(self) -> dict:
+        return {
+            "object_id": self.object_id,
+            "width": self.width,
+            "height": self.height,
+            "frame_rate_n": self.frame_rate_n,
+            "frame_rate_d": self.frame_rate_d,
+            "aspect_x": self.aspect_x,
+            "aspect_y": self.aspect_y,
+            "file_id": self.file_id,
+            "codec_id": self.codec_id,
+            "bitrate": self.bitrate,
+            "is_image": flag(self.is_image),
+        }
+
+    def write_body(self, writer: Writer):
         # Base video object
-        base_video = ET.SubElement(element, "BaseOfObject")
-        base_video.set("type", "Video")
-        base_video.set("objectId", str(self.object_id))
-
-        width = ET.SubElement(base_video, "width")
-        width.set("type", "int32_t")
-        width.set("value", str(self.width))
-
-        height = ET.SubElement(base_video, "height")
-        height.set("type", "int32_t")
-        height.set("value", str(self.height))
-
-        frame_rate_n = ET.SubElement(base_video, "frameRateN")
-        frame_rate_n.set("type", "int32_t")
-        frame_rate_n.set("value", str(self.frame_rate_n))
-
-        frame_rate_d = ET.SubElement(base_video, "frameRateD")
-        frame_rate_d.set("type", "int32_t")
-        frame_rate_d.set("value", str(self.frame_rate_d))
-
-        aspect_x = ET.SubElement(base_video, "aspectX")
-        aspect_x.set("type", "int32_t")
-        aspect_x.set("value", str(self.aspect_x))
-
-        aspect_y = ET.SubElement(base_video, "aspectY")
-        aspect_y.set("type", "int32_t")
-        aspect_y.set("value", str(self.aspect_y))
+        writer.start("BaseOfObject", type="Video", objectId=Slot("object_id"))
+        writer.empty("width", type="int32_t", value=Slot("width"))
+        writer.empty("height", type="int32_t", value=Slot("height"))
+        writer.empty("frameRateN", type="int32_t", value=Slot("frame_rate_n"))
+        writer.empty("frameRateD", type="int32_t", value=Slot("frame_rate_d"))
+        writer.empty("aspectX", type="int32_t", value=Slot("aspect_x"))
+        writer.empty("aspectY", type="int32_t", value=Slot("aspect_y"))
+        writer.end("BaseOfObject")
 
         # Base track object
-        base_track = ET.SubElement(element, "BaseOfObject")
-        base_track.set("type", "Track")
-        base_track.set("objectId", str(self.object_id))
-
-        file_ref = ET.SubElement(base_track, "file")
-        file_ref.set("type", "ObjectRef")
-        file_ref.set("value", str(self.file_id))
+        writer.start("BaseOfObject", type="Track", objectId=Slot("object_id"))
+        writer.empty("file", type="ObjectRef", value=Slot("file_id"))
+        writer.empty("index", type="int32_t", value=0)  # First track
+        writer.empty("codecId", type="String", value=Slot("codec_id"))
+        writer.empty("bitrate", type="int32_t", value=Slot("bitrate"))
+        writer.end("BaseOfObject")
 
-        index = ET.SubElement(base_track, "index")
-        index.set("type", "int32_t")
-        index.set("value", "0")  # First track
-
-        codec_id = ET.SubElement(base_track, "codecId")
-        codec_id.set("type", "String")
-        codec_id.set("value", self.codec_id)
-
-        bitrate = ET.SubElement(base_track, "bitrate")
-        bitrate.set("type", "int32_t")
-        bitrate.set("value", str(self.bitrate))
-
-        # Is image
-        is_image = ET.SubElement(element, "isImage")
-        is_image.set("type", "bool")
-        is_image.set("value", "1" if self.is_image else "0")
-
-        return element
+        writer.empty("isImage", type="bool", value=Slot("is_image"))
 
 
 class AudioTrack(MovaviObject):
     """Class for AudioTrack object"""
 
+    templated = True
+
     def __init__(self, object_id: int, file_id: int, channel_layout,
                  sample_rate: int, sample_format: int, bitrate: int, codec_id=None):
         super().__init__(object_id, "AudioTrack")
@@ -623,54 +705,46 @@ class AudioTrack(MovaviObject):
         self.codec_id = codec_id if codec_id else "CODEC_ID_AAC"
         self.bitrate = bitrate
 
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "AudioTrack":
+        fields = ElementFields(element)
+        return cls(int(element.get("objectId")), fields.integer("file"), fields.integer("channelLayout"),
+                   fields.integer("sampleRate"), fields.integer("sampleFormat"), fields.integer("bitrate"),
+                   codec_id=fields.string("codecId"))
+
+    def slots(self) -> dict:
+        return {
+            "object_id": self.object_id,
+            "channel_layout": self.channel_layout,
+            "sample_rate": self.sample_rate,
+            "sample_format": self.sample_format,
+            "file_id": self.file_id,
+            "codec_id": self.codec_id,
+            "bitrate": self.bitrate,
+        }
+
+    def write_body(self, writer: Writer):
         # Base audio object
-        base_audio = ET.SubElement(element, "BaseOfObject")
-        base_audio.set("type", "Audio")
-        base_audio.set("objectId", str(self.object_id))
-
-        channel_layout = ET.SubElement(base_audio, "channelLayout")
-        channel_layout.set("type", "int32_t")
-        channel_layout.set("value", str(self.channel_layout))
-
-        sample_rate = ET.SubElement(base_audio, "sampleRate")
-        sample_rate.set("type", "int32_t")
-        sample_rate.set("value", str(self.sample_rate))
-
-        sample_format = ET.SubElement(base_audio, "sampleFormat")
-        sample_format.set("type", "int32_t")
-        sample_format.set("value", str(self.sample_format))
+        writer.start("BaseOfObject", type="Audio", objectId=Slot("object_id"))
+        writer.empty("channelLayout", type="int32_t", value=Slot("channel_layout"))
+        writer.empty("sampleRate", type="int32_t", value=Slot("sample_rate"))
+        writer.empty("sampleFormat", type="int32_t", value=Slot("sample_format"))
+        writer.end("BaseOfObject")
 
         # Base track object
-        base_track = ET.SubElement(element, "BaseOfObject")
-        base_track.set("type", "Track")
-        base_track.set("objectId", str(self.object_id))
-
-        file_ref = ET.SubElement(base_track, "file")
-        file_ref.set("type", "ObjectRef")
-        file_ref.set("value", str(self.file_id))
-
-        index = ET.SubElement(base_track, "index")
-        index.set("type", "int32_t")
-        index.set("value", "1")  # Audio is usually track 1
-
-        codec_id = ET.SubElement(base_track, "codecId")
-        codec_id.set("type", "String")
-        codec_id.set("value", self.codec_id)
-
-        bitrate = ET.SubElement(base_track, "bitrate")
-        bitrate.set("type", "int32_t")
-        bitrate.set("value", str(self.bitrate))
-
-        return element
+        writer.start("BaseOfObject", type="Track", objectId=Slot("object_id"))
+        writer.empty("file", type="ObjectRef", value=Slot("file_id"))
+        writer.empty("index", type="int32_t", value=1)  # Audio is usually track 1
+        writer.empty("codecId", type="String", value=Slot("codec_id"))
+        writer.empty("bitrate", type="int32_t", value=Slot("bitrate"))
+        writer.end("BaseOfObject")
 
 
 class TimelineTrack(MovaviObject):
     """Class for Timeline::Track object"""
 
+    templated = True
+
     def __init__(self, object_id: int, timeline_id: int, track_type: int,
                  muted: bool = False, hidden: bool = False, linked: bool = False,
                  gapless: bool = False, used: bool = False):
@@ -683,39 +757,33 @@ class TimelineTrack(MovaviObject):
         self.gapless = gapless
         self.used = used
 
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
-        track_type = ET.SubElement(element, "type")
-        track_type.set("type", "int32_t")
-        track_type.set("value", str(self.track_type))
-
-        muted = ET.SubElement(element, "muted")
-        muted.set("type", "bool")
-        muted.set("value", "1" if self.muted else "0")
-
-        hidden = ET.SubElement(element, "hidden")
-        hidden.set("type", "bool")
-        hidden.set("value", "1" if self.hidden else "0")
-
-        linked = ET.SubElement(element, "linked")
-        linked.set("type", "bool")
-        linked.set("value", "1" if self.linked else "0")
-
-        gapless = ET.SubElement(element, "gapless")
-        gapless.set("type", "bool")
-        gapless.set("value", "1" if self.gapless else "0")
-
-        used = ET.SubElement(element, "used")
-        used.set("type", "bool")
-        used.set("value", "1" if self.used else "0")
-
-        timeline = ET.SubElement(element, "timeline")
-        timeline.set("type", "ObjectRef")
-        timeline.set("value", str(self.timeline_id))
-
-        return element
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "TimelineTrack":
+        fields = ElementFields(element)
+        return cls(int(element.get("objectId")), fields.integer("timeline"), fields.integer("type"),
+                   muted=fields.flag("muted"), hidden=fields.flag("hidden"), linked=fields.flag("linked"),
+                   gapless=fields.flag("gapless"), used=fields.flag("used"))
+
+    def slots(self) -> dict:
+        return {
+            "object_id": self.object_id,
+            "track_type": self.track_type,
+            "muted": flag(self.muted),
+            "hidden": flag(self.hidden),
+            "linked": flag(self.linked),
+            "gapless": flag(self.gapless),
+            "used": flag(self.used),
+            "timeline_id": self.timeline_id,
+        }
+
+    def write_body(self, writer: Writer):
+        writer.empty("type", type="int32_t", value=Slot("track_type"))
+        writer.empty("muted", type="bool", value=Slot("muted"))
+        writer.empty("hidden", type="bool", value=Slot("hidden"))
+        writer.empty("linked", type="bool", value=Slot("linked"))
+        writer.empty("gapless", type="bool", value=Slot("gapless"))
+        writer.empty("used", type="bool", value=Slot("used"))
+        writer.empty("timeline", type="ObjectRef", value=Slot("timeline_id"))
 
 
 class EditorCollectionUserObject(MovaviObject):
@@ -728,30 +796,21 @@ class EditorCollectionUserObject(MovaviObject):
     def add_item(self, item_id: int):
         """Add an item to the collection"""
         self.items.append(item_id)
+        self.touch()
 
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
-        items_elem = ET.SubElement(element, "items")
-        items_elem.set("type", "Array")
-        items_elem.set("size", str(len(self.items)))
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "EditorCollectionUserObject":
+        return cls(int(element.get("objectId")), ElementFields(element).refs("items"))
 
-        for i, item_id in enumerate(self.items, 1):
-            item = ET.SubElement(items_elem, "Item")
-            item.set("type", "Item")
-            item.set("index", str(i))
-
-            data = ET.SubElement(item, "Data")
-            data.set("type", "ObjectRef")
-            data.set("value", str(item_id))
-
-        return element
+    def write_body(self, writer: Writer):
+        write_object_refs(writer, "items", self.items)
 
 
 class ImportObject(MovaviObject):
     """Class for Import::Object"""
 
+    templated = True
+
     def __init__(self, object_id: int, tag: str, location: str, kind: int = 2):
         super().__init__(object_id, "Import::Object")
         # Make sure tag is just a filename if it's not already
@@ -764,40 +823,37 @@ class ImportObject(MovaviObject):
         self.kind = kind  # Added kind parameter with default value 2
         self.category = "user_files"
 
-    def to_element(self) -> ET.Element:
-        """Convert object to XML element"""
-        element = super().to_element()
-
-        tag = ET.SubElement(element, "tag")
-        tag.set("type", "String")
-        tag.set("value", self.tag)
-
-        description = ET.SubElement(element, "description")
-        description.set("type", "String")
-        description.set("value", self.description)
-
-        description_url = ET.SubElement(element, "descriptionUrl")
-        description_url.set("type", "String")
-        description_url.set("value", self.description_url)
-
-        location = ET.SubElement(element, "location")
-        location.set("type", "String")
-        location.set("value", self.location)
-
-        remote_url = ET.SubElement(element, "remoteUrl")
-        remote_url.set("type", "String")
-        remote_url.set("value", self.remote_url)
-
-        remote_size = ET.SubElement(element, "remoteSize")
-        remote_size.set("type", "int64_t")
-        remote_size.set("value", str(self.remote_size))
-
-        kind = ET.SubElement(element, "kind")
-        kind.set("type", "int32_t")
-        kind.set("value", str(self.kind))
-
-        category = ET.SubElement(element, "category")
-        category.set("type", "String")
-        category.set("value", self.category)
-
-        return element
+    @classmethod
+    def from_element(cls, element: ET.Element) -> "ImportObject":
+        fields = ElementFields(element)
+        import_object = cls(int(element.get("objectId")), fields.string("tag"), fields.string("location"),
+                            kind=fields.integer("kind"))
+        import_object.description = fields.string("description")
+        import_object.description_url = fields.string("descriptionUrl")
+        import_object.remote_url = fields.string("remoteUrl")
+        import_object.remote_size = fields.integer("remoteSize")
+        import_object.category = fields.string("category")
+        return import_object
+
+    def slots(self) -> dict:
+        return {
+            "object_id": self.object_id,
+            "tag": self.tag,
+            "description": self.description,
+            "description_url": self.description_url,
+            "location": self.location,
+            "remote_url": self.remote_url,
+            "remote_size": self.remote_size,
+            "kind": self.kind,
+            "category": self.category,
+        }
+
+    def write_body(self, writer: Writer):
+        writer.empty("tag", type="String", value=Slot("tag"))
+        writer.empty("description", type="String", value=Slot("description"))
+        writer.empty("descriptionUrl", type="String", value=Slot("description_url"))
+        writer.empty("location", type="String", value=Slot("location"))
+        writer.empty("remoteUrl", type="String", value=Slot("remote_url"))
+        writer.empty("remoteSize", type="int64_t", value=Slot("remote_size"))
+        writer.empty("kind", type="int32_t", value=Slot("kind"))
+        writer.empty("category", type="String", value=Slot("category"))
@@ -0,0 +1,195 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Hashable, TextIO, Tuple
+from xml.sax.saxutils import escape
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+ATTRIBUTE_ENTITIES = {'"': "&quot;"}
+SLOT_PATTERN = re.compile("\x00(\\w+)\x00")
+
+
+class Slot(str):
+    """
+    Placeholder written instead of a per-instance value while a ``Template`` is rendered.
+    It contains nothing that XML escaping would touch.
+
+    >>> Slot("object_id").name
+    'object_id'
+    """
+
+    def __new__(cls, name: str):
+        slot = super().__new__(cls, f"\x00{name}\x00")
+        slot.name = name
+        return slot
+
+
+class Template:
+    """
+    XML fragment rendered once, with ``Slot`` values left as format fields
+
+    >>> template = Template.render(lambda writer: writer.empty("name", type="String", value=Slot("name")), depth=1)
+    >>> template.fill({"name": 'a "b"'})
+    '    <name type="String" value="a &quot;b&quot;"/>\\n'
+    """
+
+    def __init__(self, source: str):
+        self.format = SLOT_PATTERN.sub(r"{\1}", source.replace("{", "{{").replace("}", "}}")).format
+
+    @classmethod
+    def render(cls, write: Callable[["XmlWriter"], None], depth: int = 0, indent: str = "    ") -> "Template":
+        writer = XmlWriter(io.StringIO(), indent)
+        writer.depth = depth
+        return cls(writer.render(write))
+
+    def fill(self, values: dict) -> str:
+        return self.format(**{name: escape(str(value), ATTRIBUTE_ENTITIES) for name, value in values.items()})
+
+
+# Rendered templates by (key, depth, indent); the indentation is part of the text
+TEMPLATES: Dict[Tuple[Hashable, int, str], Template] = {}
+
+
+class XmlWriter:
+    """
+    Incremental, indenting XML serializer writing straight into a text stream.
+
+    The output matches ``minidom.toprettyxml(indent="    ")``: one element per line and
+    childless elements self-closed. The start tag of an element is only finished once it's
+    known whether the element has children.
+
+    >>> import io
+    >>> stream = io.StringIO()
+    >>> writer = XmlWriter(stream)
+    >>> writer.start("Archive")
+    >>> writer.start("RootObject", type="File", objectId=1)
+    >>> writer.empty("path", type="String", value='C:\\\\a "b" & c.mp4')
+    >>> writer.end("RootObject")
+    >>> writer.start("clips", type="Array", size=0)
+    >>> writer.end("clips")
+    >>> writer.end("Archive")
+    >>> print(stream.getvalue(), end="")
+    <Archive>
+        <RootObject type="File" objectId="1">
+            <path type="String" value="C:\\a &quot;b&quot; &amp; c.mp4"/>
+        </RootObject>
+        <clips type="Array" size="0"/>
+    </Archive>
+    """
+
+    def __init__(self, stream: TextIO, indent: str = "    "):
+        self.stream = stream
+        self.indent = indent
+        self.depth = 0
+        self.pending = False  # a start tag is waiting for its ">" or "/>"
+
+    def declaration(self) -> None:
+        self.stream.write(XML_DECLARATION)
+
+    def _close_start_tag(self) -> None:
+        if self.pending:
+            self.stream.write(">\n")
+            self.pending = False
+
+    def _open(self, tag: str, attributes: dict) -> None:
+        self._close_start_tag()
+        parts = [self.indent * self.depth, "<", tag]
+        for name, value in attributes.items():
+            parts.append(f' {name}="{escape(str(value), ATTRIBUTE_ENTITIES)}"')
+        self.stream.write("".join(parts))
+
+    def start(self, tag: str, /, **attributes) -> None:
+        self._open(tag, attributes)
+        self.pending = True
+        self.depth += 1
+
+    def end(self, tag: str, /) -> None:
+        self.depth -= 1
+        if self.pending:
+            self.stream.write("/>\n")
+            self.pending = False
+        else:
+            self.stream.write(f"{self.indent * self.depth}</{tag}>\n")
+
+    def empty(self, tag: str, /, **attributes) -> None:
+        """Write an element without children"""
+        self._open(tag, attributes)
+        self.stream.write("/>\n")
+        self.pending = False
+
+    def fragment(self, key: Hashable, write: Callable[["XmlWriter"], None], values: dict) -> None:
+        """
+        Write complete elements from the template ``key``, rendering it with ``write`` on first use.
+        ``write`` must produce the same structure for every call sharing ``key``; only ``Slot``
+        values differ, and they are filled from ``values``.
+        """
+        cache_key = key, self.depth, self.indent
+        template = TEMPLATES.get(cache_key)
+        if template is None:
+            template = TEMPLATES[cache_key] = Template.render(write, self.depth, self.indent)
+        self._close_start_tag()
+        self.stream.write(template.fill(values))
+
+    def render(self, write: Callable[["XmlWriter"], None]) -> str:
+        """Text ``write`` produces at the current depth, for writing it again later with ``raw``"""
+        stream = io.StringIO()
+        writer = XmlWriter(stream, self.indent)
+        writer.depth = self.depth
+        write(writer)
+        return stream.getvalue()
+
+    def raw(self, text: str) -> None:
+        """Write complete elements already serialised at the current depth"""
+        self._close_start_tag()
+        self.stream.write(text)
+
+
+class ElementWriter:
+    """
+    ``XmlWriter`` counterpart building an ``ElementTree`` element instead of text
+
+    >>> writer = ElementWriter()
+    >>> writer.start("RootObject", type="File", objectId=1)
+    >>> writer.empty("size", type="int64_t", value=10)
+    >>> writer.end("RootObject")
+    >>> ET.tostring(writer.close())
+    b'<RootObject type="File" objectId="1"><size type="int64_t" value="10" /></RootObject>'
+    """
+
+    def __init__(self):
+        self.builder = ET.TreeBuilder()
+        self.values = {}
+
+    def _value(self, value) -> str:
+        return str(self.values[value.name]) if isinstance(value, Slot) else str(value)
+
+    def start(self, tag: str, /, **attributes) -> None:
+        self.builder.start(tag, {name: self._value(value) for name, value in attributes.items()})
+
+    def end(self, tag: str, /) -> None:
+        self.builder.end(tag)
+
+    def empty(self, tag: str, /, **attributes) -> None:
+        self.start(tag, **attributes)
+        self.end(tag)
+
+    def fragment(self, key: Hashable, write: Callable[["ElementWriter"], None], values: dict) -> None:
+        # Values of a nested fragment may themselves be slots of the enclosing one
+        outer = self.values
+        self.values = {name: self._value(value) for name, value in values.items()}
+        write(self)
+        self.values = outer
+
+    def close(self) -> ET.Element:
+        return self.builder.close()
+
+
+def write_element(writer, element: ET.Element) -> None:
+    """Write an element tree read from a document through an ``XmlWriter``/``ElementWriter``"""
+    if len(element):
+        writer.start(element.tag, **element.attrib)
+        for child in element:
+            write_element(writer, child)
+        writer.end(element.tag)
+    else:
+        writer.empty(element.tag, **element.attrib)
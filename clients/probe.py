@@ -0,0 +1,271 @@
+import asyncio
+import contextlib
+import json
+import os
+import sqlite3
+import subprocess
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Optional, Tuple, Union
+
+from clients.process import run_process
+from settings import PROBE_CACHE_PATH, PROBE_CONCURRENCY
+
+try:
+    # In-process backend (av in requirements.txt); the ffprobe subprocess is used without it
+    import av
+except ImportError:
+    av = None
+
+ProbeKey = Tuple[str, int, int, int]
+
+
+def probe_key(path: Union[Path, str]) -> ProbeKey:
+    """
+    Identity of a media file: (real path, size, mtime in ns, inode).
+    Any rewrite of the file changes at least one of them.
+    """
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    return real_path, stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class ProbeCache:
+    """
+    Persistent cache of ffprobe results, shared by every process through a SQLite file.
+
+    >>> import tempfile
+    >>> directory = Path(tempfile.mkdtemp())
+    >>> media = directory / "clip.mp4"
+    >>> _ = media.write_bytes(b"data")
+    >>> cache = ProbeCache(directory / "cache.sqlite3")
+    >>> cache.get(probe_key(media)) is None
+    True
+    >>> cache.set(probe_key(media), {"format": {"duration": "1.5"}})
+    >>> ProbeCache(directory / "cache.sqlite3").get(probe_key(media))
+    {'format': {'duration': '1.5'}}
+    >>> _ = media.write_bytes(b"changed")
+    >>> cache.get(probe_key(media)) is None
+    True
+    """
+
+    def __init__(self, path: Path = PROBE_CACHE_PATH):
+        self.path = Path(path)
+        self.memory: Dict[ProbeKey, dict] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # A connection must not be shared with forked worker processes
+        if self._connection is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, data TEXT)"
+            )
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key: ProbeKey) -> Optional[dict]:
+        if key in self.memory:
+            return self.memory[key]
+
+        row = self.connection.execute(
+            "SELECT data FROM probes WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        data = self.memory[key] = json.loads(row[0])
+        return data
+
+    def set(self, key: ProbeKey, data: dict) -> None:
+        self.memory[key] = data
+        self.connection.execute(
+            "INSERT OR REPLACE INTO probes (path, size, mtime_ns, inode, data) VALUES (?, ?, ?, ?, ?)",
+            (*key, json.dumps(data)),
+        )
+
+
+default_cache = ProbeCache()
+
+
+def ffprobe_command(path: Union[Path, str]) -> list:
+    return ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", str(path)]
+
+
+def run_ffprobe(path: Union[Path, str]) -> dict:
+    """Run a single ffprobe returning both the format and all the streams"""
+    result = subprocess.run(ffprobe_command(path), capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def _seconds(value, time_base) -> Optional[str]:
+    return f"{float(value * time_base):.6f}" if value is not None and time_base else None
+
+
+def _rate(rate) -> Optional[str]:
+    return f"{rate.numerator}/{rate.denominator}" if rate else None
+
+
+def run_pyav(path: Union[Path, str]) -> dict:
+    """
+    Read the container headers in-process with libavformat (PyAV) and describe them
+    in the same shape as ``ffprobe -print_format json -show_format -show_streams``
+    """
+    with av.open(str(path)) as container:
+        streams = []
+        for stream in container.streams:
+            codec = stream.codec_context
+            description = {
+                "index": stream.index,
+                "codec_type": stream.type,
+                "codec_name": codec.name if codec else None,
+                "duration": _seconds(stream.duration, stream.time_base),
+                "bit_rate": str(codec.bit_rate) if codec and codec.bit_rate else None,
+                "nb_frames": str(stream.frames) if stream.frames else None,
+            }
+            if stream.type == "video":
+                description.update({
+                    "width": codec.width,
+                    "height": codec.height,
+                    "r_frame_rate": _rate(stream.base_rate or stream.average_rate),
+                })
+            elif stream.type == "audio":
+                description.update({
+                    "sample_rate": str(codec.sample_rate),
+                    "channels": codec.layout.nb_channels,
+                    "channel_layout": codec.layout.name,
+                    "sample_fmt": codec.format.name if codec.format else None,
+                })
+            # ffprobe omits unknown values instead of reporting null
+            streams.append({key: value for key, value in description.items() if value is not None})
+
+        media_format = {
+            "filename": str(path),
+            "format_name": container.format.name,
+            "duration": _seconds(container.duration, 1 / av.time_base),
+            "bit_rate": str(container.bit_rate) if container.bit_rate else None,
+        }
+        media_format = {key: value for key, value in media_format.items() if value is not None}
+
+    return {"streams": streams, "format": media_format}
+
+
+def run_probe(path: Union[Path, str]) -> dict:
+    """Probe in-process when PyAV is installed, falling back to the ffprobe subprocess"""
+    if av is not None:
+        try:
+            return run_pyav(path)
+        except Exception as e:
+            print(f"PyAV probe failed for {path}, falling back to ffprobe: {e}")
+    return run_ffprobe(path)
+
+
+def probe(path: Union[Path, str], cache: Optional[ProbeCache] = None) -> dict:
+    """
+    Return the ffprobe ``{"format": ..., "streams": [...]}`` description of a media file,
+    probing it at most once per (path, size, mtime, inode).
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist
+        subprocess.CalledProcessError: If ffprobe fails
+    """
+    cache = default_cache if cache is None else cache
+    key = probe_key(path)
+
+    data = cache.get(key)
+    if data is None:
+        data = run_probe(key[0])
+        cache.set(key, data)
+    return data
+
+
+async def run_ffprobe_async(path: Union[Path, str]) -> dict:
+    """Same as ``run_ffprobe`` without blocking the event loop; the process is killed on cancellation"""
+    return json.loads(await run_process(ffprobe_command(path)))
+
+
+async def run_probe_async(path: Union[Path, str]) -> dict:
+    if av is not None:
+        try:
+            return await asyncio.to_thread(run_pyav, path)
+        except Exception as e:
+            print(f"PyAV probe failed for {path}, falling back to ffprobe: {e}")
+    return await run_ffprobe_async(path)
+
+
+async def probe_async(path: Union[Path, str], cache: Optional[ProbeCache] = None,
+                      semaphore: Optional[asyncio.Semaphore] = None) -> dict:
+    """
+    Asyncio version of ``probe``. Cache hits never wait for ``semaphore``,
+    which only bounds the number of probes running at the same time.
+    """
+    cache = default_cache if cache is None else cache
+    key = probe_key(path)
+
+    data = cache.get(key)
+    if data is None:
+        async with semaphore or contextlib.nullcontext():
+            data = await run_probe_async(key[0])
+        cache.set(key, data)
+    return data
+
+
+async def probe_many(paths: Iterable[Union[Path, str]], cache: Optional[ProbeCache] = None,
+                     limit: int = PROBE_CONCURRENCY,
+                     return_exceptions: bool = False) -> AsyncIterator[Tuple[Union[Path, str], dict]]:
+    """
+    Probe up to ``limit`` files concurrently, yielding ``(path, data)`` as each probe completes.
+
+    With ``return_exceptions`` a failed probe is yielded as ``(path, exception)`` instead of
+    cancelling the remaining ones.
+
+    >>> async def collect():
+    ...     return [item async for item in probe_many([])]
+    >>> asyncio.run(collect())
+    []
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(path):
+        try:
+            return path, await probe_async(path, cache, semaphore)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return path, e
+
+    # The same file listed twice is probed once
+    tasks = [asyncio.create_task(run(path)) for path in dict.fromkeys(paths)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def warm_cache(paths: Iterable[Union[Path, str]], cache: Optional[ProbeCache] = None,
+                     limit: int = PROBE_CONCURRENCY) -> Dict[Union[Path, str], dict]:
+    """
+    Probe ``paths`` in parallel so the blocking metadata helpers only hit the cache afterwards.
+    Missing or unreadable files are reported and skipped.
+    """
+    results = {}
+    async for path, data in probe_many(paths, cache, limit, return_exceptions=True):
+        if isinstance(data, Exception):
+            print(f"Probe failed for {path}: {data}")
+            continue
+        results[path] = data
+    return results
+
+
+def first_stream(data: dict, codec_type: str) -> Optional[dict]:
+    """
+    >>> first_stream({"streams": [{"codec_type": "video"}, {"codec_type": "audio", "index": 1}]}, "audio")
+    {'codec_type': 'audio', 'index': 1}
+    >>> first_stream({"streams": []}, "audio") is None
+    True
+    """
+    return next((stream for stream in data.get("streams", []) if stream.get("codec_type") == codec_type), None)
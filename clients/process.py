@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import re
+import subprocess
+import time
+from collections import deque
+from os import PathLike
+from typing import Callable, Optional, Sequence, Union
+
+from settings import PROGRESS_LOG_INTERVAL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# ffmpeg and yt-dlp redraw their progress line with "\r"
+LINE_BREAK = re.compile(rb"[\r\n]")
+STDERR_TAIL = 20
+
+
+def progress_logger(prefix: str, log: logging.Logger = logger,
+                    interval: float = PROGRESS_LOG_INTERVAL) -> Callable[[str], None]:
+    """
+    ``on_progress`` logging the progress lines at INFO, at most one every ``interval`` seconds
+
+    >>> import sys
+    >>> log = logging.getLogger("progress-example")
+    >>> log.addHandler(logging.StreamHandler(sys.stdout)); log.setLevel(logging.INFO)
+    >>> on_progress = progress_logger("ffmpeg uncharted", log, interval=60)
+    >>> for line in ("frame 10%", "frame 50%", "frame 100%"):
+    ...     on_progress(line)
+    ffmpeg uncharted: frame 10%
+    """
+    last = None
+
+    def on_progress(line: str):
+        nonlocal last
+        now = time.monotonic()
+        if last is None or now - last >= interval:
+            last = now
+            log.info(f"{prefix}: {line}")
+    return on_progress
+
+
+async def stream_lines(stream: asyncio.StreamReader, on_line: Callable[[str], None]) -> None:
+    """Call ``on_line`` for every non-empty line of ``stream`` as soon as it's written"""
+    buffer = b""
+    while chunk := await stream.read(4096):
+        *lines, buffer = LINE_BREAK.split(buffer + chunk)
+        for line in lines:
+            if line.strip():
+                on_line(line.decode(errors="replace"))
+    if buffer.strip():
+        on_line(buffer.decode(errors="replace"))
+
+
+async def run_process(args: Sequence[Union[str, PathLike]], cwd: Optional[Union[str, PathLike]] = None,
+                      timeout: Optional[float] = None,
+                      on_progress: Optional[Callable[[str], None]] = None) -> bytes:
+    """
+    Run a program with an argument list (no shell) without blocking the event loop.
+
+    stderr is streamed line by line to ``on_progress`` (by default logged by ``progress_logger``)
+    and stdout is returned. The process is killed when ``timeout`` expires or the calling task is cancelled.
+
+    >>> import sys
+    >>> asyncio.run(run_process([sys.executable, "-c", "print('done')"]))
+    b'done\\n'
+
+    Raises:
+        subprocess.CalledProcessError: If the program exits with an error, with the last stderr lines
+        subprocess.TimeoutExpired: If it runs longer than ``timeout`` seconds
+    """
+    args = [str(arg) for arg in args]
+    if on_progress is None:
+        on_progress = progress_logger(args[0])
+
+    tail = deque(maxlen=STDERR_TAIL)
+
+    def on_stderr(line):
+        tail.append(line)
+        on_progress(line)
+
+    process = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout = asyncio.create_task(process.stdout.read())
+    stderr = asyncio.create_task(stream_lines(process.stderr, on_stderr))
+    try:
+        async with asyncio.timeout(timeout):
+            await asyncio.gather(stdout, stderr)
+            await process.wait()
+    except BaseException as e:
+        # Timeout or cancellation: don't leave the program running
+        stdout.cancel()
+        stderr.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if isinstance(e, TimeoutError):
+            raise subprocess.TimeoutExpired(args, timeout, stderr="\n".join(tail)) from e
+        raise
+
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args, stdout.result(), "\n".join(tail))
+    return stdout.result()
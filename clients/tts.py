@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import io
+import math
+import os
+import shutil
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Type
+
+from openai import AsyncOpenAI
+
+try:
+    # In requirements.txt, but only the offline backend needs it
+    import av
+except ImportError:
+    av = None
+
+from clients.manifest import atomic_output
+from settings import TTS_BACKEND, TTS_CACHE_DIR, TTS_CONCURRENCY, TTS_MODEL, TTS_VOICE
+
+
+def speech_key(text: str, model: str, voice: str, backend: str = "openai") -> str:
+    """
+    Cache key of a narration; the same text read by the same voice is synthesised once
+
+    >>> speech_key("Hello", "tts-1-hd", "sage") == speech_key("Hello", "tts-1-hd", "sage")
+    True
+    >>> speech_key("Hello", "tts-1-hd", "sage") == speech_key("Hello", "tts-1-hd", "coral")
+    False
+    >>> speech_key("Hello", "tts-1-hd", "sage") == speech_key("Hello", "tts-1-hd", "sage", backend="local")
+    False
+    """
+    return hashlib.sha256("\0".join((backend, model, voice, text)).encode()).hexdigest()
+
+
+class SpeechBackend(ABC):
+    """A text-to-speech engine: streams the audio of a text as it's produced"""
+
+    name: str
+
+    @abstractmethod
+    def stream(self, text: str, model: str, voice: str) -> AsyncIterator[bytes]:
+        """Chunks of the audio of ``text``"""
+
+
+class OpenAIBackend(SpeechBackend):
+    """OpenAI speech API (``tts-1``, ``tts-1-hd``...), mp3 streamed from the response"""
+
+    name = "openai"
+
+    def __init__(self, client: Optional[AsyncOpenAI] = None):
+        self._client = client
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI()
+        return self._client
+
+    async def stream(self, text: str, model: str, voice: str) -> AsyncIterator[bytes]:
+        async with self.client.audio.speech.with_streaming_response.create(
+                model=model, voice=voice, input=text, response_format="mp3") as response:
+            async for chunk in response.iter_bytes():
+                yield chunk
+
+
+class LocalBackend(SpeechBackend):
+    """
+    Offline stand-in producing deterministic audio as long as the narration would be: silence,
+    or a tone whose pitch depends on the voice. The audio is mono MP3 at the sample rate of the
+    OpenAI voices, encoded in-process with PyAV, so it matches the ``.mp3`` names the rest of
+    the pipeline uses.
+
+    >>> import io
+    >>> backend = LocalBackend(words_per_minute=150)
+    >>> audio = asyncio.run(backend.synthesize("one two three four five", "tts-1-hd", "sage"))
+    >>> with av.open(io.BytesIO(audio)) as container:
+    ...     container.format.name, container.streams.audio[0].sample_rate, container.duration / av.time_base
+    ('mp3', 24000, 2.0)
+    >>> audio == asyncio.run(backend.synthesize("one two three four five", "tts-1-hd", "sage"))
+    True
+    """
+
+    name = "local"
+    sample_rate = 24000
+    bit_rate = 64000
+    chunk_size = 64 * 1024
+
+    def __init__(self, words_per_minute: int = 160, tone: bool = True, delay: float = 0.0):
+        if av is None:
+            raise RuntimeError("The local TTS backend encodes MP3 with PyAV (av in requirements.txt)")
+        self.words_per_minute = words_per_minute
+        self.tone = tone
+        self.delay = delay  # simulated synthesis time, for load tests
+
+    def duration(self, text: str) -> float:
+        return max(len(text.split()), 1) * 60 / self.words_per_minute
+
+    def frequency(self, voice: str) -> int:
+        return 180 + int(hashlib.sha256(voice.encode()).hexdigest()[:4], 16) % 180
+
+    def second(self, voice: str) -> bytes:
+        """One second of 16-bit samples; a whole number of Hz makes it loop seamlessly"""
+        if not self.tone:
+            return bytes(2 * self.sample_rate)
+        step = 2 * math.pi * self.frequency(voice) / self.sample_rate
+        return struct.pack(f"<{self.sample_rate}h", *(int(6000 * math.sin(step * index))
+                                                      for index in range(self.sample_rate)))
+
+    def pcm(self, text: str, voice: str) -> bytes:
+        frames = round(self.duration(text) * self.sample_rate)
+        return (self.second(voice) * math.ceil(frames / self.sample_rate))[:2 * frames]
+
+    def encode(self, pcm: bytes) -> bytes:
+        output = io.BytesIO()
+        with av.open(output, "w", format="mp3") as container:
+            stream = container.add_stream("libmp3lame", rate=self.sample_rate, layout="mono")
+            stream.bit_rate = self.bit_rate
+            frame = av.AudioFrame(format="s16", layout="mono", samples=len(pcm) // 2)
+            frame.planes[0].update(pcm)
+            frame.sample_rate, frame.pts = self.sample_rate, 0
+            for packet in [*stream.encode(frame), *stream.encode(None)]:
+                container.mux(packet)
+        return output.getvalue()
+
+    async def synthesize(self, text: str, model: str, voice: str) -> bytes:
+        return b"".join([chunk async for chunk in self.stream(text, model, voice)])
+
+    async def stream(self, text: str, model: str, voice: str) -> AsyncIterator[bytes]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        audio = await asyncio.to_thread(self.encode, self.pcm(text, voice))
+        for start in range(0, len(audio), self.chunk_size):
+            yield audio[start:start + self.chunk_size]
+            await asyncio.sleep(0)
+
+
+BACKENDS: Dict[str, Type[SpeechBackend]] = {
+    OpenAIBackend.name: OpenAIBackend,
+    LocalBackend.name: LocalBackend,
+}
+
+
+def get_backend(name: str = TTS_BACKEND) -> SpeechBackend:
+    """
+    >>> get_backend("local").name
+    'local'
+    """
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown TTS backend {name!r}, expected one of {sorted(BACKENDS)}")
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """Put ``source`` at ``target`` atomically, hard-linked when both are on the same file system"""
+    with atomic_output(target) as part:
+        try:
+            os.link(source, part)
+        except OSError:
+            shutil.copyfile(source, part)
+
+
+class SpeechSynthesizer:
+    """
+    Text-to-speech through one shared backend (``TTS_BACKEND`` by default).
+
+    At most ``limit`` requests run at the same time, the audio is streamed to disk as it
+    arrives and every narration is kept in a cache shared by all movies, keyed by
+    (text, model, voice) and the backend. Identical requests made concurrently wait for a
+    single synthesis.
+    """
+
+    def __init__(self, cache_dir: Path = TTS_CACHE_DIR, limit: int = TTS_CONCURRENCY,
+                 backend: Optional[SpeechBackend] = None):
+        self.cache_dir = Path(cache_dir)
+        self.limit = limit
+        self.backend = backend or get_backend()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def cache_path(self, text: str, model: str, voice: str) -> Path:
+        key = speech_key(text, model, voice, self.backend.name)
+        return self.cache_dir / key[:2] / f"{key}.mp3"
+
+    async def synthesize(self, text: str, output: Path, model: str = TTS_MODEL, voice: str = TTS_VOICE) -> bool:
+        """
+        Write the narration of ``text`` to ``output``
+
+        Returns:
+            bool: Whether it had to be synthesised (False when it came from the cache)
+        """
+        cached = self.cache_path(text, model, voice)
+        synthesised = False
+        if not cached.is_file():
+            key = cached.name
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = asyncio.ensure_future(self._synthesize(text, cached, model, voice))
+                pending.add_done_callback(lambda _: self._pending.pop(key, None))
+                synthesised = True
+            await asyncio.shield(pending)
+
+        link_or_copy(cached, Path(output))
+        return synthesised
+
+    async def _synthesize(self, text: str, cached: Path, model: str, voice: str) -> None:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        async with self.semaphore:
+            with atomic_output(cached) as part, open(part, "wb") as file:
+                async for chunk in self.backend.stream(text, model, voice):
+                    file.write(chunk)
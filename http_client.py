@@ -37,6 +37,7 @@ class HttpClient(DataClassJSONSerializer):
     token: Optional[str] = ""
     sleep: bool = False
     json: bool = True
+    scheme: str = "https"
 
     @property
     def server_name(self) -> str:
@@ -44,8 +45,10 @@ class HttpClient(DataClassJSONSerializer):
         >>> http_client = HttpClient.from_dict({"urls": ['example.com/1'], "token": "1234567890", "server": "example.com/3"})
         >>> http_client.server_name
         'https://example.com/3'
+        >>> HttpClient.from_dict({"urls": [], "server": "127.0.0.1:8080", "scheme": "http"}).server_name
+        'http://127.0.0.1:8080'
         """
-        return f"https://{self.server}"
+        return f"{self.scheme}://{self.server}"
 
     @cached_property
     def _headers(self, *args, **kwargs) -> dict:
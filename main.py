@@ -24,7 +24,7 @@ async def upload_set(_set):
         s3_key = f"sets/{_set}/{file_path.name}"
         file_mappings.append((file_path, s3_key))
 
-    client = AWSS3Client(file_mappings, BUCKET_VIDEO)
+    client = AWSS3Client(file_mappings, BUCKET_VIDEO, sync=True)
     await client.upload_files()
 
 
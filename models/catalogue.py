@@ -0,0 +1,192 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from models.video import Movie
+from settings import CATALOGUE_PATH
+
+STRING_DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+
+SCHEMA = pa.schema([
+    pa.field("id", pa.string(), nullable=False),
+    pa.field("title", pa.string()),
+    pa.field("genres", pa.list_(STRING_DICTIONARY)),
+    pa.field("popularity", pa.int64()),
+    pa.field("rating", pa.float64()),
+    pa.field("runtime", pa.int64()),
+    pa.field("votes", pa.int64()),
+    pa.field("year", pa.int32()),
+    pa.field("end_year", pa.int32()),
+    pa.field("production_status", STRING_DICTIONARY),
+    pa.field("audience", STRING_DICTIONARY),
+    pa.field("imdb_type", STRING_DICTIONARY),
+    pa.field("overview", pa.string()),
+    pa.field("directors", pa.list_(STRING_DICTIONARY)),
+    pa.field("actors", pa.list_(STRING_DICTIONARY)),
+])
+
+
+def parse_year(value) -> Optional[int]:
+    """
+    >>> parse_year("2018")
+    2018
+    >>> parse_year("") is None
+    True
+    >>> parse_year("None") is None
+    True
+    """
+    value = str(value or "")
+    return int(value) if value.isdigit() else None
+
+
+def movies_to_table(movies: Iterable[Movie]) -> pa.Table:
+    """
+    Convert Movie objects to an Arrow table with dictionary-encoded genres, actors and directors
+
+    >>> from decimal import Decimal
+    >>> from models.video import Title
+    >>> table = movies_to_table([
+    ...     Movie(id="tt1", title=Title(en="One"), genres=["Drama", "Thriller"], popularity=3,
+    ...           rating=Decimal("7.1"), runtime=Decimal("5400"), votes=1200, year="2018"),
+    ...     Movie(id="tt2", title=Title(en="Two"), genres=["Drama"], popularity=1,
+    ...           rating=Decimal("6.4"), runtime=Decimal("6000"), votes=800, year=""),
+    ... ])
+    >>> table.num_rows
+    2
+    >>> table.column("year").to_pylist()
+    [2018, None]
+    >>> table.column("genres").to_pylist()
+    [['Drama', 'Thriller'], ['Drama']]
+    >>> table.schema.field("genres").type
+    ListType(list<item: dictionary<values=string, indices=int32, ordered=0>>)
+    """
+    columns: Dict[str, list] = {name: [] for name in SCHEMA.names}
+
+    for movie in movies:
+        columns["id"].append(movie.id)
+        columns["title"].append(movie.title.en if movie.title else "")
+        columns["genres"].append(list(movie.genres or []))
+        columns["popularity"].append(int(movie.popularity or 0))
+        columns["rating"].append(float(movie.rating or 0))
+        columns["runtime"].append(int(movie.runtime or 0))
+        columns["votes"].append(int(movie.votes or 0))
+        columns["year"].append(parse_year(movie.year))
+        columns["end_year"].append(parse_year(movie.end_year))
+        columns["production_status"].append(movie.production_status or "")
+        columns["audience"].append(movie.audience or "")
+        columns["imdb_type"].append(movie.imdb_type or "")
+        columns["overview"].append(movie.overview or "")
+        columns["directors"].append(list(movie.directors or []))
+        columns["actors"].append(list(movie.actors or []))
+
+    return pa.Table.from_pydict(columns, schema=SCHEMA)
+
+
+class Catalogue:
+    """
+    Local columnar snapshot of the Movie table stored as a Parquet file.
+
+    The snapshot is written once with ``export`` and then kept up to date by the crawler
+    through ``upsert``/``flush``, so analysis never has to scan DynamoDB.
+
+    >>> import tempfile
+    >>> from decimal import Decimal
+    >>> from models.video import Title
+    >>> def movie(id_, votes):
+    ...     return Movie(id=id_, title=Title(en=id_), genres=["Action"], popularity=1,
+    ...                  rating=Decimal("7.0"), runtime=Decimal("100"), votes=votes)
+    >>> catalogue = Catalogue(Path(tempfile.mkdtemp()) / "catalogue.parquet")
+    >>> catalogue.read().num_rows
+    0
+    >>> catalogue.upsert([movie("tt1", 10), movie("tt2", 20)])
+    >>> catalogue.flush()
+    2
+    >>> catalogue.upsert([movie("tt2", 30), movie("tt3", 40)])
+    >>> catalogue.flush()
+    3
+    >>> sorted(zip(*catalogue.read(columns=["id", "votes"]).to_pydict().values()))
+    [('tt1', 10), ('tt2', 30), ('tt3', 40)]
+    """
+
+    def __init__(self, path: Path = CATALOGUE_PATH, flush_every: int = 5000):
+        """
+        Parameters:
+        -----------
+        path : Path
+            Location of the Parquet snapshot
+        flush_every : int
+            Number of pending movies after which ``upsert`` flushes to disk automatically
+        """
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.pending: Dict[str, Movie] = {}
+
+    def read(self, columns: Optional[List[str]] = None) -> pa.Table:
+        """
+        Read the snapshot (or an empty table if it was never written)
+
+        Parameters:
+        -----------
+        columns : List[str], optional
+            Only load these columns
+
+        Returns:
+        --------
+        pa.Table
+            The catalogue
+        """
+        if not self.path.is_file():
+            schema = SCHEMA if columns is None else pa.schema([SCHEMA.field(name) for name in columns])
+            return schema.empty_table()
+        return pq.read_table(self.path, columns=columns)
+
+    def write(self, table: pa.Table) -> None:
+        """Atomically replace the snapshot with ``table``"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        pq.write_table(table.unify_dictionaries().combine_chunks(), tmp_path, compression="zstd")
+        os.replace(tmp_path, self.path)
+
+    def upsert(self, movies: Iterable[Movie]) -> None:
+        """Queue new or changed movies; they are merged into the snapshot on ``flush``"""
+        for movie in movies:
+            self.pending[movie.id] = movie
+
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Merge pending movies into the snapshot, replacing rows with the same id
+
+        Returns:
+        --------
+        int
+            Number of rows in the snapshot after the merge
+        """
+        table = self.read()
+        if self.pending:
+            updates = movies_to_table(self.pending.values())
+            keep = pc.invert(pc.is_in(table.column("id"), value_set=updates.column("id")))
+            table = pa.concat_tables([table.filter(keep), updates])
+            self.write(table)
+            self.pending.clear()
+        return table.num_rows
+
+    @classmethod
+    async def export(cls, path: Path = CATALOGUE_PATH) -> "Catalogue":
+        """Build a fresh snapshot from a full scan of the Movie table"""
+        catalogue = cls(path)
+        movies = await Movie.scan_all()
+        catalogue.write(movies_to_table(movies))
+        print(f"Exported {len(movies)} movies to {catalogue.path}")
+        return catalogue
+
+
+if __name__ == "__main__":
+    asyncio.run(Catalogue.export())
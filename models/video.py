@@ -1,15 +1,17 @@
 import asyncio
 import re
-from dataclasses import dataclass, field
+import sys
+from array import array
+from dataclasses import dataclass, field, fields, is_dataclass
 from decimal import Decimal
-from typing import List, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set, Union, get_args, get_origin
 
 import aioboto3
 
 from serializer import DataClassJSONSerializer
 
 
-@dataclass
+@dataclass(slots=True)
 class Video(DataClassJSONSerializer):
     """A class representing a video
 
@@ -23,20 +25,33 @@ class Video(DataClassJSONSerializer):
     url: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Description(DataClassJSONSerializer):
     ru: str = ""
     en: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class Title(DataClassJSONSerializer):
     en: str
     ru: str = ""
 
 
+def intern_strings(values: Optional[List[str]]) -> List[str]:
+    """
+    Intern repeated strings (genres, names) so thousands of records share one copy
+
+    >>> a, b = intern_strings(["".join(["Dra", "ma"])]), intern_strings(["".join(["Dr", "ama"])])
+    >>> a[0] is b[0]
+    True
+    """
+    return [sys.intern(value) for value in values] if values else []
+
+
 # Add this new method to the MixinDynamoTable class
 class MixinDynamoTable:
+    __slots__ = ()
+
     @classmethod
     def table(cls):
         return cls.__name__.lower()
@@ -150,18 +165,23 @@ class MixinDynamoTable:
                     await batch.put_item(Item=item.to_dict())
 
     @classmethod
-    async def scan_all(cls):
+    async def scan_all(cls, batch: bool = False):
         """
         Scan all items from the DynamoDB table
 
+        Parameters:
+        -----------
+        batch : bool, optional
+            Collect the records into a compact column-oriented DataClassBatch instead of a list
+
         Returns:
         --------
-        List
-            List of all items as model objects
+        List or DataClassBatch
+            All items as model objects
         """
         table_name = cls.table()
         session = aioboto3.Session()
-        results = []
+        results = DataClassBatch(cls) if batch else []
 
         async with session.resource('dynamodb') as dynamo_resource:
             table = await dynamo_resource.Table(table_name)
@@ -178,9 +198,7 @@ class MixinDynamoTable:
                 items = response.get('Items', [])
 
                 # Convert items to objects
-                for item in items:
-                    obj = cls.from_dict(item)
-                    results.append(obj)
+                results.extend(cls.from_dicts(items))
 
                 last_evaluated_key = response.get('LastEvaluatedKey')
                 if not last_evaluated_key:
@@ -231,7 +249,7 @@ class MixinDynamoTable:
             return ids
 
 
-@dataclass
+@dataclass(slots=True)
 class Movie(MixinDynamoTable, DataClassJSONSerializer):
     id: str
     title: Title
@@ -251,8 +269,17 @@ class Movie(MixinDynamoTable, DataClassJSONSerializer):
     description: Optional[Description] = None
     end_year: Optional[str] = ""
 
+    def __post_init__(self):
+        # Genres and people repeat across thousands of titles: keep a single copy of each string
+        self.genres = intern_strings(self.genres)
+        self.directors = intern_strings(self.directors)
+        self.actors = intern_strings(self.actors)
+        self.production_status = sys.intern(self.production_status) if self.production_status else ""
+        self.audience = sys.intern(self.audience) if self.audience else ""
+        self.imdb_type = sys.intern(self.imdb_type) if self.imdb_type else ""
 
-@dataclass
+
+@dataclass(slots=True)
 class Item(MixinDynamoTable, DataClassJSONSerializer):
     """A class representing an item
 
@@ -333,6 +360,245 @@ class Item(MixinDynamoTable, DataClassJSONSerializer):
             })
 
 
+class ObjectColumn(list):
+    """Values kept as they are, one Python object per record"""
+
+    def accepts(self, value) -> bool:
+        return True
+
+
+class StringColumn:
+    """
+    Strings of a column packed end to end as UTF-8 in one buffer, None kept apart from ""
+
+    >>> column = StringColumn()
+    >>> for value in ("Drama", None, "", "Комедия"):
+    ...     column.append(value)
+    >>> list(column), len(column.data)
+    (['Drama', None, '', 'Комедия'], 19)
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array('q')
+        self.nulls = bytearray()
+
+    def accepts(self, value) -> bool:
+        return value is None or isinstance(value, str)
+
+    def append(self, value: Optional[str]) -> None:
+        if value is not None:
+            self.data += value.encode()
+        self.ends.append(len(self.data))
+        self.nulls.append(value is None)
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        if self.nulls[index]:
+            return None
+        return self.data[self.ends[index - 1] if index else 0:self.ends[index]].decode()
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return (self[index] for index in range(len(self)))
+
+
+class DecimalColumn(StringColumn):
+    """
+    Decimals kept as their exact text in a ``StringColumn``
+
+    >>> column = DecimalColumn()
+    >>> column.append(Decimal("7.5")); column.append(None)
+    >>> list(column)
+    [Decimal('7.5'), None]
+    """
+
+    def accepts(self, value) -> bool:
+        return value is None or isinstance(value, Decimal)
+
+    def append(self, value: Optional[Decimal]) -> None:
+        super().append(None if value is None else str(value))
+
+    def __getitem__(self, index: int) -> Optional[Decimal]:
+        value = super().__getitem__(index)
+        return None if value is None else Decimal(value)
+
+
+class StringListColumn:
+    """
+    Lists of strings flattened into one ``StringColumn`` with the end of every record's list
+
+    >>> column = StringListColumn()
+    >>> for value in (["Drama", "Crime"], [], ["Drama"]):
+    ...     column.append(value)
+    >>> list(column)
+    [['Drama', 'Crime'], [], ['Drama']]
+    """
+
+    def __init__(self):
+        self.values = StringColumn()
+        self.ends = array('q')
+
+    def accepts(self, value) -> bool:
+        return value is None or (isinstance(value, list) and all(isinstance(item, str) for item in value))
+
+    def append(self, value: Optional[List[str]]) -> None:
+        for item in value or []:
+            self.values.append(item)
+        self.ends.append(len(self.values))
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, index: int) -> List[str]:
+        start = self.ends[index - 1] if index else 0
+        return [self.values[position] for position in range(start, self.ends[index])]
+
+    def __iter__(self) -> Iterator[List[str]]:
+        return (self[index] for index in range(len(self)))
+
+
+class NestedColumn:
+    """
+    Nested dataclass values (Title, Video...) kept as a ``DataClassBatch`` of their own fields;
+    ``rows`` maps every record to its row there, or -1 for None
+
+    >>> column = NestedColumn(Title)
+    >>> for value in (Title(en="One"), None, Title(en="Two", ru="Два")):
+    ...     column.append(value)
+    >>> list(column)
+    [Title(en='One', ru=''), None, Title(en='Two', ru='Два')]
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.batch = DataClassBatch(model)
+        self.rows = array('q')
+
+    def accepts(self, value) -> bool:
+        return value is None or type(value) is self.model
+
+    def append(self, value) -> None:
+        if value is None:
+            self.rows.append(-1)
+        else:
+            self.rows.append(len(self.batch))
+            self.batch.append(value)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index: int):
+        row = self.rows[index]
+        return None if row < 0 else self.batch[row]
+
+    def __iter__(self) -> Iterator:
+        return (self[index] for index in range(len(self)))
+
+
+def make_column(field_type):
+    """
+    Packed column for values of ``field_type``
+
+    >>> [type(make_column(field_type)).__name__ for field_type in (int, Optional[str], List[str], Optional[Video], Set[str])]
+    ['array', 'StringColumn', 'StringListColumn', 'NestedColumn', 'ObjectColumn']
+    """
+    if field_type in (int, "int"):
+        return array('q')
+    if get_origin(field_type) is Union:
+        arguments = [argument for argument in get_args(field_type) if argument is not type(None)]
+        if len(arguments) == 1:
+            field_type = arguments[0]
+    if field_type is str:
+        return StringColumn()
+    if field_type is Decimal:
+        return DecimalColumn()
+    if get_origin(field_type) is list and get_args(field_type) == (str,):
+        return StringListColumn()
+    if isinstance(field_type, type) and is_dataclass(field_type):
+        return NestedColumn(field_type)
+    return ObjectColumn()
+
+
+class DataClassBatch:
+    """
+    Struct-of-arrays container for many records of one dataclass model.
+
+    Values are kept per field instead of one object per record: integers in packed arrays,
+    strings, decimals and lists of strings as UTF-8 in shared buffers and nested dataclasses
+    as batches of their own fields; other values stay Python objects. Records are
+    materialised on access, so the same ``from_dict``/``to_dict`` API applies. A value of
+    an unexpected type turns its column back into a plain list.
+
+    For records shaped like crawled movies it keeps about half the memory of a list of models,
+    most of what remains being the text itself (``python -m benchmarks.batch_memory``).
+
+    >>> batch = DataClassBatch.from_dicts(Movie, [
+    ...     {"id": "tt1", "title": {"en": "One"}, "genres": ["Drama"], "popularity": 2, "rating": "7.5",
+    ...      "runtime": "5400", "votes": 10},
+    ...     {"id": "tt2", "title": {"en": "Two"}, "genres": ["Drama", "Crime"], "popularity": 1, "rating": "6.1",
+    ...      "runtime": "6000", "votes": 20},
+    ... ])
+    >>> len(batch), batch.column("id")
+    (2, ['tt1', 'tt2'])
+    >>> batch.column("votes")
+    array('q', [10, 20])
+    >>> batch[1].title, batch[1].genres
+    (Title(en='Two', ru=''), ['Drama', 'Crime'])
+    >>> batch[0].to_dict() == Movie.from_dict(batch.to_dicts()[0]).to_dict()
+    True
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.names = [model_field.name for model_field in fields(model)]
+        self.int_names = {model_field.name for model_field in fields(model) if model_field.type in (int, "int")}
+        self.columns: Dict[str, object] = {model_field.name: make_column(model_field.type)
+                                           for model_field in fields(model)}
+        self.length = 0
+
+    @classmethod
+    def from_dicts(cls, model, data: List[dict]) -> "DataClassBatch":
+        batch = cls(model)
+        batch.extend(model.from_dicts(data))
+        return batch
+
+    def append(self, obj) -> None:
+        for name in self.names:
+            value = getattr(obj, name)
+            if name in self.int_names:
+                self.columns[name].append(int(value or 0))
+                continue
+            column = self.columns[name]
+            if not column.accepts(value):
+                column = self.columns[name] = ObjectColumn(column)
+            column.append(value)
+        self.length += 1
+
+    def extend(self, objects) -> None:
+        for obj in objects:
+            self.append(obj)
+
+    def column(self, name: str):
+        """The values of a field: the packed array of an integer field, else a list"""
+        column = self.columns[name]
+        return column if name in self.int_names or isinstance(column, ObjectColumn) else list(column)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int):
+        return self.model(**{name: self.columns[name][index] for name in self.names})
+
+    def __iter__(self) -> Iterator:
+        for index in range(self.length):
+            yield self[index]
+
+    def to_dicts(self) -> List[dict]:
+        return [obj.to_dict() for obj in self]
+
+
 # Run the example
 if __name__ == "__main__":
     from settings import HOST_API_URL
@@ -1,5 +1,4 @@
-from dataclasses import fields
-from typing import TypeVar, Type
+from typing import Callable, Iterable, List, Tuple, TypeVar, Type
 
 from mashumaro.mixins.json import DataClassJSONMixin
 
@@ -11,19 +10,66 @@ class ValidationError(Exception):
 
 
 class DataClassJSONSerializer(DataClassJSONMixin):
+    """
+    Base serializer. A ``_post_deserialize_<field>`` callable on the model validates that field
+    after deserialisation; the validators are resolved once per class, not per object.
 
-    @classmethod
-    def __post_deserialize__(cls: Type[T], obj: T) -> T:
-        errors = {}
+    >>> from dataclasses import dataclass
+    >>> @dataclass
+    ... class Sample(DataClassJSONSerializer):
+    ...     id: str
+    ...
+    ...     @classmethod
+    ...     def _post_deserialize_id(cls, obj):
+    ...         assert obj.id.startswith("tt"), "Not starting with tt"
+    >>> [name for name, _ in Sample._validators]
+    ['id']
+    >>> Sample.from_dicts([{"id": "tt1"}, {"id": "tt2"}])
+    [Sample(id='tt1'), Sample(id='tt2')]
+    >>> Sample.from_dict({"id": "nm1"})
+    Traceback (most recent call last):
+    serializer.ValidationError: {'id': 'Not starting with tt'}
+    """
+    __slots__ = ()
+    # ((field name, validator), ...) resolved in __init_subclass__
+    _validators = ()
 
-        for field in fields(obj):
-            func = getattr(obj, f"_post_deserialize_{field.name}", None)
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._validators = cls._resolve_validators()
 
+    @classmethod
+    def _resolve_validators(cls) -> Tuple[Tuple[str, Callable], ...]:
+        # The @dataclass decorator has not run yet, so collect field names from the annotations
+        names = {}
+        for klass in reversed(cls.__mro__):
+            names.update(klass.__dict__.get("__annotations__", {}))
+
+        validators = []
+        for name in names:
+            func = getattr(cls, f"_post_deserialize_{name}", None)
             if callable(func):
-                try:
-                    func(obj)
-                except AssertionError as e:
-                    errors[field.name] = str(e)
+                validators.append((name, func))
+        return tuple(validators)
+
+    @classmethod
+    def from_dicts(cls: Type[T], data: Iterable[dict]) -> List[T]:
+        """Deserialise many records in one call"""
+        from_dict = cls.from_dict
+        return [from_dict(item) for item in data]
+
+    @classmethod
+    def __post_deserialize__(cls: Type[T], obj: T) -> T:
+        validators = cls._validators
+        if not validators:
+            return obj
+
+        errors = {}
+        for name, func in validators:
+            try:
+                func(obj)
+            except AssertionError as e:
+                errors[name] = str(e)
         if errors:
             raise ValidationError(errors)
         return obj
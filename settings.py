@@ -11,5 +11,38 @@ BUCKET_VIDEO = os.environ['BUCKET_VIDEO']
 BASE_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 BASE_DIR_MOVIES = Path(BASE_DIR / "movies")
 BASE_DIR_SETS = Path(BASE_DIR_MOVIES / "sets")
+CATALOGUE_PATH = Path(BASE_DIR_MOVIES / "catalogue.parquet")
+PROBE_CACHE_PATH = Path(BASE_DIR_MOVIES / "probe_cache.sqlite3")
+TTS_CACHE_DIR = Path(BASE_DIR_MOVIES / "tts_cache")
+AAC_CACHE_DIR = Path(BASE_DIR_MOVIES / "aac_cache")
+NARRATION_BITRATE = "128k"
+TTS_MODEL = "tts-1-hd"
+TTS_VOICE = "sage"  # sage, coral
+# "openai", or "local" for offline runs and load tests (clients/tts.py)
+TTS_BACKEND = os.environ.get("TTS_BACKEND", "openai")
+# Where the media lives on the Windows machine opening the Movavi projects
+MOVAVI_MEDIA_DIR = r"C:\users\Public\Videos"
 YOUTUBE_API_KEY = os.environ['YOUTUBE_API_KEY']
 WORKERS = 32
+PROBE_CONCURRENCY = 8
+# Stages of the trailer pipeline running at the same time (api/video_editor.py)
+DOWNLOAD_CONCURRENCY = 4
+TTS_CONCURRENCY = 8
+ENCODE_CONCURRENCY = 4
+UPLOAD_CONCURRENCY = 4
+# Resolution of the trailers, searched for and downloaded (api/get_videos.py, clients/download.py)
+VIDEO_HEIGHT = 1080
+# Fragments of a DASH/HLS stream fetched in parallel by each download
+DOWNLOAD_FRAGMENTS = 4
+# Total download bandwidth in bytes/s shared by all the downloads, unlimited when unset
+DOWNLOAD_RATE_LIMIT = int(os.environ["DOWNLOAD_RATE_LIMIT"]) if os.environ.get("DOWNLOAD_RATE_LIMIT") else None
+# Files uploaded to S3 at the same time by a whole run, each in parts of S3_MULTIPART_CHUNKSIZE
+# bytes sent S3_PART_CONCURRENCY at a time (clients/aws.py)
+S3_MAX_IN_FLIGHT = 8
+S3_MULTIPART_CHUNKSIZE = 64 * 1024 * 1024
+S3_PART_CONCURRENCY = 8
+# Seconds before a hung yt-dlp download or ffmpeg mux is killed
+DOWNLOAD_TIMEOUT = 3600
+ENCODE_TIMEOUT = 900
+# Seconds between two logged progress lines of a yt-dlp download, ffmpeg run or S3 upload
+PROGRESS_LOG_INTERVAL = 5.0
@@ -0,0 +1,79 @@
+import asyncio
+import contextlib
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+
+class SkippedError(RuntimeError):
+    """The task didn't run because one of its dependencies failed"""
+
+
+@dataclass(frozen=True)
+class Task:
+    key: Hashable
+    stage: str
+    func: Callable[[], Awaitable]
+    deps: Tuple[Hashable, ...] = ()
+
+
+class TaskGraph:
+    """
+    Runs a graph of async tasks in one event loop. Every task belongs to a stage ("download",
+    "tts", ...) and at most ``limits[stage]`` tasks of a stage run at the same time, so stages
+    of different jobs overlap while each resource stays bounded. A task starts once all its
+    dependencies succeeded; the dependents of a failed task are skipped.
+
+    >>> order = []
+    >>> async def step(name):
+    ...     order.append(name)
+    ...     return name.upper()
+    >>> graph = TaskGraph({"fetch": 2, "store": 1})
+    >>> fetched = graph.add("fetch", "fetch", lambda: step("fetch"))
+    >>> _ = graph.add("store", "store", lambda: step("store"), deps=[fetched])
+    >>> asyncio.run(graph.run())
+    {'fetch': 'FETCH', 'store': 'STORE'}
+    >>> order
+    ['fetch', 'store']
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = limits
+        self.tasks: Dict[Hashable, Task] = {}
+
+    def add(self, key: Hashable, stage: str, func: Callable[[], Awaitable],
+            deps: Iterable[Hashable] = ()) -> Hashable:
+        """
+        Add a task; ``func`` is called without arguments when the task starts.
+        Dependencies must be added first, which also rules out cycles.
+        """
+        if key in self.tasks:
+            raise ValueError(f"Task {key!r} is already in the graph")
+        deps = tuple(deps)
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"Dependency {dep!r} of {key!r} is not in the graph")
+
+        self.tasks[key] = Task(key, stage, func, deps)
+        return key
+
+    async def run(self) -> Dict[Hashable, Any]:
+        """Run every task, returning its result or the exception it raised (``SkippedError`` if it didn't run)"""
+        semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in self.limits.items()}
+        futures: Dict[Hashable, asyncio.Task] = {}
+
+        async def run_task(task: Task):
+            for dep in task.deps:
+                try:
+                    await futures[dep]
+                except Exception as e:
+                    raise SkippedError(f"{task.key!r} skipped, {dep!r} failed: {e}") from e
+
+            async with semaphores.get(task.stage) or contextlib.nullcontext():
+                return await task.func()
+
+        # Tasks were added after their dependencies, so those futures already exist
+        for key, task in self.tasks.items():
+            futures[key] = asyncio.create_task(run_task(task))
+
+        results = await asyncio.gather(*futures.values(), return_exceptions=True)
+        return dict(zip(futures, results))
@@ -0,0 +1,161 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from clients.aws import ETAG_CACHE_NAME, MiB, AWSS3Client, UploadManager, s3_etag
+from tests.base import BaseTest
+
+
+class FakeS3Session:
+    """
+    Stands in for ``aioboto3.Session``: uploads take a while and report their parts, and the
+    objects are listed with the ETag S3 would give them
+    """
+
+    def __init__(self, part_size: int = 4, delay: float = 0.01):
+        self.part_size = part_size
+        self.delay = delay
+        self.clients = []
+        self.uploads = {}
+        self.objects = {}
+        self.listed = []
+        self.running = self.peak = 0
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    @contextlib.asynccontextmanager
+    async def client(self, service, config=None):
+        self.clients.append(config)
+        yield self
+
+    async def upload_file(self, filename, bucket, key, Callback=None, Config=None):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            data = Path(filename).read_bytes()
+            for start in range(0, len(data), self.part_size):
+                await asyncio.sleep(self.delay)
+                if Callback:
+                    Callback(len(data[start:start + self.part_size]))
+            self.uploads[key] = (data, Config)
+            part_size = Config.multipart_chunksize if len(data) >= Config.multipart_threshold else None
+            self.objects[key] = {"Key": key, "Size": len(data), "ETag": f'"{s3_etag(Path(filename), part_size)}"'}
+        finally:
+            self.running -= 1
+
+    def get_paginator(self, operation):
+        return self
+
+    async def paginate(self, Bucket, Prefix):
+        self.listed.append(Prefix)
+        objects = [item for key, item in sorted(self.objects.items()) if key.startswith(Prefix)]
+        for start in range(0, len(objects), 2):
+            yield {"Contents": objects[start:start + 2]}
+        if not objects:
+            yield {}
+
+
+class TestAWSS3Client(BaseTest):
+    def setUp(self) -> None:
+        self.directory = Path(tempfile.mkdtemp())
+        self.session = FakeS3Session()
+        target = patch('aioboto3.Session', self.session)
+        target.start()
+        self.addCleanup(target.stop)
+
+    def batch(self, name: str, count: int):
+        paths = []
+        for index in range(count):
+            path = self.directory / f"{name}-{index}.mp4"
+            path.write_bytes(f"{name} trailer {index}".encode())
+            paths.append((path, f"movies/{name}/{path.name}"))
+        return paths
+
+    async def test_batches_share_the_in_flight_limit(self):
+        uploads = UploadManager(limit=3, chunk_size=8 * 1024 * 1024, part_concurrency=2)
+        clients = [AWSS3Client(self.batch(name, 4), "bucket", uploads=uploads) for name in ("a", "b", "c")]
+
+        results = await asyncio.gather(*[client.upload_files() for client in clients])
+
+        self.assertEqual([result["success_count"] for result in results], [4, 4, 4])
+        self.assertEqual(self.session.peak, 3)
+        # One client per batch, with a pool large enough for every part in flight
+        self.assertEqual([config.max_pool_connections for config in self.session.clients], [6, 6, 6])
+        data, config = self.session.uploads["movies/b/b-2.mp4"]
+        self.assertEqual(data, b"b trailer 2")
+        self.assertEqual(config.multipart_chunksize, 8 * 1024 * 1024)
+
+    async def test_progress_and_failures(self):
+        lines = []
+        mappings = self.batch("a", 1) + [(self.directory / "missing.mp4", "movies/a/missing.mp4")]
+
+        results = await AWSS3Client(mappings, "bucket", on_progress=lines.append).upload_files()
+
+        self.assertEqual(results["success_count"], 1)
+        self.assertIsInstance(results["failures"][0][2], FileNotFoundError)
+        self.assertEqual(lines[0], "a-0.mp4: 4 of 11 bytes (36%)")
+        self.assertEqual(lines[-1], "a-0.mp4: 11 of 11 bytes (100%)")
+
+
+class TestSync(TestAWSS3Client):
+    async def sync(self, mappings, uploads=None):
+        self.session.uploads.clear()
+        uploads = uploads or UploadManager(chunk_size=8, part_concurrency=2)
+        return await AWSS3Client(mappings, "bucket", uploads=uploads, sync=True).upload_files()
+
+    async def test_only_new_or_changed_files_are_uploaded(self):
+        mappings = self.batch("a", 3)
+        # Multipart on S3, in parts of 8 bytes
+        mappings[2][0].write_bytes(b"a much longer trailer")
+
+        self.assertEqual((await self.sync(mappings))["success_count"], 3)
+        self.assertEqual(self.session.objects["movies/a/a-2.mp4"]["ETag"][-3:], '-3"')
+
+        results = await self.sync(mappings)
+        self.assertEqual((results["success_count"], results["skipped_count"]), (0, 3))
+        self.assertEqual(self.session.uploads, {})
+
+        mappings[1][0].write_bytes(b"a trailer X")  # same size, new content
+        mappings[2][0].write_bytes(b"a much longer trailer!")
+        mappings += self.batch("b", 1)
+        results = await self.sync(mappings)
+        self.assertListEqual(sorted(self.session.uploads), ["movies/a/a-1.mp4", "movies/a/a-2.mp4", "movies/b/b-0.mp4"])
+        self.assertEqual(results["skipped"], [mappings[0]])
+
+    async def test_listing_is_cached_until_uploaded_to(self):
+        uploads = UploadManager(chunk_size=8)
+        await self.sync(self.batch("a", 2), uploads)
+        await self.sync(self.batch("a", 2), uploads)
+        await self.sync(self.batch("a", 2), uploads)
+
+        # Listed, uploaded to (and forgotten), listed again and found unchanged both times
+        self.assertListEqual(self.session.listed, ["movies/a/", "movies/a/"])
+
+    async def test_etags_are_hashed_once_per_file_version(self):
+        mappings = self.batch("a", 2)
+        await self.sync(mappings)
+
+        with patch('clients.aws.s3_etag', wraps=s3_etag) as hashed:
+            await self.sync(mappings)
+            await self.sync(mappings)
+            self.assertEqual(hashed.call_count, 2)
+
+            os.utime(mappings[0][0], ns=(0, 0))
+            await self.sync(mappings)
+            self.assertEqual(hashed.call_count, 3)
+        self.assertTrue((self.directory / ETAG_CACHE_NAME).is_file())
+
+    async def test_objects_uploaded_with_another_part_size_are_recognised(self):
+        self.session.part_size = 8 * MiB
+        mappings = self.batch("a", 1)
+        mappings[0][0].write_bytes(bytes(17 * MiB))
+        # boto3's default part size
+        await self.sync(mappings, UploadManager(chunk_size=8 * MiB))
+
+        results = await self.sync(mappings, UploadManager(chunk_size=64 * MiB))
+
+        self.assertEqual(results["skipped_count"], 1)
@@ -0,0 +1,50 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from clients.download import DownloadManager
+from tests.base import BaseTest
+
+
+class TestDownloadManager(BaseTest):
+    def setUp(self) -> None:
+        self.directory = Path(tempfile.mkdtemp())
+        self.calls = []
+
+    async def fake_run_process(self, args, cwd=None, timeout=None, on_progress=None):
+        self.calls.append((args, cwd, timeout))
+        for percent in (25, 100):
+            on_progress(f"[download] {percent}.0% of 10.00MiB")
+            await asyncio.sleep(0.01)
+        Path(args[args.index("-o") + 1]).write_bytes(b"video")
+        return b""
+
+    async def test_rate_is_split_between_the_downloads(self):
+        manager = DownloadManager(limit=2, fragments=8, height=1080, rate_limit=8_000_000, timeout=60)
+        progress = []
+        outputs = [self.directory / str(index) / "original.mp4" for index in range(5)]
+        for output in outputs:
+            output.parent.mkdir()
+
+        with patch('clients.download.run_process', self.fake_run_process):
+            await asyncio.gather(*[manager.download(f"https://youtu.be/{index}", output, on_progress=progress.append)
+                                   for index, output in enumerate(outputs)])
+
+        self.assertEqual(len(self.calls), 5)
+        self.assertEqual(len(progress), 10)
+        args, cwd, timeout = self.calls[0]
+        self.assertEqual((cwd, timeout), (self.directory / "0", 60))
+        self.assertEqual(args[args.index("-N") + 1], "8")
+        self.assertEqual(args[args.index("--limit-rate") + 1], "4000000")
+        self.assertEqual(args[args.index("-f") + 1], "bv*[height<=1080]+ba/b[height<=1080]/bv*+ba/b")
+        self.assertIn("--continue", args)
+
+    def test_unlimited_rate(self):
+        command = DownloadManager(rate_limit=None).command("https://youtu.be/x", Path("original.mp4"))
+        self.assertNotIn("--limit-rate", command)
+
+    def test_format_args_decide_the_output(self):
+        self.assertNotEqual(DownloadManager(height=720).format_args(), DownloadManager(height=1080).format_args())
+        self.assertEqual(DownloadManager(fragments=2, rate_limit=1).format_args(),
+                         DownloadManager(fragments=16).format_args())
@@ -1,72 +1,46 @@
-from unittest.mock import patch, AsyncMock, MagicMock
+from unittest.mock import patch
 
-from api.fetch_all_movies import FetchAllMovies
+from api.fetch_all_movies import ImdbGraphQLScraper
+from benchmarks.crawler import load_pages
+from benchmarks.fake_dynamo import FakeDynamoDB
+from benchmarks.stub_server import GraphQLStubServer
 from tests.base import BaseTest
 
 
-@patch('aioboto3.Session')
-@patch('aiohttp.ClientSession')
-class TestFetchAllMovies(BaseTest):
-    async def test_fetch_all_movies_movie(self, *args):
-        client_session, aioboto = args
+class TestImdbGraphQLScraper(BaseTest):
+    def setUp(self) -> None:
+        self.dynamo = FakeDynamoDB()
+        self.pages = load_pages()
 
-        # Mock HTML file responses
-        with open('movie.html', 'r') as file_movie:
-            with open('serial.html', 'r') as file_serial:
-                with open('imdb_results.html', 'r') as file_imdb_results:
-                    # Setup mock HTTP response
-                    mock_response = AsyncMock()
-                    mock_response.status = 200
+    async def crawl(self, **kwargs):
+        with patch('aioboto3.Session', self.dynamo.session):
+            async with GraphQLStubServer(self.pages) as server:
+                scraper = ImdbGraphQLScraper(throttle=False, **kwargs)
+                scraper.host = server.host
+                scraper.scheme = "http"
+                return await scraper.fetch_all_movies()
 
-                    file_imdb_results_data = file_imdb_results.read()
-                    mock_response.text = AsyncMock()
-                    mock_response.text.side_effect = [
-                        file_imdb_results_data,
-                        file_imdb_results_data,
-                        file_movie.read(),
-                        file_serial.read(),
-                    ]
+    async def test_fetch_all_movies_new(self):
+        results = await self.crawl()
 
-                    client_session.return_value.__aenter__.return_value.get.return_value = mock_response
+        self.assertDictEqual(results, {"total_new": 10, "total_updated": 0, "pages_processed": 2})
+        movie = self.dynamo.tables["movie"]["tt1860357"]
+        self.assertEqual(movie["title"], {"en": "Deepwater Horizon", "ru": ""})
+        self.assertListEqual(movie["genres"], ["Action", "Drama", "History"])
+        self.assertListEqual(movie["directors"], ["Peter Berg"])
+        self.assertEqual(movie["year"], "2016")
+        self.assertEqual(self.dynamo.tables["movie"]["tt0903747"]["end_year"], "2013")
 
-        # Create all the mocks we need
-        mock_resource = AsyncMock()
-        mock_table = AsyncMock()
-        mock_batch_writer = AsyncMock()
+    async def test_fetch_all_movies_updates_changed(self):
+        await self.crawl()
+        self.dynamo.tables["movie"]["tt3758172"]["votes"] = 1
 
-        # Set up the resource mock
-        aioboto.return_value.resource.return_value.__aenter__.return_value = mock_resource
+        results = await self.crawl()
 
-        # Critical fix: Make Table() return a regular object, not a coroutine
-        # The Table() function itself needs to be awaitable, but its return value shouldn't be
-        mock_resource.Table = AsyncMock(return_value=mock_table)
+        self.assertDictEqual(results, {"total_new": 0, "total_updated": 1, "pages_processed": 2})
+        self.assertEqual(self.dynamo.tables["movie"]["tt3758172"]["votes"], 134000)
 
-        # Set up batch_writer to return a proper async context manager, not a coroutine
-        mock_table.batch_writer = MagicMock(return_value=AsyncMock())
-        mock_table.batch_writer.return_value.__aenter__ = AsyncMock(return_value=mock_batch_writer)
-        mock_table.batch_writer.return_value.__aexit__ = AsyncMock(return_value=None)
+    async def test_fetch_all_movies_max_pages(self):
+        results = await self.crawl(max_pages=1)
 
-        # Set up the put_item method
-        mock_batch_writer.put_item = AsyncMock()
-
-        # Mock first scan response (partial results)
-        first_response = {
-            'Items': [{'id': f"id-{i}"} for i in range(1, 6)],
-            'LastEvaluatedKey': {'id': 'id-5'}
-        }
-        # Mock second scan response (remaining results)
-        second_response = {
-            'Items': [{'id': f"id-{i}"} for i in range(6, 11)],
-        }
-        mock_table.scan = AsyncMock()
-        mock_table.scan.side_effect = [first_response, second_response]
-
-        start_page = 1
-        max_pages = 1
-        batch_size = 1
-
-        total_new_movies = await FetchAllMovies(
-            start_page=start_page,
-            max_pages=max_pages,
-            batch_size=batch_size
-        ).fetch_all_movies()
+        self.assertDictEqual(results, {"total_new": 5, "total_updated": 0, "pages_processed": 1})
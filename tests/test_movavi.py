@@ -0,0 +1,302 @@
+import io
+import re
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+from xml.dom import minidom
+
+from clients.movavi.generator import MovaviProjectGenerator, TimelineBuilder
+from clients.movavi.main import add_audio_to_project, create_movavi_project, create_set_projects, save_movavi_project, \
+    version_xml
+from clients.movavi.parser import load_movavi_project, parse_movavi_xml
+from clients.movavi.schema import FilePath, TimelineClip, MovaviObject, RawObject
+
+VIDEO_METADATA = {
+    "width": 1920, "height": 1080, "frame_rate_n": 24000, "frame_rate_d": 1001, "duration_frames": 150150,
+    "video_bitrate": 4500000, "audio_bitrate": 192000, "video_codec_id": "CODEC_ID_H264",
+    "audio_props": {"codec_id": "CODEC_ID_AAC", "sample_rate": 48000, "sample_format": 8, "channel_layout": "stereo"}
+}
+AUDIO_PROPERTIES = {
+    "sample_rate": 44100, "channel_layout": 2, "bitrate": 128000, "sample_format": 8, "codec_id": "CODEC_ID_MP3"
+}
+
+
+def build_project() -> MovaviProjectGenerator:
+    with patch('clients.movavi.generator.get_video_metadata', return_value=VIDEO_METADATA), \
+            patch('clients.movavi.main.get_video_duration_frames', return_value=90000), \
+            patch('clients.movavi.generator.get_detailed_audio_properties', return_value=AUDIO_PROPERTIES), \
+            patch('os.path.exists', return_value=True), patch('os.path.getsize', return_value=1234):
+        generator = MovaviProjectGenerator()
+        generator.add_video_to_project(r'C:\users\Public\Videos\a & "b" <c>.mp4', "/movies/original.mp4")
+
+        timeline = generator.timeline
+        audio = FilePath("/movies/audio.mp3", r"C:\users\Public\Videos\audio.mp3")
+        add_audio_to_project(generator, audio, timeline.timeline_id, timeline.tracks["voice_over"], 150150)
+    return generator
+
+
+class TestMovaviXml(TestCase):
+    def setUp(self) -> None:
+        self.generator = build_project()
+
+    def minidom_xml(self) -> str:
+        root = ET.Element("Archive")
+        for obj in self.generator.objects.values():
+            root.append(obj.to_element())
+        ET.SubElement(root, "RootRef", type="ObjectRef", value=str(self.generator.root_ref))
+
+        pretty_xml = minidom.parseString(ET.tostring(root, encoding="utf-8")).toprettyxml(indent="    ")
+        return '<?xml version="1.0" encoding="UTF-8"?>\n' + pretty_xml.split('\n', 1)[1]
+
+    def test_streaming_matches_pretty_print(self):
+        xml = self.generator.to_xml()
+
+        self.assertEqual(xml, self.minidom_xml())
+        self.assertIn('value="a &amp; &quot;b&quot; &lt;c&gt;.mp4"', xml)
+        self.assertIn('<transitions type="Array" size="0"/>', xml)
+
+    def test_write_xml(self):
+        stream = io.StringIO()
+        self.generator.write_xml(stream)
+
+        self.assertEqual(stream.getvalue(), self.generator.to_xml())
+        root = ET.fromstring(stream.getvalue().encode())
+        self.assertEqual(root.find("RootRef").get("value"), str(self.generator.root_ref))
+        self.assertEqual(root[0].get("type"), "Predeclarator")
+
+
+class TestTimelineBuilder(TestCase):
+    def setUp(self) -> None:
+        self.generator = MovaviProjectGenerator()
+        self.timeline = TimelineBuilder.from_metadata(self.generator, VIDEO_METADATA)
+
+    def object_ids(self) -> list:
+        root = ET.fromstring(self.generator.to_xml().encode())
+        return [element.get("objectId") for element in root.iter() if element.get("type") != "Item"
+                and element.tag != "BaseOfObject" and element.get("objectId")]
+
+    def test_set_of_videos(self):
+        for index in range(10):
+            path = FilePath(f"/movies/{index}/final.mp4", f"C:\\Videos\\{index}.mp4")
+            self.timeline.add_video(path, metadata=VIDEO_METADATA, gap=1000 if index else 0)
+        narration = FilePath("/movies/0/audio.mp3", r"C:\Videos\audio.mp3")
+        self.timeline.add_audio(narration, start=0, duration=30000, audio_props=AUDIO_PROPERTIES)
+
+        ids = self.object_ids()
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(self.timeline.track_end(), 10 * 150150 + 9 * 1000)
+        self.assertEqual(self.timeline.track_end("voice_over"), 30000)
+        self.assertEqual(len(self.timeline.timeline.clips), 21)
+        self.assertEqual(len(self.timeline.timeline.links), 10)
+        self.assertEqual(len(self.timeline.editor_collection.items), 11)
+
+        # Every object is predeclared and the Timeline::Object references every timing and link
+        predeclared = {p["oid"] for p in self.generator.predeclarator.predeclarations}
+        objects = set(self.generator.objects) - {self.generator.predeclarator.object_id}
+        self.assertSetEqual(predeclared - objects, set(self.timeline.timing_refs))
+        self.assertSetEqual(objects - predeclared, set())
+        self.assertEqual(len(self.timeline.timing_refs), 31)
+
+    def test_cuts_share_the_source(self):
+        path = FilePath("/movies/0/original.mp4", r"C:\Videos\original.mp4")
+        for position in (0, 60000, 120000):
+            self.timeline.add_video(path, metadata=VIDEO_METADATA, source_position=position, duration=4000)
+
+        self.assertEqual(len(self.generator.objects_of_type("File")), 1)
+        self.assertEqual(len(self.generator.objects_of_type("Timeline::Clip")), 6)
+        self.assertTrue(all(isinstance(clip, TimelineClip)
+                            for clip in self.generator.objects_of_type("Timeline::Clip")))
+        self.assertEqual(self.timeline.track_end(), 12000)
+        self.assertListEqual([clip["value"]["sourcePosition"] for clip in self.timeline.timeline.clips[::2]],
+                             [0, 60000, 120000])
+
+    def test_indexes(self):
+        path = FilePath("/movies/0/original.mp4", r"C:\Videos\original.mp4")
+        clip_ids = [self.timeline.add_video(path, metadata=VIDEO_METADATA, source_position=position * 100,
+                                            duration=100) for position in range(300)]
+
+        self.assertListEqual(self.timeline.clips_on_track("main"), clip_ids)
+        self.assertEqual(len(self.timeline.clips_on_track("linked_audio")), 300)
+        self.assertEqual(self.timeline.track_end("linked_audio"), 30000)
+
+        # Moving the last clip back only shortens the tracks it is on
+        self.timeline.retime_clip(clip_ids[-1], start=0)
+        self.assertEqual(self.timeline.track_end(), 29900)
+        self.assertEqual(self.timeline.track_end("linked_audio"), 29900)
+        self.assertEqual(self.timeline.track_end("voice_over"), 0)
+
+        # The indexes match the ones rebuilt from the timeline object
+        timings, links = dict(self.timeline.timings), dict(self.timeline.links)
+        self.timeline.index_timeline()
+        self.assertDictEqual(self.timeline.timings, timings)
+        self.assertDictEqual(self.timeline.links, links)
+
+
+class TestMepx(TestCase):
+    def setUp(self) -> None:
+        self.directory = Path(tempfile.mkdtemp())
+
+    def test_save_in_memory(self):
+        generator = build_project()
+        output_mepx = self.directory / "project.mepx"
+
+        with patch('clients.movavi.main.BASE_DIR', self.directory):
+            save_movavi_project(generator, output_mepx)
+
+        with zipfile.ZipFile(output_mepx) as archive:
+            self.assertListEqual(archive.namelist(), ["config.xml", "version.xml"])
+            self.assertEqual(archive.read("config.xml").decode(), generator.to_xml())
+            self.assertEqual(archive.read("version.xml").decode(), version_xml())
+        self.assertFalse((self.directory / "config.xml").exists())
+
+    def test_compression_level(self):
+        generator = build_project()
+        stored, deflated = io.BytesIO(), io.BytesIO()
+
+        save_movavi_project(generator, stored, compresslevel=0)
+        save_movavi_project(generator, deflated, compresslevel=9)
+
+        for archive, compress_type in ((stored, zipfile.ZIP_STORED), (deflated, zipfile.ZIP_DEFLATED)):
+            with zipfile.ZipFile(archive) as archive:
+                self.assertEqual(archive.getinfo("config.xml").compress_type, compress_type)
+                self.assertEqual(archive.read("config.xml").decode(), generator.to_xml())
+        self.assertLess(len(deflated.getvalue()), len(stored.getvalue()))
+
+    def test_additional_audio_goes_on_the_last_audio_track(self):
+        video = FilePath("/movies/original.mp4", r"C:\users\Public\Videos\uncharted.mp4")
+        audio = FilePath("/movies/audio.mp3", r"C:\users\Public\Videos\audio.mp3")
+
+        with patch('clients.movavi.generator.get_video_metadata', return_value=VIDEO_METADATA), \
+                patch('clients.movavi.main.get_video_duration_frames', return_value=90000), \
+                patch('clients.movavi.generator.get_detailed_audio_properties', return_value=AUDIO_PROPERTIES), \
+                patch('os.path.exists', return_value=True), patch('os.path.getsize', return_value=1234), \
+                patch('clients.movavi.main.save_movavi_project', lambda generator, *args: generator):
+            timeline = create_movavi_project(video, self.directory / "project.mepx", audio).timeline
+
+        [clip] = timeline.clips_on_track("overlay")
+        self.assertEqual(timeline.clip_timing(clip)["timestamp"], 0)
+        self.assertListEqual(timeline.clips_on_track("voice_over"), [])
+
+    def test_batch(self):
+        sets, movies = self.directory / "sets", self.directory / "movies"
+        (sets / "adventure").mkdir(parents=True)
+        for movie in ("uncharted", "jungle", "survival"):
+            (movies / movie).mkdir(parents=True)
+            (movies / movie / "original.mp4").write_bytes(b"original")
+            (movies / movie / "final.mp4").write_bytes(b"final")
+            (movies / movie / "audio.mp3").write_bytes(b"audio")
+            (sets / "adventure" / f"{movie}.mp4").symlink_to(movies / movie / "final.mp4")
+        (sets / "adventure" / "jungle-30fps.mp4").write_bytes(b"re-encoded")
+
+        # The worker processes are forked with the patches in place
+        with patch('clients.movavi.main.BASE_DIR_SETS', sets), patch('clients.movavi.main.BASE_DIR_MOVIES', movies), \
+                patch('clients.movavi.main.get_video_metadata', return_value=VIDEO_METADATA), \
+                patch('clients.movavi.generator.get_video_metadata', return_value=VIDEO_METADATA), \
+                patch('clients.movavi.main.get_video_duration_frames', return_value=90000), \
+                patch('clients.movavi.generator.get_detailed_audio_properties', return_value=AUDIO_PROPERTIES), \
+                patch('clients.probe.warm_cache') as warm_cache:
+            results = create_set_projects(["adventure"], workers=2)
+
+        self.assertEqual(len(warm_cache.call_args.args[0]), 9)
+        self.assertListEqual(sorted(Path(path).name for path in results.values()), [
+            "adventure.mepx", "jungle.mepx", "survival.mepx", "uncharted.mepx"
+        ])
+        with zipfile.ZipFile(sets / "adventure" / "adventure.mepx") as archive:
+            root = ET.fromstring(archive.read("config.xml"))
+        files = [element for element in root if element.get("type") == "File"]
+        self.assertEqual(len(files), 3)
+
+
+class TestMovaviParser(TestCase):
+    def setUp(self) -> None:
+        self.generator = build_project()
+        self.archive = io.BytesIO()
+        save_movavi_project(self.generator, self.archive)
+
+    def test_round_trip(self):
+        loaded = load_movavi_project(self.archive)
+
+        self.assertEqual(loaded.to_xml(), self.generator.to_xml())
+        self.assertFalse([obj for obj in loaded.objects.values() if isinstance(obj, RawObject)])
+        self.assertEqual(loaded.next_id, self.generator.next_id)
+        self.assertDictEqual(loaded.timeline.tracks, self.generator.timeline.tracks)
+        self.assertDictEqual(loaded.timeline.files, self.generator.timeline.files)
+        self.assertListEqual(loaded.timeline.timing_refs, self.generator.timeline.timing_refs)
+
+    def test_unknown_objects_are_kept(self):
+        xml = self.generator.to_xml().replace(
+            "    <RootRef", '    <RootObject type="Title::Object" objectId="7000001">\n'
+                           '        <text type="String" value="Intro"/>\n'
+                           '    </RootObject>\n    <RootRef')
+        loaded = parse_movavi_xml(xml)
+
+        self.assertIsInstance(loaded.objects[7000001], RawObject)
+        self.assertEqual(loaded.to_xml(), xml)
+        self.assertEqual(loaded.next_id, 7000001)
+
+    def test_missing_timeline_predeclaration(self):
+        # The timeline's predeclaration now declares nothing
+        xml = re.sub(r'(value="Timeline::Object"/>\s*<oid type="ObjectRef" value=")\d+', r"\g<1>0",
+                     self.generator.to_xml())
+
+        with self.assertRaisesRegex(ValueError, "project has no timeline predeclaration"):
+            parse_movavi_xml(xml)
+
+    def test_missing_track(self):
+        # The effects track is now of a type the builder doesn't know
+        xml = self.generator.to_xml()
+        self.assertEqual(xml.count('<type type="int32_t" value="80"/>'), 1)
+
+        with self.assertRaisesRegex(ValueError, "project has no effects track"):
+            parse_movavi_xml(xml.replace('<type type="int32_t" value="80"/>', '<type type="int32_t" value="96"/>'))
+
+    def test_only_modified_objects_are_serialised(self):
+        loaded = load_movavi_project(self.archive)
+        timeline = loaded.timeline
+        video_clip_id = timeline.timeline.clips[0]["key"]
+        loaded.to_xml()
+        expected = self.generator.to_xml()
+
+        with patch.object(MovaviObject, 'write_uncached', autospec=True,
+                          side_effect=MovaviObject.write_uncached) as write_uncached:
+            self.assertEqual(loaded.to_xml(), expected)
+            write_uncached.assert_not_called()
+
+            timeline.retime_clip(video_clip_id, start=500, duration=1000, source_position=2000)
+            xml = loaded.to_xml()
+        self.assertListEqual([call.args[0] for call in write_uncached.call_args_list], [timeline.timeline])
+        # Generated projects are streamed, not kept as strings
+        self.assertFalse([obj for obj in self.generator.objects.values() if obj.__dict__.get("_xml")])
+
+        audio_timing = timeline.clip_timing(timeline.linked_clips(video_clip_id)[0][0])
+        self.assertEqual((audio_timing["timestamp"], audio_timing["duration"], audio_timing["sourcePosition"]),
+                         (500, 1000, 2000))
+        self.assertEqual(timeline.track_end(), 1500)
+        self.assertEqual(timeline.track_end("linked_audio"), 1500)
+        self.assertEqual(parse_movavi_xml(xml).to_xml(), xml)
+
+    def test_edit_loaded_project(self):
+        loaded = load_movavi_project(self.archive)
+        timeline = loaded.timeline
+        video_clip_id = timeline.timeline.clips[0]["key"]
+
+        shorter = {**VIDEO_METADATA, "duration_frames": 60000}
+        timeline.replace_clip(video_clip_id, FilePath("/movies/final.mp4", r"C:\Videos\final.mp4"), shorter)
+        timeline.add_video(FilePath("/movies/final.mp4", r"C:\Videos\final.mp4"), metadata=shorter, gap=1000)
+
+        clip = loaded.objects[video_clip_id]
+        self.assertEqual((clip.name, clip.source_duration), ("final.mp4", 60000))
+        self.assertEqual(timeline.clip_timing(video_clip_id)["duration"], 60000)
+        self.assertEqual(timeline.track_end(), 121000)
+        self.assertEqual(len(loaded.objects_of_type("File")), 3)
+
+        # The edited project loads back the same
+        xml = loaded.to_xml()
+        root = ET.fromstring(xml.encode())
+        ids = [element.get("objectId") for element in root.iter() if element.get("type") != "Item"
+               and element.tag != "BaseOfObject" and element.get("objectId")]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(parse_movavi_xml(xml).to_xml(), xml)
@@ -0,0 +1,182 @@
+import asyncio
+import tempfile
+from fractions import Fraction
+from pathlib import Path
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from clients.movavi.main import get_video_duration_frames
+from clients.probe import ProbeCache, av, probe, probe_many, warm_cache
+from tests.base import BaseTest
+from utils import get_video_metadata, get_detailed_audio_properties
+
+FFPROBE_OUTPUT = {
+    "streams": [
+        {
+            "index": 0, "codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+            "r_frame_rate": "24000/1001", "duration": "150.150000", "bit_rate": "4500000"
+        },
+        {
+            "index": 1, "codec_type": "audio", "codec_name": "aac", "sample_rate": "48000", "channels": 2,
+            "channel_layout": "stereo", "sample_fmt": "fltp", "bit_rate": "192000"
+        }
+    ],
+    "format": {"duration": "150.200000", "bit_rate": "4700000"}
+}
+
+
+class TestProbe(TestCase):
+    def setUp(self) -> None:
+        directory = Path(tempfile.mkdtemp())
+        self.media = directory / "original.mp4"
+        self.media.write_bytes(b"media")
+        self.cache = ProbeCache(directory / "probe_cache.sqlite3")
+
+        # The fake media must go through the (mocked) ffprobe backend
+        pyav = patch('clients.probe.av', None)
+        pyav.start()
+        self.addCleanup(pyav.stop)
+
+    @patch('clients.probe.run_ffprobe', return_value=FFPROBE_OUTPUT)
+    def test_single_probe_per_file(self, run_ffprobe):
+        with patch('clients.probe.default_cache', self.cache):
+            metadata = get_video_metadata(str(self.media))
+            audio = get_detailed_audio_properties(self.media)
+            duration = get_video_duration_frames(self.media)
+
+        run_ffprobe.assert_called_once()
+        self.assertEqual(metadata["width"], 1920)
+        self.assertEqual(metadata["frame_rate_n"], 24000)
+        self.assertDictEqual(audio, {
+            "sample_rate": 48000, "channel_layout": 2, "bitrate": 192000, "sample_format": 8,
+            "codec_id": "CODEC_ID_AAC"
+        })
+        self.assertEqual(duration, 150200)
+
+    @patch('clients.probe.run_ffprobe')
+    def test_audio_bitrate_falls_back_to_format(self, run_ffprobe):
+        audio_stream = {**FFPROBE_OUTPUT["streams"][1]}
+        del audio_stream["bit_rate"]
+        run_ffprobe.return_value = {"streams": [audio_stream], "format": FFPROBE_OUTPUT["format"]}
+
+        with patch('clients.probe.default_cache', self.cache):
+            audio = get_detailed_audio_properties(self.media)
+
+        run_ffprobe.assert_called_once()
+        self.assertEqual(audio["bitrate"], 4700000)
+
+    @patch('clients.probe.run_ffprobe', return_value=FFPROBE_OUTPUT)
+    def test_persistent_cache(self, run_ffprobe):
+        with patch('clients.probe.default_cache', self.cache):
+            get_video_duration_frames(self.media)
+        with patch('clients.probe.default_cache', ProbeCache(self.cache.path)):
+            get_video_duration_frames(self.media)
+        run_ffprobe.assert_called_once()
+
+        self.media.write_bytes(b"re-encoded media")
+        with patch('clients.probe.default_cache', ProbeCache(self.cache.path)):
+            get_video_duration_frames(self.media)
+        self.assertEqual(run_ffprobe.call_count, 2)
+
+
+class TestProbeMany(BaseTest):
+    def setUp(self) -> None:
+        directory = Path(tempfile.mkdtemp())
+        self.media = []
+        for index in range(6):
+            path = directory / f"movie_{index}.mp4"
+            path.write_bytes(b"media")
+            self.media.append(path)
+        self.cache = ProbeCache(directory / "probe_cache.sqlite3")
+        self.running = self.peak = self.calls = 0
+
+        pyav = patch('clients.probe.av', None)
+        pyav.start()
+        self.addCleanup(pyav.stop)
+
+    async def fake_ffprobe(self, path):
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        if path.endswith("movie_5.mp4"):
+            raise OSError("unreadable")
+        return FFPROBE_OUTPUT
+
+    async def test_concurrency_limit(self):
+        with patch('clients.probe.run_ffprobe_async', self.fake_ffprobe):
+            results = [item async for item in probe_many(self.media[:5] * 2, self.cache, limit=2)]
+
+        self.assertEqual(sorted(path for path, _ in results), self.media[:5])
+        self.assertEqual(self.calls, 5)
+        self.assertEqual(self.peak, 2)
+
+    async def test_warm_cache(self):
+        with patch('clients.probe.run_ffprobe_async', self.fake_ffprobe):
+            results = await warm_cache(self.media, self.cache)
+            await warm_cache(self.media, self.cache)
+
+        self.assertEqual(list(results), self.media[:5])
+        # Only the failed file is probed again
+        self.assertEqual(self.calls, 7)
+        with patch('clients.probe.run_ffprobe') as run_ffprobe, patch('clients.probe.default_cache', self.cache):
+            self.assertEqual(get_video_duration_frames(self.media[0]), 150200)
+        run_ffprobe.assert_not_called()
+
+    async def test_failure_cancels_remaining(self):
+        with patch('clients.probe.run_ffprobe_async', self.fake_ffprobe):
+            with self.assertRaises(OSError):
+                [item async for item in probe_many(self.media[::-1], self.cache, limit=1)]
+        self.assertLess(self.calls, len(self.media))
+
+
+@skipUnless(av, "PyAV is not installed")
+class TestPyAVProbe(TestCase):
+    def setUp(self) -> None:
+        directory = Path(tempfile.mkdtemp())
+        self.media = directory / "original.mp4"
+        self.cache = ProbeCache(directory / "probe_cache.sqlite3")
+
+        with av.open(str(self.media), "w") as container:
+            video = container.add_stream("mpeg4", rate=25)
+            video.width, video.height = 320, 240
+            audio = container.add_stream("aac", rate=44100)
+            audio.layout = "stereo"
+
+            for index in range(25):
+                frame = av.VideoFrame(320, 240, "yuv420p")
+                frame.pts, frame.time_base = index, Fraction(1, 25)
+                container.mux(video.encode(frame))
+            for index in range(44):
+                frame = av.AudioFrame(format="fltp", layout="stereo", samples=1024)
+                for plane in frame.planes:
+                    plane.update(bytes(plane.buffer_size))
+                frame.sample_rate, frame.pts = 44100, index * 1024
+                container.mux(audio.encode(frame))
+            container.mux(video.encode())
+            container.mux(audio.encode())
+
+    @patch('clients.probe.run_ffprobe')
+    def test_in_process_probe(self, run_ffprobe):
+        with patch('clients.probe.default_cache', self.cache):
+            data = probe(self.media)
+            metadata = get_video_metadata(str(self.media))
+            audio = get_detailed_audio_properties(self.media)
+
+        run_ffprobe.assert_not_called()
+        self.assertEqual(data["format"]["format_name"], "mov,mp4,m4a,3gp,3g2,mj2")
+        self.assertAlmostEqual(float(data["format"]["duration"]), 1.0, delta=0.1)
+        self.assertEqual((metadata["width"], metadata["height"]), (320, 240))
+        self.assertEqual((metadata["frame_rate_n"], metadata["frame_rate_d"]), (25, 1))
+        self.assertEqual((audio["sample_rate"], audio["channel_layout"]), (44100, 2))
+        self.assertEqual(audio["codec_id"], "CODEC_ID_AAC")
+
+    @patch('clients.probe.run_ffprobe', return_value=FFPROBE_OUTPUT)
+    def test_falls_back_to_ffprobe(self, run_ffprobe):
+        self.media.write_bytes(b"not a media file")
+        with patch('clients.probe.default_cache', self.cache):
+            data = probe(self.media)
+
+        run_ffprobe.assert_called_once()
+        self.assertEqual(data, FFPROBE_OUTPUT)
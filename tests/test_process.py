@@ -0,0 +1,75 @@
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from clients.process import run_process
+from tests.base import BaseTest
+
+
+def python(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+class TestRunProcess(BaseTest):
+    async def test_streams_progress(self):
+        lines = []
+        code = ("import sys\n"
+                "for percent in (10, 50, 100):\n"
+                "    sys.stderr.write(f'\\rframe {percent}%'); sys.stderr.flush()\n"
+                "sys.stderr.write('\\ndone\\n'); print('output')")
+
+        stdout = await run_process(python(code), on_progress=lines.append)
+
+        self.assertEqual(stdout, b"output\n")
+        self.assertListEqual(lines, ["frame 10%", "frame 50%", "frame 100%", "done"])
+
+    async def test_progress_is_logged_at_info_rate_limited(self):
+        code = "import sys\nfor percent in (10, 50, 100):\n    sys.stderr.write(f'frame {percent}%\\n')"
+
+        with self.assertLogs("clients.process", "INFO") as logs:
+            await run_process(python(code))
+
+        self.assertListEqual([record.getMessage() for record in logs.records],
+                             [f"{sys.executable}: frame 10%"])
+
+    async def test_argument_list_and_cwd(self):
+        directory = Path(tempfile.mkdtemp())
+        name = "it's a \"title\"; rm -rf.txt"
+
+        await run_process(python(f"open({name!r}, 'w').write('x')"), cwd=directory)
+
+        self.assertTrue((directory / name).exists())
+
+    async def test_failure_keeps_stderr(self):
+        with self.assertRaises(subprocess.CalledProcessError) as error:
+            await run_process(python("import sys; print('Invalid data found', file=sys.stderr); sys.exit(3)"))
+
+        self.assertEqual(error.exception.returncode, 3)
+        self.assertIn("Invalid data found", error.exception.stderr)
+
+    async def test_timeout_kills(self):
+        started = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            await run_process(python("import time; time.sleep(30)"), timeout=0.5)
+        self.assertLess(time.monotonic() - started, 5)
+
+    async def test_cancellation_kills(self):
+        directory = Path(tempfile.mkdtemp())
+        code = "import time; time.sleep(1); open('finished', 'w')"
+
+        task = asyncio.create_task(run_process(python(code), cwd=directory))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        await asyncio.sleep(1.2)
+        self.assertFalse((directory / "finished").exists())
+
+    async def test_processes_run_concurrently(self):
+        started = time.monotonic()
+        await asyncio.gather(*[run_process(python("import time; time.sleep(0.5)")) for _ in range(4)])
+        self.assertLess(time.monotonic() - started, 1.5)
@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import patch
+
+from api.video_editor import VideoEditor, make_trailers
+from models.video import Item
+from task_graph import SkippedError, TaskGraph
+from tests.base import BaseTest
+
+
+class TestTaskGraph(BaseTest):
+    def setUp(self) -> None:
+        self.running = {}
+        self.peak = {}
+        self.finished = []
+
+    def step(self, stage: str, key: str, fail: bool = False):
+        async def run():
+            self.running[stage] = self.running.get(stage, 0) + 1
+            self.peak[stage] = max(self.peak.get(stage, 0), self.running[stage])
+            await asyncio.sleep(0.01)
+            self.running[stage] -= 1
+            if fail:
+                raise OSError(f"{key} failed")
+            self.finished.append((key, stage))
+            return key
+        return run
+
+    async def test_stage_limits(self):
+        graph = TaskGraph({"download": 2, "encode": 1})
+        for movie in range(6):
+            download = graph.add((movie, "download"), "download", self.step("download", movie))
+            graph.add((movie, "encode"), "encode", self.step("encode", movie), deps=[download])
+
+        results = await graph.run()
+
+        self.assertEqual(len(results), 12)
+        self.assertDictEqual(self.peak, {"download": 2, "encode": 1})
+        # Encodes start while other movies are still downloading
+        self.assertLess(self.finished.index((0, "encode")), self.finished.index((5, "download")))
+
+    async def test_failure_skips_dependents(self):
+        graph = TaskGraph({"download": 4})
+        download = graph.add("download", "download", self.step("download", "a", fail=True))
+        audio = graph.add("tts", "tts", self.step("tts", "a"))
+        mux = graph.add("mux", "encode", self.step("encode", "a"), deps=[download, audio])
+        graph.add("upload", "upload", self.step("upload", "a"), deps=[mux])
+
+        results = await graph.run()
+
+        self.assertIsInstance(results["download"], OSError)
+        self.assertEqual(results["tts"], "a")
+        self.assertIsInstance(results["mux"], SkippedError)
+        self.assertIsInstance(results["upload"], SkippedError)
+        self.assertListEqual(self.finished, [("a", "tts")])
+
+    def test_dependencies_must_exist(self):
+        graph = TaskGraph({})
+        with self.assertRaises(ValueError):
+            graph.add("mux", "encode", self.step("encode", "a"), deps=["download"])
+
+
+class TestMakeTrailers(BaseTest):
+    async def test_movies_overlap(self):
+        events = []
+
+        def stage(name):
+            async def run(editor):
+                events.append((editor.dir, name))
+                await asyncio.sleep(0)
+            return run
+
+        items = [Item.from_dict({"id": f"tt{index}", "title": {"en": f"Movie {index}"}}) for index in range(3)]
+        with patch.object(VideoEditor, 'download', stage("download")), \
+                patch.object(VideoEditor, 'do_audio', stage("tts")), \
+                patch.object(VideoEditor, 'add_audio', stage("encode")), \
+                patch.object(VideoEditor, 'upload_files', stage("upload")), \
+                patch('pathlib.Path.mkdir'):
+            results = await make_trailers(items)
+
+        self.assertEqual(len(results), 12)
+        self.assertFalse([result for result in results.values() if isinstance(result, Exception)])
+        # Downloads and narrations of all the movies start before the first mux
+        stages = [name for _, name in events]
+        self.assertEqual(set(stages[:6]), {"download", "tts"})
+        for item in items:
+            movie = [name for movie_dir, name in events if movie_dir == item.title_to_dir()]
+            self.assertListEqual(movie[2:], ["encode", "upload"])
+
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+import io
+import tempfile
+from pathlib import Path
+
+import av
+
+from clients.tts import LocalBackend, OpenAIBackend, SpeechSynthesizer
+from tests.base import BaseTest
+
+
+class FakeSpeechClient:
+    """Stands in for ``AsyncOpenAI``: streams the text back in chunks, slowly"""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.requests = []
+        self.running = self.peak = 0
+        self.audio = self.speech = self.with_streaming_response = self
+
+    @contextlib.asynccontextmanager
+    async def create(self, model, voice, input, response_format):
+        self.requests.append((input, model, voice))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            yield self
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+
+    async def iter_bytes(self):
+        text = self.requests[-1][0].encode()
+        for start in range(0, len(text), 4):
+            await asyncio.sleep(0)
+            yield text[start:start + 4]
+
+
+class TestSpeechSynthesizer(BaseTest):
+    def setUp(self) -> None:
+        self.directory = Path(tempfile.mkdtemp())
+        self.client = FakeSpeechClient()
+        self.tts = SpeechSynthesizer(self.directory / "cache", limit=3, backend=OpenAIBackend(self.client))
+
+    async def test_cached_by_text_model_and_voice(self):
+        first, second, other_voice = (self.directory / name for name in ("a.mp3", "b.mp3", "c.mp3"))
+
+        self.assertTrue(await self.tts.synthesize("A treasure hunter.", first, "tts-1-hd", "sage"))
+        self.assertFalse(await self.tts.synthesize("A treasure hunter.", second, "tts-1-hd", "sage"))
+        self.assertTrue(await self.tts.synthesize("A treasure hunter.", other_voice, "tts-1-hd", "coral"))
+
+        self.assertEqual(len(self.client.requests), 2)
+        self.assertEqual(second.read_bytes(), b"A treasure hunter.")
+        # The cache outlives the synthesizer
+        tts = SpeechSynthesizer(self.directory / "cache", backend=OpenAIBackend(self.client))
+        self.assertFalse(await tts.synthesize("A treasure hunter.", self.directory / "d.mp3", "tts-1-hd", "sage"))
+
+    async def test_parallel_and_bounded(self):
+        texts = [f"Narration number {index}" for index in range(10)]
+
+        await asyncio.gather(*[self.tts.synthesize(text, self.directory / f"{index}.mp3")
+                               for index, text in enumerate(texts)])
+
+        self.assertEqual(self.client.peak, 3)
+        self.assertEqual((self.directory / "7.mp3").read_text(), texts[7])
+
+    async def test_identical_requests_share_one_synthesis(self):
+        results = await asyncio.gather(*[self.tts.synthesize("Same text", self.directory / f"{index}.mp3")
+                                         for index in range(5)])
+
+        self.assertEqual(len(self.client.requests), 1)
+        self.assertEqual(sorted(results), [False] * 4 + [True])
+        self.assertEqual((self.directory / "4.mp3").read_text(), "Same text")
+
+    async def test_failure_caches_nothing(self):
+        async def broken_stream():
+            yield b"partial"
+            raise ConnectionError("stream reset")
+
+        self.client.iter_bytes = broken_stream
+        with self.assertRaises(ConnectionError):
+            await self.tts.synthesize("Lost", self.directory / "lost.mp3")
+
+        self.assertFalse((self.directory / "lost.mp3").exists())
+        self.assertFalse([path for path in (self.directory / "cache").rglob("*") if path.is_file()])
+
+
+class TestLocalBackend(BaseTest):
+    def setUp(self) -> None:
+        self.directory = Path(tempfile.mkdtemp())
+        self.tts = SpeechSynthesizer(self.directory / "cache", limit=4, backend=LocalBackend(delay=0.05))
+
+    async def test_realistic_duration(self):
+        description = " ".join(["word"] * 80)
+        output = self.directory / "audio.mp3"
+
+        await self.tts.synthesize(description, output, "tts-1-hd", "sage")
+
+        with av.open(str(output)) as container:
+            self.assertEqual(container.format.name, "mp3")
+            self.assertEqual(container.duration / av.time_base, 30.0)
+
+    async def test_deterministic_and_cached_apart_from_openai(self):
+        first, second = self.directory / "a.mp3", self.directory / "b.mp3"
+
+        await self.tts.synthesize("Same text", first)
+        await SpeechSynthesizer(self.directory / "other", backend=LocalBackend()).synthesize("Same text", second)
+
+        self.assertEqual(first.read_bytes(), second.read_bytes())
+        self.assertNotEqual(self.tts.cache_path("Same text", "tts-1-hd", "sage"),
+                            SpeechSynthesizer(self.directory / "cache", backend=OpenAIBackend(FakeSpeechClient()))
+                            .cache_path("Same text", "tts-1-hd", "sage"))
+
+    async def test_voices_and_silence(self):
+        sage = await LocalBackend().synthesize("Hello there", "tts-1-hd", "sage")
+        coral = await LocalBackend().synthesize("Hello there", "tts-1-hd", "coral")
+        silence = await LocalBackend(tone=False).synthesize("Hello there", "tts-1-hd", "sage")
+
+        self.assertEqual(len(sage), len(coral))
+        self.assertNotEqual(sage, coral)
+        with av.open(io.BytesIO(silence)) as container:
+            self.assertFalse(any(frame.to_ndarray().any() for frame in container.decode(audio=0)))
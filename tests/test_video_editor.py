@@ -0,0 +1,224 @@
+import asyncio
+import json
+import os
+import tempfile
+from pathlib import Path
+from functools import partial
+from unittest.mock import MagicMock, patch
+
+from api.video_editor import MUX_ARGS, VideoEditor, make_trailers
+from clients.audio import AacCache
+from clients.download import DownloadManager
+from clients.manifest import MANIFEST_NAME
+from clients.tts import LocalBackend, OpenAIBackend, SpeechSynthesizer
+from models.video import Item
+from tests.base import BaseTest
+from tests.test_tts import FakeSpeechClient
+
+
+def movie_item(description="A treasure hunter races across the world.", url="https://youtu.be/trailer") -> Item:
+    return Item.from_dict({
+        "id": "tt1464090", "title": {"en": "Uncharted"}, "description": {"en": description},
+        "video": {"id": "trailer", "url": url},
+    })
+
+
+class TestVideoEditor(BaseTest):
+    def setUp(self) -> None:
+        self.movies = Path(tempfile.mkdtemp())
+        self.commands = []
+        self.muxes = []
+        self.client = FakeSpeechClient(delay=0)
+        self.speech = self.client.requests
+        self.uploads = []
+        self.fail_mux = False
+        self.downloading = self.peak_downloads = 0
+
+        for target in (patch('api.video_editor.BASE_DIR_MOVIES', self.movies),
+                       patch('api.video_editor.run_process', self.fake_run_process),
+                       patch('clients.download.run_process', self.fake_run_process),
+                       patch('clients.audio.run_process', self.fake_run_process),
+                       patch('api.video_editor.SpeechSynthesizer',
+                             partial(SpeechSynthesizer, self.movies / "tts_cache",
+                                     backend=OpenAIBackend(self.client))),
+                       patch('api.video_editor.AacCache', partial(AacCache, self.movies / "aac_cache")),
+                       patch('api.video_editor.AWSS3Client', self.fake_s3_client)):
+            target.start()
+            self.addCleanup(target.stop)
+
+    async def fake_run_process(self, args, cwd=None, **kwargs):
+        self.commands.append(args[0])
+        output = Path(args[args.index("-o") + 1] if "-o" in args else args[-1])
+        if "copy" in args:
+            self.muxes.append(args)
+        if args[0] == "yt-dlp":
+            self.downloading += 1
+            self.peak_downloads = max(self.peak_downloads, self.downloading)
+            await asyncio.sleep(0.01)
+            self.downloading -= 1
+        if "copy" in args and self.fail_mux:
+            output.write_bytes(b"half a mux")
+            raise OSError("ffmpeg was killed")
+        output.write_bytes(f"{args[0]} output".encode())
+        return b""
+
+    def fake_s3_client(self, file_mappings, bucket_name, **kwargs):
+        async def upload_files():
+            self.uploads.extend(key for _, key in file_mappings)
+            return {"failure_count": 0}
+
+        client = MagicMock()
+        client.upload_files = upload_files
+        return client
+
+    async def run_pipeline(self, item: Item) -> dict:
+        return await make_trailers([item])
+
+    async def test_absolute_paths(self):
+        cwd = os.getcwd()
+        editor = VideoEditor(movie_item())
+
+        await self.run_pipeline(editor.item)
+
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(editor.final.read_bytes(), b"ffmpeg output")
+        self.assertEqual(editor.original, self.movies / "uncharted" / "original.mp4")
+        self.assertListEqual(sorted(path.name for path in editor.abs_path.iterdir()),
+                             ["audio.mp3", "final.mp4", MANIFEST_NAME, "original.mp4"])
+
+    async def test_unchanged_inputs_skip_every_stage(self):
+        await self.run_pipeline(movie_item())
+        await self.run_pipeline(movie_item())
+
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg"])
+        self.assertEqual(len(self.speech), 1)
+        self.assertEqual(len(self.uploads), 3)
+
+    async def test_changed_description_redoes_narration(self):
+        await self.run_pipeline(movie_item())
+        await self.run_pipeline(movie_item(description="A fortune hunter teams up with a mentor."))
+
+        # The trailer is kept; the narration, its encoding, the mux and the upload are redone
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg", "ffmpeg", "ffmpeg"])
+        self.assertEqual(len(self.speech), 2)
+        self.assertEqual(len(self.uploads), 6)
+
+    async def test_changed_url_redownloads(self):
+        await self.run_pipeline(movie_item())
+        await self.run_pipeline(movie_item(url="https://youtu.be/new-trailer"))
+
+        # The narration is encoded once
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg", "yt-dlp", "ffmpeg"])
+        self.assertEqual(len(self.speech), 1)
+
+    async def test_changed_tts_backend_redoes_narration(self):
+        await self.run_pipeline(movie_item())
+        local = SpeechSynthesizer(self.movies / "tts_cache", backend=LocalBackend())
+        await VideoEditor(movie_item(), tts=local).run()
+
+        # The tone of the offline backend is encoded, muxed and uploaded in place of the narration
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg", "ffmpeg", "ffmpeg"])
+        self.assertEqual(len(self.uploads), 6)
+
+        await self.run_pipeline(movie_item())
+        # and back: the OpenAI narration and its encoding are cached, only the mux is redone
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg", "ffmpeg", "ffmpeg", "ffmpeg"])
+        self.assertEqual(len(self.speech), 1)
+        self.assertEqual(len(self.uploads), 9)
+
+    async def test_changed_resolution_redownloads(self):
+        await make_trailers([movie_item()], downloads=DownloadManager(height=1080))
+        await make_trailers([movie_item()], downloads=DownloadManager(height=720))
+
+        # The narration is encoded once
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg", "yt-dlp", "ffmpeg"])
+
+    async def test_download_limit_is_the_managers(self):
+        items = [movie_item(url=f"https://youtu.be/{index}") for index in range(3)]
+        for index, item in enumerate(items):
+            item.id, item.title.en = f"tt{index}", f"Movie {index}"
+
+        await make_trailers(items, downloads=DownloadManager(limit=1))
+        self.assertEqual(self.peak_downloads, 1)
+
+    async def test_run_uses_its_own_flags_and_managers(self):
+        await self.run_pipeline(movie_item())
+
+        await VideoEditor(movie_item(), re_upload_files=True).run()
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg"])
+        self.assertEqual(len(self.uploads), 6)
+
+        await VideoEditor(movie_item(), downloads=DownloadManager(height=720)).run()
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg", "yt-dlp", "ffmpeg"])
+
+    async def test_interrupted_write_is_not_done(self):
+        self.fail_mux = True
+        results = await self.run_pipeline(movie_item())
+
+        editor = VideoEditor(movie_item())
+        self.assertIsInstance(results[(editor.dir, "encode")], OSError)
+        self.assertFalse(editor.final.exists())
+        self.assertFalse([path for path in editor.abs_path.iterdir() if path.name.startswith(".")])
+
+        self.fail_mux = False
+        await self.run_pipeline(movie_item())
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg", "ffmpeg"])
+        self.assertEqual(editor.final.read_bytes(), b"ffmpeg output")
+
+    async def test_truncated_output_is_redone(self):
+        editor = VideoEditor(movie_item())
+        await self.run_pipeline(editor.item)
+        editor.original.write_bytes(b"trunc")
+
+        await self.run_pipeline(editor.item)
+
+        # The narration is encoded once
+        self.assertListEqual(self.commands, ["yt-dlp", "ffmpeg", "ffmpeg", "yt-dlp", "ffmpeg"])
+
+    async def test_outputs_from_before_the_manifest_are_adopted(self):
+        editor = VideoEditor(movie_item())
+        editor.abs_path.mkdir()
+        for path in (editor.original, editor.audio, editor.final):
+            path.write_bytes(b"made by an older version")
+
+        await self.run_pipeline(editor.item)
+
+        self.assertListEqual(self.commands, [])
+        self.assertListEqual(self.speech, [])
+        self.assertListEqual(self.uploads, [])
+        stages = json.loads((editor.abs_path / MANIFEST_NAME).read_text())
+        self.assertSetEqual(set(stages), {"download", "tts", "encode", "upload"})
+
+    async def test_missing_output_before_the_manifest_is_redone_downstream(self):
+        editor = VideoEditor(movie_item())
+        editor.abs_path.mkdir()
+        editor.original.write_bytes(b"made by an older version")
+        editor.final.write_bytes(b"made by an older version")
+
+        await self.run_pipeline(editor.item)
+
+        # Only the narration was missing, but everything made from it is redone
+        self.assertListEqual(self.commands, ["ffmpeg", "ffmpeg"])
+        self.assertEqual(len(self.speech), 1)
+        self.assertEqual(len(self.uploads), 3)
+
+    async def test_narration_is_shared_between_movies(self):
+        items = [movie_item(), movie_item()]
+        items[1].id, items[1].title.en = "tt0000002", "Uncharted Remastered"
+
+        await make_trailers(items)
+
+        self.assertEqual(len(self.speech), 1)
+        # One AAC encoding, one stream copy per movie
+        self.assertEqual(self.commands.count("ffmpeg"), 3)
+        self.assertEqual(len(self.muxes), 2)
+
+    async def test_mux_is_a_stream_copy_of_the_cached_narration(self):
+        editor = VideoEditor(movie_item())
+        await self.run_pipeline(editor.item)
+
+        [mux] = self.muxes
+        narration = Path(mux[mux.index(editor.original) + 2])
+        self.assertEqual(narration, await AacCache(self.movies / "aac_cache").cache_path(editor.audio))
+        self.assertEqual(mux[-len(MUX_ARGS) - 1:-1], MUX_ARGS)
+        self.assertEqual(mux[mux.index("-movflags") + 1], "+faststart")
@@ -109,23 +109,14 @@ def get_video_metadata(video_path: str) -> dict:
     import json
     from pathlib import Path
 
+    from clients.probe import probe
+
     if not Path(video_path).exists():
         raise FileNotFoundError(f"Video file not found: {video_path}")
 
-    # Run ffprobe to get video information in JSON format
-    cmd = [
-        "ffprobe",
-        "-v", "quiet",
-        "-print_format", "json",
-        "-show_format",
-        "-show_streams",
-        video_path
-    ]
-
     try:
-        # Execute ffprobe command
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        parsed_ffmpeg = json.loads(result.stdout)
+        # Single cached ffprobe shared with the other metadata helpers
+        parsed_ffmpeg = probe(video_path)
 
         # Verify we got some data
         if not parsed_ffmpeg.get("streams"):
@@ -268,6 +259,8 @@ def get_detailed_audio_properties(file_path):
     import json
     import os
 
+    from clients.probe import probe, first_stream
+
     # Handle FilePath object or string
     if hasattr(file_path, 'real_path'):
         real_path = str(file_path.real_path)
@@ -278,27 +271,15 @@ def get_detailed_audio_properties(file_path):
     if not os.path.exists(real_path):
         raise FileNotFoundError(f"Audio file not found: {real_path}")
 
-    # Use ffprobe to get detailed audio information
-    cmd = [
-        "ffprobe",
-        "-v", "error",
-        "-select_streams", "a:0",
-        "-show_entries", "stream=codec_name,codec_type,sample_rate,channels,bits_per_sample,bit_rate,channel_layout",
-        "-of", "json",
-        real_path
-    ]
-
     try:
-        # Use subprocess.run instead of check_output with shell=True for better security
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        audio_info = json.loads(result.stdout)
+        # Single cached ffprobe: the first audio stream and the format section come from the same run
+        probe_data = probe(real_path)
+        stream = first_stream(probe_data, "audio")
 
         # Verify we have audio streams
-        if 'streams' not in audio_info or not audio_info['streams']:
+        if stream is None:
             raise ValueError(f"No audio stream found in {real_path}")
 
-        stream = audio_info['streams'][0]
-
         # Initialize properties dictionary
         properties = {}
 
@@ -318,20 +299,11 @@ def get_detailed_audio_properties(file_path):
 
         # Get bitrate (required)
         if 'bit_rate' not in stream or not stream['bit_rate']:
-            # Try format section as fallback
-            try:
-                format_info = subprocess.run(
-                    ["ffprobe", "-v", "error", "-show_entries", "format=bit_rate", "-of", "json", real_path],
-                    capture_output=True, text=True, check=True
-                )
-                format_data = json.loads(format_info.stdout)
-                if 'format' in format_data and 'bit_rate' in format_data['format'] and format_data['format'][
-                    'bit_rate']:
-                    properties['bitrate'] = int(format_data['format']['bit_rate'])
-                else:
-                    raise ValueError("Audio bitrate information missing")
-            except Exception:
+            # Use the format section as fallback
+            format_bitrate = probe_data.get('format', {}).get('bit_rate')
+            if not format_bitrate:
                 raise ValueError("Audio bitrate information missing")
+            properties['bitrate'] = int(format_bitrate)
         else:
             properties['bitrate'] = int(stream['bit_rate'])
 